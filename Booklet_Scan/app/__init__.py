@@ -3,6 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_bootstrap import Bootstrap # Added
 from config import Config
+from app.utils.startup import PhaseTimer # create_app phase timings (flask startup-profile)
 
 db = SQLAlchemy()
 login_manager = LoginManager()
@@ -10,12 +11,24 @@ login_manager.login_view = 'auth.login' # Specifies the endpoint for login
 bootstrap = Bootstrap() # Added
 
 def create_app(config_class=Config):
+    timer = PhaseTimer()
     app = Flask(__name__)
     app.config.from_object(config_class)
+    timer.mark('flask')
 
     db.init_app(app)
+    from app.utils import db_utils
+    db_utils.init_app(app)
+    timer.mark('database')
+    from app.utils import row_counts
+    row_counts.init_app(app)
+    from app.utils import choices_cache
+    choices_cache.init_app(app) # Cached exam/venue/course choice lists
+    from app.utils import perf
+    perf.init_app(app) # Opt-in request/SQL timing (PERF_MONITOR)
     login_manager.init_app(app)
     bootstrap.init_app(app) # Added initialization
+    timer.mark('extensions')
 
     # Register blueprints here
     from app.auth import bp as auth_bp
@@ -26,6 +39,16 @@ def create_app(config_class=Config):
 
     from app.main import bp as main_bp
     app.register_blueprint(main_bp)
+    timer.mark('blueprints')
+
+    from app import cli
+    cli.register(app)
+    timer.mark('cli')
+
+    from app.main import scan_journal
+    scan_journal.init_app(app)
+    timer.mark('scan_journal')
+    app.extensions['startup_phases'] = timer.phases
 
     # The root route will be handled by the main blueprint now,
     # so we can remove the one defined directly in create_app.
@@ -0,0 +1,67 @@
+from sqlalchemy import delete, func, literal, select
+from app import db
+from app.models import Student, StudentExamAssignment
+from app.utils import db_utils, eligibility_index, row_counts
+
+# Set-based bulk (un)assignment of students to an exam: "every student of course X" or
+# "every student matching a filter" becomes a single INSERT ... SELECT (or DELETE ... WHERE
+# student_id IN (SELECT ...)) instead of one form post and commit per student. Pairs that
+# already exist are left alone by the _student_exam_uc constraint (INSERT OR IGNORE).
+
+
+def student_filter(course=None, name_contains=None, student_id_prefix=None):
+    """
+    Returns the WHERE criteria selecting students by course (exact name), part of the
+    name (case-insensitive) and/or student ID prefix. No arguments means every student.
+    """
+    criteria = []
+    if course:
+        criteria.append(Student.course == course)
+    if name_contains:
+        criteria.append(Student.name.ilike(f"%{name_contains}%"))
+    if student_id_prefix:
+        criteria.append(Student.student_id.startswith(student_id_prefix, autoescape=True))
+    return criteria
+
+
+def _refresh_index(exam):
+    # The scan station's index is rebuilt in one query rather than patched student by student
+    if eligibility_index.is_loaded_for(exam.id):
+        eligibility_index.load(exam)
+
+
+def assign_students(exam, course=None, name_contains=None, student_id_prefix=None):
+    """
+    Assigns every matching student to an exam with one INSERT OR IGNORE ... SELECT and commits.
+
+    Returns:
+        dict: 'matched' students, 'inserted' new assignments and 'skipped' (already assigned).
+    """
+    criteria = student_filter(course, name_contains, student_id_prefix)
+    matched = db.session.execute(select(func.count(Student.id)).where(*criteria)).scalar()
+    inserted = db_utils.insert_ignore_from_select(
+        StudentExamAssignment, ['student_id', 'exam_id'],
+        select(Student.id, literal(exam.id)).where(*criteria))
+    db.session.commit()
+    _refresh_index(exam)
+    return {'matched': matched, 'inserted': inserted, 'skipped': matched - inserted}
+
+
+def unassign_students(exam, course=None, name_contains=None, student_id_prefix=None):
+    """
+    Removes the assignments of every matching student from an exam with one DELETE and commits.
+    Scan records already made are kept.
+
+    Returns:
+        dict: 'matched' students, 'deleted' assignments and 'skipped' (were not assigned).
+    """
+    criteria = student_filter(course, name_contains, student_id_prefix)
+    matched = db.session.execute(select(func.count(Student.id)).where(*criteria)).scalar()
+    table = StudentExamAssignment.__table__
+    deleted = db.session.execute(
+        delete(table).where(table.c.exam_id == exam.id,
+                            table.c.student_id.in_(select(Student.id).where(*criteria)))).rowcount
+    row_counts.track(StudentExamAssignment, -deleted)
+    db.session.commit()
+    _refresh_index(exam)
+    return {'matched': matched, 'deleted': deleted, 'skipped': matched - deleted}
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, SubmitField, IntegerField, DateField, TimeField, SelectField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, SubmitField, IntegerField, DateField, TimeField, SelectField, BooleanField, RadioField
 from wtforms.validators import DataRequired, Optional, ValidationError, Length
-from app.models import Venue, Course # For Venue selection in ExamForm and Course model
 
 # Form for Course
 class CourseForm(FlaskForm):
@@ -19,13 +19,14 @@ class StudentForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(StudentForm, self).__init__(*args, **kwargs)
-        # Populate course choices dynamically. This will be overridden in the route
-        # to ensure fresh data, but good to have a default.
-        self.course.choices = [(c.name, c.name) for c in Course.query.order_by(Course.name).all()]
-        if not self.course.choices:
-            self.course.choices.insert(0, ('', 'No courses available - Add courses first'))
-        # else: # No need for "Select a course" here if DataRequired and no default choice value
-            # self.course.choices.insert(0, ('', '--- Select a Course ---'))
+        # Course choices are populated in the route (one query per request, not one here and one there)
+        self.course.choices = []
+
+# Form for bulk student import (see app/admin/student_import.py)
+class StudentImportForm(FlaskForm):
+    file = FileField('CSV or Excel file', validators=[FileRequired(), FileAllowed(['csv', 'xlsx'], 'Upload a .csv or .xlsx file.')])
+    upsert = BooleanField('Update existing students (matched by Student ID) instead of rejecting them')
+    submit = SubmitField('Import Students')
 
 
 # Form for Venue
@@ -47,24 +48,54 @@ class ExamForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(ExamForm, self).__init__(*args, **kwargs)
-        self.venue_id.choices = [(v.id, v.name) for v in Venue.query.order_by(Venue.name).all()]
+        # Venue choices are populated in the route
+        self.venue_id.choices = []
         # Add a default blank choice if desired
         # self.venue_id.choices.insert(0, ('', 'Select a Venue'))
 
 
 # Form for Student-Exam Assignment
 class StudentExamAssignmentForm(FlaskForm):
-    student_id = SelectField('Student (by ID)', coerce=int, validators=[DataRequired()])
+    # The student is entered by student ID, with type-ahead suggestions from /admin/api/students/search
+    # instead of a dropdown of every student
+    student_identifier = StringField('Student (name or ID)', validators=[DataRequired(), Length(max=64)],
+                                     render_kw={'autocomplete': 'off', 'data-student-search': 'on',
+                                                'placeholder': 'Start typing a name or student ID'})
     exam_id = SelectField('Exam', coerce=int, validators=[DataRequired()])
     submit = SubmitField('Assign Student to Exam')
 
-    # Note: Populating choices for student_id and exam_id will be done in the route
-    # as it might involve a large number of students.
-    # A better UX for student selection might involve a search or autocomplete.
-    # For now, we'll assume selection by ID or a dropdown populated in the route.
-
     def __init__(self, *args, **kwargs):
         super(StudentExamAssignmentForm, self).__init__(*args, **kwargs)
-        # Choices will be populated in the route handler
-        self.student_id.choices = []
+        # Exam choices will be populated in the route handler
         self.exam_id.choices = []
+
+# Form for bulk (un)assignment of students matching a filter (see app/admin/bulk_assign.py)
+class BulkAssignmentForm(FlaskForm):
+    exam_id = SelectField('Exam', coerce=int, validators=[DataRequired()])
+    course = SelectField('Course', validators=[Optional()])
+    name_contains = StringField('Name contains (Optional)', validators=[Optional(), Length(max=128)])
+    student_id_prefix = StringField('Student ID starts with (Optional)', validators=[Optional(), Length(max=64)])
+    all_students = BooleanField('Match every student (required when no filter is given)')
+    action = RadioField('Action', choices=[('assign', 'Assign matching students'), ('unassign', 'Remove matching students')],
+                        default='assign', validators=[DataRequired()])
+    submit = SubmitField('Apply')
+
+    def validate_all_students(self, field):
+        if not (self.course.data or self.name_contains.data or self.student_id_prefix.data or field.data):
+            raise ValidationError('Give at least one filter, or tick this box to match every student.')
+
+# Filters and format for the scan record export (see app/admin/scan_export.py). Submitted with GET
+# so the export URL can be bookmarked or fetched by a script; the route disables CSRF for it.
+class ScanExportForm(FlaskForm):
+    exam_id = SelectField('Exam', coerce=int, default=0, validators=[Optional()])
+    venue_id = SelectField('Venue', coerce=int, default=0, validators=[Optional()])
+    date_from = DateField('Scanned from (YYYY-MM-DD, Optional)', validators=[Optional()], format='%Y-%m-%d')
+    date_to = DateField('Scanned until (YYYY-MM-DD, Optional)', validators=[Optional()], format='%Y-%m-%d')
+    export_format = SelectField('Format', choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines'), ('xlsx', 'Excel (.xlsx)')],
+                                default='csv', validators=[DataRequired()])
+    compress = BooleanField('Compress (gzip)')
+    submit = SubmitField('Export')
+
+    def validate_date_to(self, field):
+        if field.data and self.date_from.data and field.data < self.date_from.data:
+            raise ValidationError('The end date is before the start date.')
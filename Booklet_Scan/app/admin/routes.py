@@ -1,10 +1,21 @@
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
+from sqlalchemy.orm import contains_eager, joinedload
 from app import db
 from app.admin import bp
-from app.models import Student, Venue, Exam, StudentExamAssignment, Course ,ScanRecord
-from app.admin.forms import StudentForm, VenueForm, ExamForm, StudentExamAssignmentForm, CourseForm
+from app.models import Student, Venue, Exam, StudentExamAssignment, Course ,ScanRecord, PregeneratedBooklet
+from app.admin.forms import StudentForm, VenueForm, ExamForm, StudentExamAssignmentForm, CourseForm, StudentImportForm, BulkAssignmentForm, ScanExportForm
+from app.admin import student_import, bulk_assign, scan_export, student_search
 from app.utils import lcd_display # For controlling the LCD
+from app.utils import network_utils # Cached station IP address
+from app.utils.lcd_display import LCD_COLS
+from app.utils import eligibility_index # In-memory eligibility index for the scan station
+from app.utils import keyset, row_counts # Seek pagination and cached totals for the list pages
+from app.utils import event_bus # In-process pub/sub feeding the live exam dashboards
+from app.utils import perf # Opt-in request/SQL/span timing (PERF_MONITOR)
+from app.utils import choices_cache # Cached exam/venue/course choice lists
+from app.main import pregenerate, live_dashboard, exam_progress
+from app.main import scan_journal # Journalled scans that could not be saved are listed with the scan records
 
 # Utility to check if current user is an admin (adjust as needed if more roles are added)
 # Now using current_user.is_authenticated and current_user.username for checks in templates
@@ -20,6 +31,25 @@ def before_request():
         flash('You do not have permission to access the admin area.')
         return redirect(url_for('main.index'))
 
+def list_page(query, order_by, model, per_page=10):
+    # One page of an admin list: keyset pagination from the ?after= / ?before= cursor in the URL,
+    # with the total taken from the cached row count of the listed model
+    return keyset.paginate(query, order_by, per_page=per_page,
+                           after=request.args.get('after'), before=request.args.get('before'),
+                           total=row_counts.count(model))
+
+# Choice lists for the select fields, built from the cached rows of app/utils/choices_cache.py.
+# The routes that add, edit or delete courses, venues and exams invalidate them before committing.
+# A new list is returned every time, so callers may insert their placeholder choice.
+def course_choices():
+    return [(name, name) for name in choices_cache.courses()]
+
+def venue_choices():
+    return [(venue_id, name) for venue_id, name in choices_cache.venues()]
+
+def exam_choices():
+    return [(e.id, f"{e.name} on {e.date.strftime('%Y-%m-%d')} at {e.venue_name}") for e in choices_cache.exams()]
+
 @bp.route('/dashboard')
 def dashboard():
     return render_template('admin/dashboard.html', title='Admin Dashboard')
@@ -27,9 +57,8 @@ def dashboard():
 # --- Course CRUD ---
 @bp.route('/courses')
 def list_courses():
-    page = request.args.get('page', 1, type=int)
-    courses = Course.query.order_by(Course.name).paginate(page=page, per_page=10)
-    return render_template('admin/courses_list.html', courses=courses, title='Manage Courses')
+    courses = list_page(Course.query, [Course.name, Course.id], Course)
+    return render_template('admin/courses_list.html', courses=courses, pagination=courses, title='Manage Courses')
 
 @bp.route('/courses/new', methods=['GET', 'POST'])
 def add_course():
@@ -47,6 +76,7 @@ def add_course():
         else:
             course = Course(name=form.name.data, code=form.code.data if form.code.data else None)
             db.session.add(course)
+            choices_cache.invalidate(choices_cache.COURSES)
             db.session.commit()
             flash('Course added successfully!', 'success')
             return redirect(url_for('admin.list_courses'))
@@ -64,6 +94,7 @@ def edit_course(id):
         else:
             course.name = form.name.data
             course.code = form.code.data if form.code.data else None
+            choices_cache.invalidate(choices_cache.COURSES)
             db.session.commit()
             flash('Course updated successfully!', 'success')
             return redirect(url_for('admin.list_courses'))
@@ -80,6 +111,7 @@ def delete_course(id):
     #    return redirect(url_for('admin.list_courses'))
     try:
         db.session.delete(course)
+        choices_cache.invalidate(choices_cache.COURSES)
         db.session.commit()
         flash('Course deleted successfully!', 'success')
     except Exception as e:
@@ -91,15 +123,14 @@ def delete_course(id):
 # --- Student CRUD ---
 @bp.route('/students')
 def list_students():
-    page = request.args.get('page', 1, type=int)
-    students = Student.query.order_by(Student.name).paginate(page=page, per_page=10)
-    return render_template('admin/students_list.html', students=students, title='Manage Students')
+    students = list_page(Student.query, [Student.name, Student.id], Student)
+    return render_template('admin/students_list.html', students=students, pagination=students, title='Manage Students')
 
 @bp.route('/students/new', methods=['GET', 'POST'])
 def add_student():
     form = StudentForm()
     # Populate course choices
-    form.course.choices = [(c.name, c.name) for c in Course.query.order_by(Course.name).all()]
+    form.course.choices = course_choices()
     if not form.course.choices:
         form.course.choices.insert(0, ('', 'No courses available - Add courses first'))
         flash('No courses available to assign. Please add courses first.', 'info')
@@ -119,12 +150,37 @@ def add_student():
             return redirect(url_for('admin.list_students'))
     return render_template('admin/student_form.html', form=form, title='Add Student')
 
+@bp.route('/students/import', methods=['GET', 'POST'])
+def import_students():
+    # Bulk import from CSV/XLSX. Add ?format=json to get the report as JSON instead of the page.
+    form = StudentImportForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            rows = student_import.iter_student_rows(upload.stream, upload.filename)
+            report = student_import.import_students(rows, upsert=form.upsert.data)
+        except ValueError as e:
+            if request.args.get('format') == 'json':
+                return jsonify({'error': str(e)}), 400
+            flash(str(e), 'danger')
+            return render_template('admin/student_import.html', form=form, report=None, title='Import Students')
+        current_app.logger.info(f"Student import of {upload.filename}: {report['inserted']} added, "
+                                f"{report['updated']} updated, {report['failed']} rejected in {report['seconds']}s")
+        if request.args.get('format') == 'json':
+            return jsonify(report)
+        flash(f"Imported {report['rows']} rows: {report['inserted']} added, {report['updated']} updated, "
+              f"{report['failed']} rejected.", 'success' if not report['failed'] else 'warning')
+    elif request.method == 'POST' and request.args.get('format') == 'json':
+        return jsonify({'error': 'Invalid upload.', 'fields': form.errors}), 400
+    return render_template('admin/student_import.html', form=form, report=report, title='Import Students')
+
 @bp.route('/students/<int:id>/edit', methods=['GET', 'POST'])
 def edit_student(id):
     student = Student.query.get_or_404(id)
     form = StudentForm(obj=student)
     # Populate course choices
-    form.course.choices = [(c.name, c.name) for c in Course.query.order_by(Course.name).all()]
+    form.course.choices = course_choices()
     if not form.course.choices: # Should not happen if student has a course, but good for consistency
         form.course.choices.insert(0, ('', 'No courses available - Add courses first'))
     # else:
@@ -138,10 +194,12 @@ def edit_student(id):
                 flash('That Student ID is already in use by another student.', 'warning')
                 return render_template('admin/student_form.html', form=form, title='Edit Student', student=student)
 
+        old_student_identifier = student.student_id
         student.name = form.name.data
         student.student_id = form.student_id.data
         student.course = form.course.data
         db.session.commit()
+        eligibility_index.update_student(old_student_identifier, student)
         flash('Student updated successfully!', 'success')
         return redirect(url_for('admin.list_students'))
     return render_template('admin/student_form.html', form=form, title='Edit Student', student=student)
@@ -152,8 +210,10 @@ def delete_student(id):
     # Consider implications: what if student is assigned to exams or has scan records?
     # For now, simple delete. Add cascading deletes or checks as needed.
     try:
+        student_identifier = student.student_id
         db.session.delete(student)
         db.session.commit()
+        eligibility_index.remove_student(student_identifier)
         flash('Student deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -163,9 +223,8 @@ def delete_student(id):
 # --- Venue CRUD ---
 @bp.route('/venues')
 def list_venues():
-    page = request.args.get('page', 1, type=int)
-    venues = Venue.query.order_by(Venue.name).paginate(page=page, per_page=10)
-    return render_template('admin/venues_list.html', venues=venues, title='Manage Venues')
+    venues = list_page(Venue.query, [Venue.name, Venue.id], Venue)
+    return render_template('admin/venues_list.html', venues=venues, pagination=venues, title='Manage Venues')
 
 @bp.route('/venues/new', methods=['GET', 'POST'])
 def add_venue():
@@ -177,6 +236,7 @@ def add_venue():
         else:
             venue = Venue(name=form.name.data, location=form.location.data, capacity=form.capacity.data)
             db.session.add(venue)
+            choices_cache.invalidate(choices_cache.VENUES)
             db.session.commit()
             flash('Venue added successfully!', 'success')
             return redirect(url_for('admin.list_venues'))
@@ -196,6 +256,7 @@ def edit_venue(id):
         venue.name = form.name.data
         venue.location = form.location.data
         venue.capacity = form.capacity.data
+        choices_cache.invalidate(choices_cache.VENUES)
         db.session.commit()
         flash('Venue updated successfully!', 'success')
         return redirect(url_for('admin.list_venues'))
@@ -209,6 +270,7 @@ def delete_venue(id):
         return redirect(url_for('admin.list_venues'))
     try:
         db.session.delete(venue)
+        choices_cache.invalidate(choices_cache.VENUES)
         db.session.commit()
         flash('Venue deleted successfully!', 'success')
     except Exception as e:
@@ -220,14 +282,56 @@ def delete_venue(id):
 # --- Exam CRUD ---
 @bp.route('/exams')
 def list_exams():
-    page = request.args.get('page', 1, type=int)
-    exams = Exam.query.order_by(Exam.date.desc(), Exam.start_time.desc()).paginate(page=page, per_page=10)
-    return render_template('admin/exams_list.html', exams=exams, title='Manage Exams')
+    # The list shows each exam's venue and progress counters: load them in the same query rather than once per row
+    exams = list_page(Exam.query.options(joinedload(Exam.venue), joinedload(Exam.progress)), [Exam.date.desc(), Exam.start_time.desc(), Exam.id.desc()], Exam)
+    return render_template('admin/exams_list.html', exams=exams, pagination=exams, title='Manage Exams')
+
+@bp.route('/exams/<int:exam_id>/live')
+def live_exam(exam_id):
+    # Live dashboard of one exam; the figures arrive over SSE from live_exam_events
+    exam = Exam.query.options(joinedload(Exam.venue)).get_or_404(exam_id)
+    return render_template('admin/live_dashboard.html', exam=exam, title=f'Live: {exam.name}',
+                           retry_ms=live_dashboard.STREAM_RETRY_MS)
+
+@bp.route('/exams/<int:exam_id>/live/events')
+def live_exam_events(exam_id):
+    # Server-Sent Events stream of the exam's figures: the current snapshot, then a new one after
+    # every scan (published by record_booklet), with a keep-alive comment when the exam is quiet
+    Exam.query.get_or_404(exam_id)
+    # Each stream holds a request thread while it is open: past the per-process limit, turn the
+    # dashboard away so the scan stations keep their threads (the page retries after a while)
+    if not live_dashboard.open_stream(current_app.config.get('LIVE_DASHBOARD_MAX_STREAMS', 2)):
+        current_app.logger.warning(f"Live dashboard stream for exam {exam_id} refused: stream limit reached")
+        return Response(f'retry: {live_dashboard.STREAM_RETRY_MS}\n\n', status=503, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'Retry-After': str(live_dashboard.STREAM_RETRY_MS // 1000)})
+    try:
+        snapshot, subscription = live_dashboard.watch(exam_id)
+    except Exception:
+        live_dashboard.close_stream()
+        raise
+    keepalive = current_app.config.get('LIVE_DASHBOARD_KEEPALIVE', 15)
+
+    def stream():
+        yield live_dashboard.format_sse(snapshot)
+        while True:
+            message = subscription.get(timeout=keepalive)
+            yield message if message is not None else ': keepalive\n\n'
+
+    def closed():
+        # Runs when the browser goes away (the next write fails) or the server stops, even if
+        # the stream never started
+        live_dashboard.unwatch(subscription)
+        live_dashboard.close_stream()
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(closed)
+    return response
 
 @bp.route('/exams/new', methods=['GET', 'POST'])
 def add_exam():
     form = ExamForm()
-    form.venue_id.choices = [(v.id, v.name) for v in Venue.query.order_by(Venue.name).all()]
+    form.venue_id.choices = venue_choices()
     if not form.venue_id.choices:
         flash('No venues available. Please add a venue first.', 'warning')
         # Optionally redirect to add venue page or disable form
@@ -236,6 +340,7 @@ def add_exam():
         exam = Exam(name=form.name.data, course=form.course.data, venue_id=form.venue_id.data,
                     date=form.date.data, start_time=form.start_time.data, end_time=form.end_time.data)
         db.session.add(exam)
+        choices_cache.invalidate(choices_cache.EXAMS)
         db.session.commit()
         flash('Exam added successfully!', 'success')
         return redirect(url_for('admin.list_exams'))
@@ -245,7 +350,7 @@ def add_exam():
 def edit_exam(id):
     exam = Exam.query.get_or_404(id)
     form = ExamForm(obj=exam)
-    form.venue_id.choices = [(v.id, v.name) for v in Venue.query.order_by(Venue.name).all()]
+    form.venue_id.choices = venue_choices()
     if form.validate_on_submit():
         exam.name = form.name.data
         exam.course = form.course.data
@@ -253,7 +358,10 @@ def edit_exam(id):
         exam.date = form.date.data
         exam.start_time = form.start_time.data
         exam.end_time = form.end_time.data
+        choices_cache.invalidate(choices_cache.EXAMS)
         db.session.commit()
+        # The scan station shows the exam name from the eligibility index
+        eligibility_index.update_exam(exam)
         flash('Exam updated successfully!', 'success')
         return redirect(url_for('admin.list_exams'))
     return render_template('admin/exam_form.html', form=form, title='Edit Exam', exam=exam)
@@ -269,6 +377,7 @@ def delete_exam(id):
              flash('Cannot delete exam: It has student assignments or scan records. Please remove them first.', 'danger')
              return redirect(url_for('admin.list_exams'))
         db.session.delete(exam)
+        choices_cache.invalidate(choices_cache.EXAMS)
         db.session.commit()
         flash('Exam deleted successfully!', 'success')
     except Exception as e:
@@ -291,6 +400,8 @@ def set_exam_status(exam_id, status):
         # Set this exam's status
         exam.exam_status = Exam.STATUS_AUTH_ACTIVE
         db.session.commit()
+        # Load the eligibility index so scans for this exam are checked in memory
+        eligibility_index.load(exam)
 
         # Update LCD - User needs to provide actual link and instructions
         # For now, using placeholders.
@@ -311,6 +422,8 @@ def set_exam_status(exam_id, status):
         if exam.exam_status == Exam.STATUS_AUTH_ACTIVE:
             exam.exam_status = Exam.STATUS_PENDING
             db.session.commit()
+            if eligibility_index.is_loaded_for(exam.id):
+                eligibility_index.clear()
             lcd_display.stop_scrolling_message_if_active()
             lcd_display.display_ip_address() # Revert to IP address display
             flash(f"Exam '{exam.name}' authentication stopped. LCD reverted to IP display.", 'success')
@@ -327,54 +440,120 @@ def set_exam_status(exam_id, status):
         # Handle other statuses if any (e.g., InProgress, Finished)
         exam.exam_status = status
         db.session.commit()
+        if eligibility_index.is_loaded_for(exam.id):
+            eligibility_index.clear()
         flash(f"Exam '{exam.name}' status changed to {status}.", 'info')
         # Potentially update LCD for other states too if needed in future
 
     return redirect(url_for('admin.list_exams'))
 
+@bp.route('/exams/<int:exam_id>/pregenerate', methods=['POST'])
+def pregenerate_booklets(exam_id):
+    exam = Exam.query.get_or_404(exam_id)
+    if pregenerate.start_background_run(current_app._get_current_object(), exam.id):
+        flash(f"Pre-generating booklets for '{exam.name}' in the background. Progress: {url_for('admin.pregenerate_status', exam_id=exam.id)}", 'info')
+    else:
+        flash(f"Booklets for '{exam.name}' are already being pre-generated.", 'warning')
+    return redirect(url_for('admin.list_exams'))
+
+@bp.route('/api/exams/<int:exam_id>/progress')
+def exam_progress_counts(exam_id):
+    # Assigned / scanned / duplicate / printed-but-unrecorded counters of an exam, read from one row
+    Exam.query.get_or_404(exam_id)
+    return jsonify(exam_progress.get(exam_id))
+
+@bp.route('/exams/<int:exam_id>/pregenerate/status')
+def pregenerate_status(exam_id):
+    # Progress of the latest pre-generation run started from this process, plus what is stored
+    Exam.query.get_or_404(exam_id)
+    prepared = PregeneratedBooklet.query.filter_by(exam_id=exam_id, used_at=None).count()
+    return jsonify({'exam_id': exam_id, 'prepared_unused': prepared, 'run': pregenerate.get_run(exam_id)})
+
 # --- Student-Exam Assignment CRUD ---
 @bp.route('/assignments')
 def list_assignments():
-    page = request.args.get('page', 1, type=int)
-    # Join with Student and Exam to allow sorting/filtering by their fields if needed later
-    assignments = StudentExamAssignment.query.join(Student).join(Exam)\
-        .order_by(Exam.date.desc(), Exam.name, Student.name)\
-        .paginate(page=page, per_page=10)
-    return render_template('admin/assignments_list.html', assignments=assignments, title='Manage Student Assignments')
+    # Join with Student, Exam and Venue for sorting, and fill the relationships the template
+    # reads (student, exam, exam.venue) from those same joined rows - one query per page
+    assignments = list_page(StudentExamAssignment.query.join(Student).join(Exam).join(Venue)
+                            .options(contains_eager(StudentExamAssignment.student),
+                                     contains_eager(StudentExamAssignment.exam).contains_eager(Exam.venue)),
+                            [Exam.date.desc(), Exam.name, Student.name, StudentExamAssignment.id],
+                            StudentExamAssignment)
+    return render_template('admin/assignments_list.html', assignments=assignments, pagination=assignments, title='Manage Student Assignments')
 
 @bp.route('/assignments/new', methods=['GET', 'POST'])
 def add_assignment():
     form = StudentExamAssignmentForm()
-    # Populate choices for students and exams
-    form.student_id.choices = [(s.id, f"{s.name} ({s.student_id})") for s in Student.query.order_by(Student.name).all()]
-    form.exam_id.choices = [(e.id, f"{e.name} on {e.date.strftime('%Y-%m-%d')} at {e.venue.name}") for e in Exam.query.join(Venue).order_by(Exam.date.desc(), Exam.name).all()]
+    # Populate choices for exams; students are found with the type-ahead search
+    form.exam_id.choices = exam_choices()
+    has_students = row_counts.count(Student) > 0
 
-    if not form.student_id.choices:
+    if not has_students:
         flash('No students available. Please add students first.', 'warning')
     if not form.exam_id.choices:
         flash('No exams available. Please add exams first.', 'warning')
 
     if form.validate_on_submit():
+        student = student_search.find_student(form.student_identifier.data)
+        if student is None:
+            form.student_identifier.errors.append('No student with this student ID. Pick one from the suggestions.')
+            return render_template('admin/assignment_form.html', form=form, has_students=has_students,
+                                   title='Assign Student to Exam')
         existing_assignment = StudentExamAssignment.query.filter_by(
-            student_id=form.student_id.data,
+            student_id=student.id,
             exam_id=form.exam_id.data
         ).first()
         if existing_assignment:
             flash('This student is already assigned to this exam.', 'warning')
         else:
-            assignment = StudentExamAssignment(student_id=form.student_id.data, exam_id=form.exam_id.data)
+            assignment = StudentExamAssignment(student_id=student.id, exam_id=form.exam_id.data)
             db.session.add(assignment)
             db.session.commit()
+            eligibility_index.add_assignment(assignment.exam_id, assignment.student)
             flash('Student assigned to exam successfully!', 'success')
             return redirect(url_for('admin.list_assignments'))
-    return render_template('admin/assignment_form.html', form=form, title='Assign Student to Exam')
+    return render_template('admin/assignment_form.html', form=form, has_students=has_students,
+                           title='Assign Student to Exam')
+
+@bp.route('/assignments/bulk', methods=['GET', 'POST'])
+def bulk_assignment():
+    # Assign/remove every student matching a course/name/ID filter with a single statement
+    form = BulkAssignmentForm()
+    form.exam_id.choices = exam_choices()
+    form.course.choices = [('', '--- Any course ---')] + course_choices()
+    if not form.exam_id.choices:
+        flash('No exams available. Please add exams first.', 'warning')
+
+    if form.validate_on_submit():
+        exam = Exam.query.get_or_404(form.exam_id.data)
+        filters = dict(course=form.course.data or None, name_contains=form.name_contains.data or None,
+                       student_id_prefix=form.student_id_prefix.data or None)
+        try:
+            if form.action.data == 'unassign':
+                result = bulk_assign.unassign_students(exam, **filters)
+                flash(f"Removed {result['deleted']} of {result['matched']} matching students from {exam.name} "
+                      f"({result['skipped']} were not assigned).", 'success')
+            else:
+                result = bulk_assign.assign_students(exam, **filters)
+                flash(f"Assigned {result['inserted']} of {result['matched']} matching students to {exam.name} "
+                      f"({result['skipped']} were already assigned).", 'success')
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Bulk assignment for exam {exam.id} failed: {e}")
+            flash(f'Error updating assignments: {str(e)}', 'danger')
+            return render_template('admin/bulk_assignment.html', form=form, title='Bulk Assign Students')
+        return redirect(url_for('admin.list_assignments'))
+    return render_template('admin/bulk_assignment.html', form=form, title='Bulk Assign Students')
 
 @bp.route('/assignments/<int:id>/delete', methods=['POST'])
 def delete_assignment(id):
     assignment = StudentExamAssignment.query.get_or_404(id)
     try:
+        exam_id, student = assignment.exam_id, assignment.student
         db.session.delete(assignment)
         db.session.commit()
+        if student:
+            eligibility_index.remove_assignment(exam_id, student)
         flash('Student assignment deleted successfully!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -385,9 +564,8 @@ def delete_assignment(id):
 @bp.route('/scan_records')
 @login_required
 def list_scan_records():
-    page = request.args.get('page', 1, type=int)
     # Query ScanRecord, joining with Student and Exam to get their names
-    # Order by timestamp descending to show newest scans first
+    # Order by timestamp descending to show newest scans first (id breaks ties between equal timestamps)
     scan_records = ScanRecord.query.join(Student, ScanRecord.student_id == Student.id)\
                                   .join(Exam, ScanRecord.exam_id == Exam.id)\
                                   .add_columns(
@@ -397,10 +575,88 @@ def list_scan_records():
                                       Exam.name.label('exam_name'),
                                       ScanRecord.booklet_code,
                                       ScanRecord.timestamp
-                                  )\
-                                  .order_by(ScanRecord.timestamp.desc())\
-                                  .paginate(page=page, per_page=15) # Show 15 records per page
+                                  )
+    scan_records = list_page(scan_records, [ScanRecord.timestamp.desc(), ScanRecord.id.desc()],
+                             ScanRecord, per_page=15) # Show 15 records per page
 
     return render_template('admin/scan_records_list.html',
                            scan_records=scan_records,
+                           pagination=scan_records,
+                           journal_dropped=scan_journal.get_dropped(),
                            title='View Scan Records')
+
+@bp.route('/scan_records/export')
+def export_scan_records():
+    # Shows the export form; once submitted (GET with export_format) streams the file
+    form = ScanExportForm(formdata=request.args if 'export_format' in request.args else None, meta={'csrf': False})
+    form.exam_id.choices = [(0, '--- All exams ---')] + exam_choices()
+    form.venue_id.choices = [(0, '--- All venues ---')] + venue_choices()
+    if 'export_format' in request.args and form.validate():
+        export_format = form.export_format.data
+        statement = scan_export.export_statement(exam_id=form.exam_id.data or None, venue_id=form.venue_id.data or None,
+                                                 date_from=form.date_from.data, date_to=form.date_to.data)
+        try:
+            chunks = scan_export.iter_export(export_format, statement, compress=form.compress.data)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return render_template('admin/scan_export.html', form=form, title='Export Scan Records')
+        filename = scan_export.export_filename(export_format, form.compress.data, form.exam_id.data or None)
+        current_app.logger.info(f"Streaming scan record export {filename} to {current_user.username}")
+        # stream_with_context keeps the database session open while the rows are streamed
+        return Response(stream_with_context(chunks),
+                        mimetype='application/gzip' if form.compress.data else scan_export.CONTENT_TYPES[export_format],
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+    return render_template('admin/scan_export.html', form=form, title='Export Scan Records')
+
+@bp.route('/api/eligibility_index')
+def eligibility_index_stats():
+    # Hit/miss/invalidation counters of the in-memory eligibility index used by the scan station
+    return jsonify(eligibility_index.get_stats())
+
+@bp.route('/api/scan_journal')
+def scan_journal_stats():
+    # Pending/flushed counters of the scan journal and the acknowledged scans it could not save
+    return jsonify(dict(scan_journal.get_stats(), dropped_entries=scan_journal.get_dropped()))
+
+@bp.route('/api/events')
+def event_bus_stats():
+    # Subscribers and published/dropped message counts of the in-process event bus (live dashboards),
+    # plus the dashboard streams open in this process and those refused by LIVE_DASHBOARD_MAX_STREAMS
+    return jsonify(dict(event_bus.get_stats(), streams=live_dashboard.get_stream_stats()))
+
+@bp.route('/api/lcd')
+def lcd_stats():
+    # Queue depth, coalescing and I2C write latency of the LCD owner thread
+    return jsonify(lcd_display.get_stats())
+
+@bp.route('/api/network')
+def network_status():
+    # Cached IP address shown on the LCD, when and why it was last probed, netlink or polling
+    return jsonify(network_utils.get_address_stats())
+
+@bp.route('/perf')
+def perf_report():
+    # Rolling p50/p95/p99 of request wall time, SQL and named spans, plus the slow request log
+    return render_template('admin/perf.html', title='Performance', report=perf.get_report())
+
+@bp.route('/perf/reset', methods=['POST'])
+def perf_reset():
+    perf.reset()
+    flash('Performance samples cleared.', 'info')
+    return redirect(url_for('admin.perf_report'))
+
+@bp.route('/api/perf')
+def perf_stats():
+    # Same figures as the Performance page, for scripts
+    return jsonify(perf.get_report())
+
+@bp.route('/api/students/search')
+def search_students():
+    # Type-ahead suggestions for the assignment and scan forms: ?q=<name or ID>[&limit=20][&exam_id=N]
+    try:
+        limit = int(request.args.get('limit') or student_search.DEFAULT_LIMIT)
+        exam_id = int(request.args['exam_id']) if request.args.get('exam_id') else None
+    except ValueError:
+        return jsonify({'error': 'limit and exam_id must be whole numbers'}), 400
+    query = request.args.get('q', '')
+    return jsonify({'query': query, 'results': student_search.search(query, limit=limit, exam_id=exam_id)})
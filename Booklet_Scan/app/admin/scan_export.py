@@ -0,0 +1,173 @@
+import csv
+import datetime
+import io
+import json
+import tempfile
+import zlib
+from sqlalchemy import func, select
+from app import db
+from app.models import ScanRecord, Student, Exam, Venue
+
+# Streaming export of scan records (admin "Export" on the Scan Records page and flask export-scans).
+#
+# The ScanRecord / Student / Exam / Venue join is read with yield_per, i.e. FETCH_BATCH rows
+# at a time from one open cursor, and every format is written out incrementally as chunks of
+# bytes - optionally gzip-compressed on the fly - so a million-row export needs no more memory
+# than a few thousand. In WAL mode the long read never blocks the scan station's writes.
+# XLSX is the exception to fully incremental output: openpyxl's write-only mode spools the
+# sheet to a temporary file and the finished workbook is then streamed from disk.
+
+FORMATS = ('csv', 'jsonl', 'xlsx')
+FETCH_BATCH = 1000
+CHUNK_SIZE = 64 * 1024  # bytes gathered before a chunk is handed to the response
+XLSX_MAX_ROWS = 1048575  # Excel's sheet limit, less the header row
+
+COLUMNS = ('scan_id', 'timestamp', 'booklet_code', 'student_id', 'student_name',
+           'exam_id', 'exam_name', 'exam_date', 'venue')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_statement(exam_id=None, venue_id=None, date_from=None, date_to=None):
+    """
+    Returns the SELECT of the export columns, oldest scan first.
+
+    Args:
+        exam_id (int, optional): Only scans of this exam.
+        venue_id (int, optional): Only scans of exams held at this venue.
+        date_from (date, optional): Only scans made on or after this day.
+        date_to (date, optional): Only scans made on or before this day.
+    """
+    statement = select(
+        ScanRecord.id.label('scan_id'), ScanRecord.timestamp, ScanRecord.booklet_code,
+        Student.student_id, Student.name.label('student_name'),
+        Exam.id.label('exam_id'), Exam.name.label('exam_name'), Exam.date.label('exam_date'),
+        Venue.name.label('venue'),
+    ).join(Student, ScanRecord.student_id == Student.id)\
+     .join(Exam, ScanRecord.exam_id == Exam.id)\
+     .join(Venue, Exam.venue_id == Venue.id)
+    if exam_id:
+        statement = statement.where(ScanRecord.exam_id == exam_id)
+    if venue_id:
+        statement = statement.where(Exam.venue_id == venue_id)
+    # Timestamps are compared as a range so the index on ScanRecord.timestamp can be used
+    if date_from:
+        statement = statement.where(ScanRecord.timestamp >= datetime.datetime.combine(date_from, datetime.time()))
+    if date_to:
+        statement = statement.where(ScanRecord.timestamp < datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time()))
+    return statement.order_by(ScanRecord.id)
+
+
+def count_rows(statement):
+    """Number of rows the export statement will produce."""
+    return db.session.execute(select(func.count()).select_from(statement.order_by(None).subquery())).scalar()
+
+
+def export_filename(export_format, compress=False, exam_id=None):
+    stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    name = f"scan_records{f'_exam{exam_id}' if exam_id else ''}_{stamp}.{export_format}"
+    return name + '.gz' if compress else name
+
+
+def _rows(statement):
+    result = db.session.execute(statement, execution_options={'yield_per': FETCH_BATCH})
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def _value(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow([_value(v) for v in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _jsonl_chunks(rows):
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(COLUMNS, (_value(v) for v in row))), ensure_ascii=False)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= CHUNK_SIZE:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines, size = [], 0
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _xlsx_chunks(rows):
+    from openpyxl import Workbook  # checked by iter_export()
+
+    # write_only streams rows to a temporary file instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Scan Records')
+    sheet.append(list(COLUMNS))
+    for row in rows:
+        sheet.append(list(row))
+    with tempfile.TemporaryFile() as spool:
+        workbook.save(spool)
+        spool.seek(0)
+        while True:
+            chunk = spool.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _gzip(chunks):
+    # wbits=31: gzip header and trailer, so the output is a regular .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(export_format, statement, compress=False):
+    """
+    Yields the export of statement's rows as chunks of bytes. Must be consumed inside an
+    application context (use stream_with_context for a response).
+
+    Args:
+        export_format (str): 'csv', 'jsonl' or 'xlsx'.
+        statement: From export_statement().
+        compress (bool): gzip the output.
+
+    Raises:
+        ValueError: If the format is unknown, or XLSX is requested without openpyxl or for more
+                    rows than a sheet holds. Raised by this call, before anything is yielded.
+    """
+    if export_format not in FORMATS:
+        raise ValueError(f"Unsupported export format '{export_format}', use one of: {', '.join(FORMATS)}.")
+    if export_format == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise ValueError("Exporting .xlsx files needs the openpyxl package (pip install openpyxl); export .csv instead.")
+        rows = count_rows(statement)
+        if rows > XLSX_MAX_ROWS:
+            raise ValueError(f"{rows} scan records is more than an Excel sheet holds; export .csv or .jsonl, or narrow the filters.")
+
+    writer = {'csv': _csv_chunks, 'jsonl': _jsonl_chunks, 'xlsx': _xlsx_chunks}[export_format]
+    chunks = writer(_rows(statement))
+    return _gzip(chunks) if compress else chunks
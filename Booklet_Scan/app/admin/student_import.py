@@ -0,0 +1,223 @@
+import csv
+import io
+import os
+import time
+from sqlalchemy import bindparam, insert, update
+from app import db
+from app.models import Student, Course
+from app.utils import eligibility_index, row_counts
+
+# Bulk student import from CSV or XLSX (admin "Import Students" page and flask import-students).
+#
+# The file is read row by row, never loaded whole. Each row is validated against the course
+# names and student IDs preloaded into memory (no query per row), and valid rows are written
+# in batches with one executemany INSERT (and, with upsert, one executemany UPDATE) and one
+# commit per batch. Every rejected row is reported with its row number and the reason. If the
+# database refuses a batch (a row the checks above let through, e.g. a student ID added by
+# someone else meanwhile), the batch is rolled back and written again row by row, so the
+# other rows of the batch are still saved and the failing ones reported individually.
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000  # per-row errors kept in the report; the total is always counted
+
+# Accepted header spellings -> Student column
+HEADER_ALIASES = {
+    'name': 'name', 'full name': 'name', 'student name': 'name',
+    'student_id': 'student_id', 'student id': 'student_id', 'studentid': 'student_id', 'id': 'student_id',
+    'course': 'course', 'course name': 'course', 'course code': 'course',
+}
+REQUIRED_COLUMNS = ('name', 'student_id', 'course')
+
+
+def _normalise_header(header):
+    columns = [HEADER_ALIASES.get(str(h or '').strip().lower()) for h in header]
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}. Expected a header row with name, student_id and course.")
+    return columns
+
+
+def _rows_from_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        raise ValueError("The file is empty.")
+    columns = _normalise_header(header)
+    for row_number, values in enumerate(reader, start=2):
+        if any(v.strip() for v in values):
+            yield row_number, {c: v for c, v in zip(columns, values) if c}
+
+
+def _rows_from_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Importing .xlsx files needs the openpyxl package (pip install openpyxl); upload a .csv instead.")
+    # read_only streams the sheet instead of building it in memory
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ValueError(f"Could not read the Excel file: {e}")
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise ValueError("The file is empty.")
+        columns = _normalise_header(header)
+        for row_number, values in enumerate(rows, start=2):
+            if any(v not in (None, '') for v in values):
+                yield row_number, {c: _cell_text(v) for c, v in zip(columns, values) if c}
+    finally:
+        workbook.close()
+
+
+def _cell_text(value):
+    # Numeric student IDs typed into Excel come back as numbers, possibly floats (1234.0)
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def iter_student_rows(stream, filename):
+    """
+    Yields (row_number, {'name', 'student_id', 'course'}) for each data row of an uploaded file.
+
+    Args:
+        stream: Binary file object of the upload.
+        filename (str): Used to tell CSV from XLSX by its extension.
+
+    Raises:
+        ValueError: If the file type is not supported or the header row is missing columns.
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension == '.csv':
+        return _rows_from_csv(stream)
+    if extension == '.xlsx':
+        return _rows_from_xlsx(stream)
+    raise ValueError("Unsupported file type, upload a .csv or .xlsx file.")
+
+
+def import_students(rows, upsert=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validates and stores students from iter_student_rows(). Must be called inside an application context.
+
+    Args:
+        rows (iterable): (row_number, row dict) pairs.
+        upsert (bool): Update the name and course of students whose student ID already exists,
+                       instead of rejecting those rows.
+        batch_size (int): Rows per executemany statement and commit.
+
+    Returns:
+        dict: 'rows', 'inserted', 'updated', 'failed' counts, 'seconds', and 'errors' - a list of
+              {'row', 'student_id', 'error'} (at most MAX_REPORTED_ERRORS entries).
+    """
+    started = time.perf_counter()
+    # Course names are stored on the student; a course code is accepted too and mapped to its name
+    courses = {}
+    for name, code in db.session.query(Course.name, Course.code):
+        courses[name.lower()] = name
+        if code:
+            courses[code.lower()] = name
+    existing = dict(db.session.query(Student.student_id, Student.id))  # student_id -> primary key
+    seen = set()  # student IDs already used earlier in this file
+
+    report = {'rows': 0, 'inserted': 0, 'updated': 0, 'failed': 0, 'errors': [], 'seconds': 0.0}
+    inserts, updates = [], []
+
+    def reject(row_number, student_id, error):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'student_id': student_id, 'error': error})
+
+    for row_number, row in rows:
+        report['rows'] += 1
+        name = (row.get('name') or '').strip()
+        student_id = (row.get('student_id') or '').strip()
+        course_given = (row.get('course') or '').strip()
+        course = courses.get(course_given.lower())
+
+        if not name or not student_id or not course_given:
+            reject(row_number, student_id, 'Name, student ID and course are required.')
+        elif len(name) > 128 or len(student_id) > 64:
+            reject(row_number, student_id, 'Name (max 128) or student ID (max 64) is too long.')
+        elif course is None:
+            reject(row_number, student_id, f'Unknown course "{course_given}".')
+        elif student_id in seen:
+            reject(row_number, student_id, 'Student ID appears more than once in the file.')
+        elif student_id in existing and not upsert:
+            reject(row_number, student_id, 'Student ID already exists.')
+        else:
+            seen.add(student_id)
+            if student_id in existing:
+                updates.append((row_number, {'b_student_id': student_id, 'b_name': name, 'b_course': course}))
+            else:
+                inserts.append((row_number, {'name': name, 'student_id': student_id, 'course': course}))
+            if len(inserts) + len(updates) >= batch_size:
+                _write_batch(inserts, updates, existing, report, reject)
+                inserts, updates = [], []
+    _write_batch(inserts, updates, existing, report, reject)
+
+    report['seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def _write_batch(inserts, updates, existing, report, reject):
+    # inserts/updates: (row_number, parameters) pairs
+    if not inserts and not updates:
+        return
+    try:
+        _execute(inserts, updates)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # Find the offending rows: one commit per row, only on this (rare) path
+        saved_inserts, saved_updates = [], []
+        for row_number, params in inserts:
+            if _write_row(row_number, params['student_id'], reject, [(row_number, params)], []):
+                saved_inserts.append((row_number, params))
+        for row_number, params in updates:
+            if _write_row(row_number, params['b_student_id'], reject, [], [(row_number, params)]):
+                saved_updates.append((row_number, params))
+        inserts, updates = saved_inserts, saved_updates
+    report['inserted'] += len(inserts)
+    report['updated'] += len(updates)
+    # Renamed students may be in the scan station's eligibility index
+    for _, row in updates:
+        student_id = row['b_student_id']
+        eligibility_index.update_student(student_id, eligibility_index.IndexedStudent(existing[student_id], student_id, row['b_name']))
+
+
+def _write_row(row_number, student_id, reject, inserts, updates):
+    try:
+        _execute(inserts, updates)
+        db.session.commit()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        reject(row_number, student_id, f'Not saved: {getattr(e, "orig", None) or e}')
+        return False
+
+
+def _execute(inserts, updates):
+    table = Student.__table__
+    if inserts:
+        db.session.execute(insert(table), [params for _, params in inserts])
+        row_counts.track(Student, len(inserts))
+    if updates:
+        db.session.execute(
+            update(table).where(table.c.student_id == bindparam('b_student_id'))
+            .values(name=bindparam('b_name'), course=bindparam('b_course')),
+            [params for _, params in updates])
+
+
+def errors_csv(report):
+    """Returns the per-row error report as CSV text (row, student_id, error)."""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['row', 'student_id', 'error'])
+    for error in report['errors']:
+        writer.writerow([error['row'], error['student_id'], error['error']])
+    return out.getvalue()
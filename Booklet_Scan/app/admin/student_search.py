@@ -0,0 +1,174 @@
+from sqlalchemy import event, text
+from app import db
+from app.models import Student
+
+# Type-ahead student search (/admin/api/students/search) on name and student ID.
+#
+# On SQLite the names and IDs are indexed in an FTS5 table, student_search, that reads its
+# rows from the student table (external content) and is kept in step by triggers on
+# insert, delete and update of name/student_id - so ORM writes, the bulk import's Core inserts
+# and cascading deletes all update it in their own transaction.
+#
+# The trigram tokenizer (SQLite 3.34+) matches any substring of at least 3 characters; on older
+# SQLite the unicode61 tokenizer is used and words match by prefix. Shorter queries, and
+# databases without FTS5, fall back to a LIKE prefix match on the student table.
+#
+# Results are ranked: exact student ID, student ID prefix, name prefix, then the rest by FTS
+# rank and name.
+
+SEARCH_TABLE = 'student_search'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+MIN_TRIGRAM_LENGTH = 3
+
+_tokenizers = {}  # database URL -> tokenizer of its index (None: no index), looked up once
+
+TOKENIZERS = [
+    ('trigram', "tokenize='trigram'"),
+    ('unicode61', "tokenize='unicode61', prefix='2 3'"),
+]
+
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON student
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, name, student_id) VALUES (NEW.id, NEW.name, NEW.student_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON student
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, name, student_id) VALUES ('delete', OLD.id, OLD.name, OLD.student_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE OF name, student_id ON student
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, name, student_id) VALUES ('delete', OLD.id, OLD.name, OLD.student_id);
+        INSERT INTO {SEARCH_TABLE} (rowid, name, student_id) VALUES (NEW.id, NEW.name, NEW.student_id);
+    END""",
+]
+
+
+def _tokenizer(connection, cached=True):
+    # Tokenizer of the existing index, or None if there is none (or no SQLite)
+    if connection.dialect.name != 'sqlite':
+        return None
+    key = str(connection.engine.url)
+    if cached and key in _tokenizers:
+        return _tokenizers[key]
+    sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                             {'name': SEARCH_TABLE}).scalar()
+    tokenizer = None if sql is None else ('trigram' if 'trigram' in sql else 'unicode61')
+    _tokenizers[key] = tokenizer
+    return tokenizer
+
+
+def install_index(connection, rebuild=False):
+    """
+    Creates the FTS5 index and its triggers if missing (filling it from the student table), or
+    refills it with rebuild=True. No-op on databases other than SQLite or without FTS5.
+
+    Returns:
+        str | None: The tokenizer in use ('trigram' or 'unicode61'), None without an index.
+    """
+    if connection.dialect.name != 'sqlite':
+        return None
+    tokenizer = _tokenizer(connection, cached=False)
+    if tokenizer is None:
+        for name, options in TOKENIZERS:
+            try:
+                connection.execute(text(
+                    f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(name, student_id, "
+                    f"content='student', content_rowid='id', {options})"))
+                tokenizer = _tokenizers[str(connection.engine.url)] = name
+                rebuild = True
+                break
+            except Exception as e:
+                # No trigram tokenizer (SQLite < 3.34), or no FTS5 at all
+                print(f"Student search: FTS5 with {name} tokenizer not available: {e}")
+        if tokenizer is None:
+            return None
+    for trigger in TRIGGERS:
+        connection.execute(text(trigger))
+    if rebuild:
+        connection.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild')"))
+    return tokenizer
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _after_create(metadata, connection, **kw):
+    # db.create_all(): index a new database, or an existing one that predates the index
+    install_index(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _before_drop(metadata, connection, **kw):
+    # db.drop_all(): the index is not part of the metadata, drop it with the student table
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(f"DROP TABLE IF EXISTS {SEARCH_TABLE}"))
+        _tokenizers.pop(str(connection.engine.url), None)
+
+
+def rebuild():
+    """
+    Recreates the triggers and refills the index from the student table. Must be called inside
+    an application context.
+
+    Returns:
+        str | None: The tokenizer in use, None if the database has no FTS5 index.
+    """
+    db.session.commit()  # start from a clean transaction
+    with db.engine.begin() as connection:
+        return install_index(connection, rebuild=True)
+
+
+def _like_pattern(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _match_expression(query, tokenizer):
+    # Every word must match: a quoted substring (trigram) or a quoted word prefix (unicode61)
+    words = query.split()
+    if tokenizer == 'trigram':
+        if any(len(word) < MIN_TRIGRAM_LENGTH for word in words):
+            return None
+        return ' AND '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+    return ' AND '.join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+def search(query, limit=DEFAULT_LIMIT, exam_id=None):
+    """
+    Finds students whose name or student ID contains (or starts with) query.
+
+    Args:
+        query (str): What was typed.
+        limit (int): Most results returned (at most MAX_LIMIT).
+        exam_id (int, optional): Only students assigned to this exam.
+
+    Returns:
+        list: {'id', 'name', 'student_id', 'course'} dicts, best matches first.
+    """
+    query = ' '.join((query or '').split())
+    if not query:
+        return []
+    limit = max(1, min(int(limit or DEFAULT_LIMIT), MAX_LIMIT))
+    connection = db.session.connection()
+    match = _match_expression(query, _tokenizer(connection))
+
+    params = {'query': query, 'prefix': _like_pattern(query), 'limit': limit, 'exam_id': exam_id}
+    assigned = ("AND EXISTS (SELECT 1 FROM student_exam_assignment a "
+                "WHERE a.student_id = s.id AND a.exam_id = :exam_id)") if exam_id else ""
+    tier = ("CASE WHEN s.student_id = :query THEN 0 WHEN s.student_id LIKE :prefix ESCAPE '\\' THEN 1 "
+            "WHEN s.name LIKE :prefix ESCAPE '\\' THEN 2 ELSE 3 END")
+    if match is not None:
+        params['match'] = match
+        sql = (f"SELECT s.id, s.name, s.student_id, s.course FROM {SEARCH_TABLE} f "
+               f"JOIN student s ON s.id = f.rowid WHERE {SEARCH_TABLE} MATCH :match {assigned} "
+               f"ORDER BY {tier}, f.rank, s.name LIMIT :limit")
+    else:
+        sql = (f"SELECT s.id, s.name, s.student_id, s.course FROM student s "
+               f"WHERE (s.student_id LIKE :prefix ESCAPE '\\' OR s.name LIKE :prefix ESCAPE '\\') {assigned} "
+               f"ORDER BY {tier}, s.name LIMIT :limit")
+    return [{'id': row.id, 'name': row.name, 'student_id': row.student_id, 'course': row.course}
+            for row in db.session.execute(text(sql), params)]
+
+
+def find_student(identifier):
+    """The student with exactly this student ID, or None."""
+    return Student.query.filter_by(student_id=(identifier or '').strip()).first()
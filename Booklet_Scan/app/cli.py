@@ -0,0 +1,354 @@
+import os
+import click
+
+# Flask CLI commands (run from the Booklet_Scan directory with FLASK_APP=run.py),
+# registered on the app by create_app().
+
+
+def register(app):
+
+    @app.cli.command('pregenerate-booklets')
+    @click.argument('exam_id', type=int)
+    @click.option('--workers', type=int, default=None, help='Size of the process pool (default: PREGEN_WORKERS or CPU count).')
+    def pregenerate_booklets(exam_id, workers):
+        """Pre-generate booklets for every student assigned to EXAM_ID. Safe to re-run to resume."""
+        from app.main.pregenerate import pregenerate_exam_booklets
+
+        def progress(done, total, failed):
+            if total and (done == total or done % 25 == 0):
+                click.echo(f"  {done}/{total} booklets ({failed} failed)")
+
+        try:
+            summary = pregenerate_exam_booklets(exam_id, workers=workers, progress=progress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Assigned: {summary['assigned']}, already prepared: {summary['skipped']}, "
+                   f"generated: {summary['generated']}, failed: {summary['failed']}")
+
+    @app.cli.command('print-booklets')
+    @click.argument('exam_id', type=int)
+    @click.option('--batch-size', type=int, default=None, help='Booklets per print job (default: PRINT_BATCH_SIZE).')
+    @click.option('--flush-interval', type=float, default=None,
+                  help='Seconds before a partial batch is printed anyway (default: PRINT_BATCH_FLUSH_INTERVAL).')
+    def print_booklets(exam_id, batch_size, flush_interval):
+        """Pre-print one booklet per student assigned to EXAM_ID, merged into multi-page print jobs."""
+        from app.main.preprint import preprint_exam_booklets
+
+        try:
+            stats, batches = preprint_exam_booklets(exam_id, batch_size=batch_size, flush_interval=flush_interval)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        for batch in batches:
+            status = 'printed' if batch['printed'] else 'FAILED'
+            click.echo(f"  {batch['batch_id']}: {len(batch['pages'])} pages {status} ({batch['pdf_path']})")
+        click.echo(f"Jobs: {stats['jobs']} ({stats['failed_jobs']} failed), pages: {stats['pages']} "
+                   f"({stats['failed_pages']} failed) in {stats['elapsed_seconds']}s - "
+                   f"{stats['jobs_per_second']} jobs/s, {stats['pages_per_second']} pages/s")
+        click.echo("Page -> barcode maps are saved next to each batch PDF as <batch>.json.")
+
+    @app.cli.command('bench-booklets')
+    @click.option('--count', type=int, default=200, help='Booklets rendered per measurement.')
+    def bench_booklets(count):
+        """Micro-benchmark booklet PDF rendering: original drawing vs the cached page template."""
+        from app.utils.booklet_generator import benchmark_booklets
+
+        result = benchmark_booklets(count)
+        click.echo(f"Booklets rendered per measurement: {result['count']}")
+        click.echo(f"  original drawing, one PDF each: {result['reference']} booklets/s")
+        click.echo(f"  cached template, one PDF each:  {result['template']} booklets/s ({result['speedup']}x)")
+        click.echo(f"  cached template, one batch PDF: {result['template_batch']} booklets/s")
+
+    @app.cli.command('bench-pdf')
+    @click.option('--count', type=int, default=200, help='Booklets timed per round.')
+    @click.option('--rounds', type=int, default=3, help='Timed rounds per case; the fastest counts.')
+    @click.option('--workers', type=int, default=None, help='Pool size for the process-pool case (default: CPU count).')
+    @click.option('--prefixes', default='BK,EXAM', help='Comma-separated barcode prefixes.')
+    @click.option('--lengths', default='12,28,48', help='Comma-separated barcode lengths (characters after the prefix).')
+    @click.option('--baseline', 'baseline_path', type=click.Path(dir_okay=False), default=None,
+                  help='Baseline JSON file (default: booklet_bench_baseline.json next to app.db).')
+    @click.option('--save-baseline', is_flag=True, help='Save these results as the new baseline.')
+    @click.option('--threshold', type=float, default=0.15, help='Allowed booklets/s drop against the baseline (0.15 = 15%).')
+    @click.option('--json', 'as_json', is_flag=True, help='Print the results as JSON.')
+    def bench_pdf(count, rounds, workers, prefixes, lengths, baseline_path, save_baseline, threshold, as_json):
+        """Booklet PDF benchmark suite: booklets/s, bytes, peak RSS, import cost; fails on regressions."""
+        import json
+        from app import pdf_bench
+
+        try:
+            prefix_list = [p.strip() for p in prefixes.split(',')]
+            length_list = [int(n) for n in lengths.split(',')]
+        except ValueError:
+            raise click.BadParameter('expected comma-separated whole numbers', param_hint='--lengths')
+        baseline_path = baseline_path or pdf_bench.DEFAULT_BASELINE_PATH
+
+        results = pdf_bench.run_benchmarks(count=count, workers=workers, prefixes=prefix_list, lengths=length_list,
+                                           rounds=rounds)
+        comparison = []
+        if not save_baseline and os.path.exists(baseline_path):
+            comparison = pdf_bench.compare_to_baseline(results, pdf_bench.load_baseline(baseline_path), threshold)
+
+        if as_json:
+            click.echo(json.dumps(dict(results, baseline_comparison=comparison), indent=2))
+        else:
+            click.echo(f"{count} booklets per round, best of {rounds}, pool of {results['workers']} workers")
+            for name, case in results['cases'].items():
+                worker_rss = f", workers {case['peak_worker_rss_kb']} KB" if case['peak_worker_rss_kb'] else ''
+                click.echo(f"  {name:<22} {case['booklets_per_second']:>8} booklets/s  {case['bytes_per_pdf']:>6} bytes/PDF  "
+                           f"peak RSS {case['peak_rss_kb']} KB{worker_rss}")
+            for label, timings in (('cold', results['imports']['cold_ms']), ('warm', results['imports']['warm_ms'])):
+                if timings:
+                    click.echo(f"  import ({label}): reportlab {timings['reportlab_import']} ms, app + booklet module "
+                               f"{timings['module_import']} ms, first booklet {timings['first_booklet']} ms, "
+                               f"next {timings['next_booklet']} ms")
+            for row in comparison:
+                status = 'REGRESSED' if row['regressed'] else 'ok'
+                click.echo(f"  vs baseline {row['case']:<22} {row['baseline']:>8} -> {row['current']:>8} "
+                           f"({row['change']:+.1%}) {status}")
+
+        if save_baseline:
+            pdf_bench.save_baseline(results, baseline_path)
+            click.echo(f"Baseline saved to {baseline_path}", err=as_json)
+        elif not os.path.exists(baseline_path):
+            click.echo(f"No baseline at {baseline_path}; run with --save-baseline to create one.", err=as_json)
+        regressed = [row['case'] for row in comparison if row['regressed']]
+        if regressed:
+            raise click.ClickException(f"booklets/s dropped more than {threshold:.0%} below the baseline: {', '.join(regressed)}")
+
+    @app.cli.command('startup-profile')
+    @click.option('--runs', type=int, default=3, help='Fresh interpreters timed; the first is reported as cold.')
+    @click.option('--top', type=int, default=10, help='Slowest packages and app modules listed.')
+    @click.option('--max-ms', type=float, default=None, help='Fail if the cold boot-to-ready time is above this.')
+    @click.option('--json', 'as_json', is_flag=True, help='Print the results as JSON.')
+    def startup_profile(runs, top, max_ms, as_json):
+        """Boot-to-ready time of the server: imports, create_app phases, database set-up, first request."""
+        import json
+        from app import startup_profile as profile
+
+        results = profile.run_profile(runs=runs, top=top)
+        if as_json:
+            click.echo(json.dumps(results, indent=2))
+        else:
+            for label, run in (('cold', results['cold']), ('warm', results['warm'])):
+                if not run:
+                    continue
+                click.echo(f"{label}: ready after {run['boot_to_ready']} ms")
+                for step in profile.STEPS:
+                    click.echo(f"  {step:<14} {run[step]:>8} ms")
+                click.echo("  create_app phases: " + ', '.join(f"{phase} {ms} ms" for phase, ms in run['create_app_phases'].items()))
+                click.echo(f"  booklet warm-up (in the background once ready): import {run['warmup_import']} ms, "
+                           f"first booklet {run['warmup_first_booklet']} ms")
+            click.echo("Slowest packages (import self time, warm-up included): " +
+                       ', '.join(f"{name} {ms} ms" for name, ms in results['imports']['packages']))
+            click.echo("Slowest app modules (cumulative import time): " +
+                       ', '.join(f"{name} {ms} ms" for name, ms in results['imports']['app_modules']))
+        if max_ms is not None and results['cold']['boot_to_ready'] > max_ms:
+            raise click.ClickException(f"cold start took {results['cold']['boot_to_ready']} ms, over the {max_ms:.0f} ms target")
+
+    @app.cli.command('stress-scans')
+    @click.option('--processes', type=int, default=4, help='Worker processes (stations / server workers).')
+    @click.option('--threads', type=int, default=4, help='Threads per process.')
+    @click.option('--codes', type=int, default=200, help='Distinct booklet codes, each attempted by every thread.')
+    @click.option('--database', type=click.Path(dir_okay=False), default=None,
+                  help='Scratch SQLite file (default: a temporary file). Its tables are recreated!')
+    def stress_scans(processes, threads, codes, database):
+        """Concurrent multi-station scan test: no duplicate records, no "database is locked"."""
+        from app.stress import run_stress_test
+
+        result = run_stress_test(processes=processes, threads=threads, codes=codes,
+                                 database=database, base_config=app.config)
+        click.echo(f"{result['attempts']} attempts from {processes}x{threads} clients in {result['seconds']}s "
+                   f"({result['attempts_per_second']}/s, journal_mode={result['journal_mode']})")
+        click.echo(f"Outcomes: {result['outcomes']}, rows stored: {result['rows']}, "
+                   f"duplicate rows: {result['duplicate_rows']}, locked errors: {result['locked_errors']}")
+        for error in result['errors']:
+            click.echo(f"  error: {error}")
+        if not result['passed']:
+            raise click.ClickException('; '.join(result['problems']))
+        click.echo('PASSED')
+
+    @app.cli.command('load-test-scans')
+    @click.option('--stations', type=int, default=8, help='Simulated stations scanning concurrently.')
+    @click.option('--scans', type=int, default=50, help='Scans per station.')
+    @click.option('--students', type=int, default=500, help='Students seeded, spread over the exams.')
+    @click.option('--exams', type=int, default=4, help='Exams seeded (one per room of stations).')
+    @click.option('--lp-latency', type=float, default=0.05, help='Seconds the stub lp takes per print job.')
+    @click.option('--lcd-latency', type=float, default=0.005, help='Seconds the stub LCD takes per write.')
+    @click.option('--ineligible', type=float, default=0.05, help='Share of scans of a student not assigned to the exam.')
+    @click.option('--record-share', type=float, default=0.0, help='Share of scans recording a pre-printed booklet code.')
+    @click.option('--journal', is_flag=True, help='Record scans through the write-behind scan journal.')
+    @click.option('--seed', type=int, default=1, help='Random seed for the scan order.')
+    @click.option('--database', type=click.Path(dir_okay=False), default=None,
+                  help='Scratch SQLite file (default: a temporary file). Its tables are recreated!')
+    @click.option('--output', type=click.Path(dir_okay=False), default=None, help='Write the JSON results here instead of stdout.')
+    @click.option('--max-p95', multiple=True, metavar='STEP=MS',
+                  help='Fail if the p95 latency of STEP (check_student, booklet_job, record_booklet) exceeds MS. Repeatable.')
+    def load_test_scans(stations, scans, students, exams, lp_latency, lcd_latency, ineligible, record_share,
+                        journal, seed, database, output, max_p95):
+        """Scan-station load test: throughput and p50/p95/p99 latency per scan step, as JSON."""
+        import contextlib
+        import json
+        import sys
+        from app.loadtest import run_load_test
+
+        limits = {}
+        for limit in max_p95:
+            step, _, value = limit.partition('=')
+            try:
+                limits[step] = float(value)
+            except ValueError:
+                raise click.BadParameter(f"expected STEP=MS, got {limit!r}", param_hint='--max-p95')
+
+        # The printing and LCD code report with print(); keep stdout for the JSON
+        with contextlib.redirect_stdout(sys.stderr):
+            result = run_load_test(stations=stations, scans=scans, students=students, exams=exams,
+                                   lp_latency=lp_latency, lcd_latency=lcd_latency, ineligible=ineligible,
+                                   record_share=record_share, journal=journal, seed=seed,
+                                   database=database, base_config=app.config)
+        text = json.dumps(result, indent=2)
+        if output:
+            with open(output, 'w') as f:
+                f.write(text + '\n')
+            click.echo(f"Results written to {output}", err=True)
+        else:
+            click.echo(text)
+
+        problems = []
+        for step, limit in limits.items():
+            if step not in result['steps']:
+                problems.append(f"unknown step {step!r}")
+                continue
+            p95 = result['steps'][step]['latency_ms']['p95']
+            if p95 is not None and p95 > limit:
+                problems.append(f"{step} p95 {p95} ms > {limit} ms")
+        if result['undrained_jobs']:
+            problems.append(f"{result['undrained_jobs']} booklet jobs still queued at the end")
+        if problems:
+            raise click.ClickException('; '.join(problems))
+
+    @app.cli.command('check-query-budget')
+    @click.option('--verbose', is_flag=True, help='Print the SQL of pages over budget.')
+    def check_query_budget(verbose):
+        """Count the SQL statements of each admin/scan page against its budget (catches N+1 queries)."""
+        from app.query_budget import run_query_budget
+
+        results = run_query_budget(base_config=app.config)
+        for result in results:
+            status = 'ok' if result['passed'] else 'OVER BUDGET'
+            if result['status'] != 200:
+                status = f"HTTP {result['status']}"
+            click.echo(f"{result['endpoint']:<28} {result['queries']:>3} / {result['budget']:<3} {status}")
+            if verbose and not result['passed']:
+                for statement in result['statements']:
+                    click.echo('    ' + ' '.join(statement.split()))
+        failed = [result['endpoint'] for result in results if not result['passed']]
+        if failed:
+            raise click.ClickException(f"{len(failed)} page(s) over their SQL statement budget: {', '.join(failed)}")
+        click.echo('PASSED')
+
+    @app.cli.command('import-students')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--upsert', is_flag=True, help='Update existing students (matched by student ID) instead of rejecting them.')
+    @click.option('--batch-size', type=int, default=None, help='Rows per batched insert/commit (default 1000).')
+    @click.option('--errors-file', type=click.Path(dir_okay=False), default=None, help='Write the per-row error report to this CSV file.')
+    def import_students(path, upsert, batch_size, errors_file):
+        """Bulk import students from a .csv or .xlsx file with name, student_id and course columns."""
+        from app.admin import student_import
+
+        with open(path, 'rb') as f:
+            try:
+                rows = student_import.iter_student_rows(f, path)
+                report = student_import.import_students(rows, upsert=upsert,
+                                                        batch_size=batch_size or student_import.DEFAULT_BATCH_SIZE)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+        click.echo(f"Rows: {report['rows']}, added: {report['inserted']}, updated: {report['updated']}, "
+                   f"rejected: {report['failed']} in {report['seconds']}s")
+        if errors_file:
+            with open(errors_file, 'w', newline='') as f:
+                f.write(student_import.errors_csv(report))
+            click.echo(f"Error report written to {errors_file}")
+        else:
+            for error in report['errors'][:20]:
+                click.echo(f"  row {error['row']}: {error['student_id']}: {error['error']}")
+            if report['failed'] > 20:
+                click.echo(f"  ... {report['failed'] - 20} more, use --errors-file for the full report")
+
+    @app.cli.command('assign-students')
+    @click.argument('exam_id', type=int)
+    @click.option('--course', default=None, help='Only students of this course (exact name).')
+    @click.option('--name-contains', default=None, help='Only students whose name contains this text.')
+    @click.option('--id-prefix', default=None, help='Only students whose student ID starts with this.')
+    @click.option('--all', 'all_students', is_flag=True, help='Match every student (required when no filter is given).')
+    @click.option('--unassign', is_flag=True, help='Remove the matching students from the exam instead.')
+    def assign_students(exam_id, course, name_contains, id_prefix, all_students, unassign):
+        """Assign (or with --unassign remove) every student matching the filters to EXAM_ID in one statement."""
+        from app.admin import bulk_assign
+        from app.models import Exam
+
+        exam = Exam.query.get(exam_id)
+        if exam is None:
+            raise click.ClickException(f"Exam {exam_id} not found.")
+        if not (course or name_contains or id_prefix or all_students):
+            raise click.ClickException("Give at least one filter, or --all to match every student.")
+        filters = dict(course=course, name_contains=name_contains, student_id_prefix=id_prefix)
+        if unassign:
+            result = bulk_assign.unassign_students(exam, **filters)
+            click.echo(f"Matched {result['matched']} students: removed {result['deleted']}, "
+                       f"{result['skipped']} were not assigned to {exam.name}.")
+        else:
+            result = bulk_assign.assign_students(exam, **filters)
+            click.echo(f"Matched {result['matched']} students: assigned {result['inserted']}, "
+                       f"{result['skipped']} already assigned to {exam.name}.")
+
+    @app.cli.command('rebuild-exam-progress')
+    def rebuild_exam_progress():
+        """Recompute every exam's progress counters from the assignment and scan tables."""
+        from app.main import exam_progress
+
+        exams = exam_progress.rebuild()
+        click.echo(f"Rebuilt progress counters of {exams} exam(s).")
+
+    @app.cli.command('rebuild-student-search')
+    def rebuild_student_search():
+        """Recreate the student search index (SQLite FTS5) and its triggers from the student table."""
+        from app.admin import student_search
+
+        tokenizer = student_search.rebuild()
+        if tokenizer is None:
+            click.echo("This database has no FTS5 support; student search uses LIKE queries.")
+        else:
+            click.echo(f"Rebuilt the student search index ({tokenizer} tokenizer).")
+
+    @app.cli.command('export-scans')
+    @click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+    @click.option('--format', 'export_format', type=click.Choice(['csv', 'jsonl', 'xlsx']), default=None,
+                  help='Output format (default: from the file extension, else csv).')
+    @click.option('--exam-id', type=int, default=None, help='Only scans of this exam.')
+    @click.option('--venue-id', type=int, default=None, help='Only scans of exams at this venue.')
+    @click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), default=None, help='Only scans on or after this day.')
+    @click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), default=None, help='Only scans on or before this day.')
+    @click.option('--gzip', 'compress', is_flag=True, help='gzip the output (implied by a .gz file name).')
+    def export_scans(output, export_format, exam_id, venue_id, date_from, date_to, compress):
+        """Stream scan records to OUTPUT (a file, or - for stdout) as CSV, JSON Lines or XLSX."""
+        from app.admin import scan_export
+
+        name = output.lower()
+        if name.endswith('.gz'):
+            compress, name = True, name[:-3]
+        if export_format is None:
+            extension = os.path.splitext(name)[1].lstrip('.')
+            export_format = extension if extension in scan_export.FORMATS else 'csv'
+        statement = scan_export.export_statement(exam_id=exam_id, venue_id=venue_id,
+                                                 date_from=date_from.date() if date_from else None,
+                                                 date_to=date_to.date() if date_to else None)
+        try:
+            chunks = scan_export.iter_export(export_format, statement, compress=compress)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        written = 0
+        with click.open_file(output, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        if output != '-':
+            click.echo(f"Wrote {written} bytes of {export_format}{' (gzip)' if compress else ''} to {output}")
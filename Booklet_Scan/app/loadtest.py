@@ -0,0 +1,256 @@
+import datetime
+import os
+import random
+import stat
+import tempfile
+import threading
+import time
+from config import Config
+
+# Scan-station load test (flask load-test-scans).
+#
+# Seeds a scratch database with students, exams and assignments, then lets several simulated
+# stations - one thread and one logged-in client each - drive the scan page (scan_ui) at the
+# same time, the way a threaded server process serves a room full of invigilators:
+#
+#   check_student  - POST "Check Eligibility": eligibility check and, for an eligible student,
+#                    queueing the background generate -> print -> record job
+#   booklet_job    - from queueing that job until it is done (runs in the print job pool)
+#   record_booklet - POST "Record Booklet Scan" of a pre-printed booklet code
+#
+# The printer is a stub `lp` script that sleeps --lp-latency seconds per job and the LCD a
+# ConsoleBackend sleeping --lcd-latency seconds per write, so the results reflect the
+# server and not whatever printer happens to be attached. Inside the booklet jobs the
+# booklet_pdf / print_pdf / lcd_write spans of app/utils/perf.py are reported as well.
+# The same --seed gives the same students, stations and scan order.
+
+STUB_LP_SCRIPT = """#!/bin/sh
+# Stub lp for the scan load test: swallow the PDF (from stdin when no file is given), wait, succeed.
+for arg in "$@"; do
+    case "$arg" in *.pdf) file_given=1 ;; esac
+done
+[ -n "$file_given" ] || cat > /dev/null
+sleep {latency}
+echo "request id is loadtest-0 (1 file(s))"
+"""
+
+LOGIN = ('loadtest', 'loadtest')
+
+
+def _load_config(database_uri, base_config, temp_dir, journal):
+    overrides = {key: value for key, value in base_config.items()
+                 if key.startswith('SQLITE_') or key.startswith('PRINT_JOB_') or key.startswith('SCAN_JOURNAL_')
+                 or key in ('SQLALCHEMY_ENGINE_OPTIONS', 'BOOKLET_ZERO_DISK')}
+    overrides.update(SQLALCHEMY_DATABASE_URI=database_uri, TESTING=True, WTF_CSRF_ENABLED=False,
+                     PRINTER_COMMAND=os.path.join(temp_dir, 'lp'), DEFAULT_PRINTER_NAME=None,
+                     BOOKLET_ARCHIVE=False, PRINT_JOB_HISTORY=10 ** 6,
+                     PERF_MONITOR=True, PERF_WINDOW=10 ** 6, PERF_SLOW_REQUEST_MS=10 ** 6,
+                     SCAN_JOURNAL=journal, SCAN_JOURNAL_PATH=os.path.join(temp_dir, 'scan_journal.jsonl'))
+    return type('LoadTestConfig', (Config,), overrides)
+
+
+def _write_stub_lp(temp_dir, latency):
+    path = os.path.join(temp_dir, 'lp')
+    with open(path, 'w') as f:
+        f.write(STUB_LP_SCRIPT.format(latency=f'{latency:.3f}'))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+def _seed(db, students, exams):
+    from app.models import AdminUser, Exam, Student, StudentExamAssignment, Venue
+
+    admin = AdminUser(username=LOGIN[0])
+    admin.set_password(LOGIN[1])
+    db.session.add(admin)
+    venues = [Venue(name=f'Load Hall {n}') for n in range(exams)]
+    db.session.add_all(venues)
+    db.session.flush()
+    for n, venue in enumerate(venues):
+        db.session.add(Exam(id=n + 1, name=f'Load Exam {n}', course='LOAD', venue_id=venue.id,
+                            date=datetime.date.today(), start_time=datetime.time(9), end_time=datetime.time(12)))
+    db.session.flush()
+    # Students are spread evenly over the exams; student n sits exam n % exams
+    db.session.execute(Student.__table__.insert(), [
+        {'name': f'Load Student {n}', 'student_id': f'LOAD{n:06d}', 'course': 'LOAD'} for n in range(students)])
+    ids = [row[0] for row in db.session.query(Student.id).order_by(Student.student_id)]
+    db.session.execute(StudentExamAssignment.__table__.insert(), [
+        {'student_id': student_id, 'exam_id': n % exams + 1} for n, student_id in enumerate(ids)])
+    db.session.commit()
+
+
+def _station(app, number, scans, students, exams, ineligible, record_share, seed, samples, outcomes, lock):
+    # One scan station: its own client and session, scanning for the exam of its room
+    rng = random.Random(seed * 1000 + number)
+    exam_id = number % exams + 1
+    own = [n for n in range(students) if n % exams + 1 == exam_id]
+    others = [n for n in range(students) if n % exams + 1 != exam_id]
+    client = app.test_client()
+    client.post('/auth/login', data={'username': LOGIN[0], 'password': LOGIN[1]})
+
+    def timed_post(step, data):
+        started = time.perf_counter()
+        response = client.post('/scan', data=data)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            samples[step].append(elapsed_ms)
+        return response
+
+    def count(step, outcome):
+        with lock:
+            outcomes[step][outcome] = outcomes[step].get(outcome, 0) + 1
+
+    for scan in range(scans):
+        if others and rng.random() < ineligible:
+            student = rng.choice(others)
+        else:
+            student = rng.choice(own)
+        student_identifier = f'LOAD{student:06d}'
+
+        if rng.random() < record_share:
+            # Pre-printed booklet: the invigilator scans the booklet's code for the student
+            response = timed_post('record_booklet', {'exam_id': exam_id, 'student_identifier': student_identifier,
+                                                     'booklet_code': f'LT{number:03d}{scan:06d}',
+                                                     'submit_record_scan': 'y'})
+            if response.status_code == 302:
+                count('record_booklet', 'recorded')
+            elif b'no longer eligible' in response.data or b'NOT ELIGIBLE' in response.data:
+                count('record_booklet', 'not_eligible')
+            elif b'already scanned' in response.data:
+                count('record_booklet', 'duplicate')
+            else:
+                count('record_booklet', f'http_{response.status_code}')
+            continue
+
+        response = timed_post('check_student', {'exam_id': exam_id, 'student_identifier': student_identifier,
+                                                'submit_check_student': 'y'})
+        if response.status_code == 302:
+            count('check_student', 'queued')
+        elif b'NOT ELIGIBLE' in response.data:
+            count('check_student', 'not_eligible')
+        elif b'Print queue is full' in response.data:
+            count('check_student', 'queue_full')
+        else:
+            count('check_student', f'http_{response.status_code}')
+
+
+def _step_report(values, seconds, outcomes=None):
+    from app.utils import perf
+
+    report = {'count': len(values), 'per_second': round(len(values) / seconds, 1) if seconds else None,
+              'latency_ms': perf.percentiles(values)}
+    if outcomes is not None:
+        report['outcomes'] = outcomes
+    return report
+
+
+def run_load_test(stations=8, scans=50, students=500, exams=4, lp_latency=0.05, lcd_latency=0.005,
+                  ineligible=0.05, record_share=0.0, journal=False, seed=1, drain_timeout=300,
+                  database=None, base_config=None):
+    """
+    Runs the scan-station load test against a scratch database.
+
+    Args:
+        stations (int): Simulated stations scanning concurrently (one thread each).
+        scans (int): Scans per station.
+        students (int): Students seeded, spread evenly over the exams.
+        exams (int): Exams seeded; station n scans for exam n % exams.
+        lp_latency (float): Seconds the stub lp takes per print job.
+        lcd_latency (float): Seconds the stub LCD takes per write.
+        ineligible (float): Share of scans of a student not assigned to the station's exam.
+        record_share (float): Share of scans that record a pre-printed booklet code instead of
+                              printing one (the record_booklet step).
+        journal (bool): Record scans through the write-behind scan journal.
+        seed (int): Random seed for the scan order.
+        drain_timeout (float): Seconds to wait for queued booklet jobs once the stations are done.
+        database (str, optional): SQLite file to use; a temporary file by default.
+        base_config (dict, optional): Config to copy the SQLITE_*, PRINT_JOB_*, SCAN_JOURNAL_*,
+                                      pool and BOOKLET_ZERO_DISK settings from.
+
+    Returns:
+        dict: The settings, and per step ('check_student', 'booklet_job', 'record_booklet') the
+              count, throughput and p50/p95/p99/max latency in ms with its outcomes; the
+              'spans' measured inside the booklet jobs; 'seconds' and 'scans_per_second'.
+    """
+    from app import create_app, db
+    from app.main import print_jobs, scan_journal
+    from app.utils import lcd_display, perf
+
+    temp_dir = tempfile.mkdtemp(prefix='booklet-loadtest-')
+    if database is None:
+        database = os.path.join(temp_dir, 'loadtest.db')
+    database_uri = 'sqlite:///' + os.path.abspath(database)
+    _write_stub_lp(temp_dir, lp_latency)
+
+    # Keep the stub display even on a Pi with the LCD attached
+    lcd_display.I2C_HARDWARE_AVAILABLE = False
+    lcd_display.set_backend(lcd_display.ConsoleBackend(echo=False, write_latency=lcd_latency))
+
+    app = create_app(_load_config(database_uri, base_config or {}, temp_dir, journal))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        _seed(db, students, exams)
+    perf.reset()
+
+    steps = ('check_student', 'record_booklet')
+    samples = {step: [] for step in steps}
+    outcomes = {step: {} for step in steps}
+    lock = threading.Lock()
+    workers = [threading.Thread(target=_station, args=(app, n, scans, students, exams, ineligible,
+                                                       record_share, seed, samples, outcomes, lock))
+               for n in range(stations)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    scanned = time.perf_counter() - started
+
+    # Let the print job pool finish the queued booklets
+    deadline = time.monotonic() + drain_timeout
+    while print_jobs.get_stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    undrained = print_jobs.get_stats()['pending']
+
+    jobs = print_jobs.get_jobs()
+    job_ms = [(job.updated_at - job.created_at).total_seconds() * 1000
+              for job in jobs if job.status == print_jobs.STATUS_DONE]
+    job_outcomes = {}
+    for job in jobs:
+        key = job.status if job.status != print_jobs.STATUS_FAILED else f'failed_{job.outcome}'
+        job_outcomes[key] = job_outcomes.get(key, 0) + 1
+    spans = {span['span']: {'count': span['samples'], 'latency_ms': span['ms']} for span in perf.get_report()['spans']}
+
+    print_jobs.shutdown(wait=True)
+    if scan_journal.is_enabled():
+        scan_journal.shutdown()
+    lcd_display.shutdown()
+    for job in jobs:
+        if job.pdf_file_path and os.path.exists(job.pdf_file_path):
+            os.remove(job.pdf_file_path)
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    for name in os.listdir(temp_dir):
+        os.remove(os.path.join(temp_dir, name))
+    os.rmdir(temp_dir)
+
+    total = sum(len(values) for values in samples.values())
+    return {
+        'settings': {'stations': stations, 'scans_per_station': scans, 'students': students, 'exams': exams,
+                     'lp_latency': lp_latency, 'lcd_latency': lcd_latency, 'ineligible': ineligible,
+                     'record_share': record_share, 'journal': journal, 'seed': seed,
+                     'print_job_workers': app.config.get('PRINT_JOB_WORKERS'),
+                     'print_job_queue_limit': app.config.get('PRINT_JOB_QUEUE_LIMIT'),
+                     'zero_disk': bool(app.config.get('BOOKLET_ZERO_DISK'))},
+        'steps': {
+            'check_student': _step_report(samples['check_student'], scanned, outcomes['check_student']),
+            'booklet_job': _step_report(job_ms, elapsed, job_outcomes),
+            'record_booklet': _step_report(samples['record_booklet'], scanned, outcomes['record_booklet']),
+        },
+        'spans': spans,
+        'seconds': round(elapsed, 2), 'scan_seconds': round(scanned, 2),
+        'scans_per_second': round(total / scanned, 1) if scanned else None,
+        'undrained_jobs': undrained,
+    }
@@ -0,0 +1,156 @@
+from flask import jsonify, request, current_app, url_for
+from flask_login import login_required
+from flask_wtf.csrf import validate_csrf
+from wtforms.validators import ValidationError
+from app.main import bp
+from app.main import scanning
+from app.main import print_jobs
+
+# JSON scan API used by the scan-station page (main/scan_station.html).
+# Each scan is a single small request/response: no form rebuild, no template render, no redirect.
+
+# HTTP status for each scan outcome
+OUTCOME_HTTP_STATUS = {
+    scanning.RECORDED: 200,
+    scanning.EXAM_NOT_FOUND: 404,
+    scanning.STUDENT_NOT_FOUND: 404,
+    scanning.NOT_ELIGIBLE: 403,
+    scanning.DUPLICATE: 409,
+    scanning.SAVE_FAILED: 500,
+}
+
+
+def _scan_response(outcome, message, **extra):
+    payload = {'ok': outcome == scanning.RECORDED, 'outcome': outcome, 'message': message}
+    payload.update(extra)
+    return jsonify(payload), OUTCOME_HTTP_STATUS.get(outcome, 200)
+
+
+def _bad_request(message):
+    return jsonify({'ok': False, 'outcome': 'bad_request', 'message': message}), 400
+
+
+def _read_scan_payload(*required):
+    """
+    Reads the JSON body of a scan API call and checks the CSRF token sent in the
+    X-CSRFToken header (the station page renders it into a hidden field).
+
+    Returns:
+        tuple: (data, error_response). error_response is None when the payload is usable.
+    """
+    if current_app.config.get('WTF_CSRF_ENABLED', True):
+        try:
+            validate_csrf(request.headers.get('X-CSRFToken'))
+        except ValidationError as e:
+            return None, _bad_request(f'CSRF check failed: {e}')
+
+    data = request.get_json(silent=True) or {}
+    for field in required:
+        if not str(data.get(field) or '').strip():
+            return None, _bad_request(f'Missing field: {field}')
+    try:
+        data['exam_id'] = int(data['exam_id'])
+    except (TypeError, ValueError):
+        return None, _bad_request('exam_id must be an integer.')
+    data['student_identifier'] = str(data['student_identifier']).strip()
+    return data, None
+
+
+@bp.route('/api/scan/check', methods=['POST'])
+@login_required
+def api_scan_check():
+    """
+    Checks a scanned student against an exam and, when eligible, queues a job that
+    generates, prints and records their booklet - the JSON equivalent of the
+    "Find Student / Check Eligibility" step of scan_ui. Answers 202 with the job
+    status right away; follow status_url for the outcome.
+
+    Body: {"exam_id": int, "student_identifier": str}
+    """
+    data, error = _read_scan_payload('exam_id', 'student_identifier')
+    if error:
+        return error
+
+    outcome, exam, student = scanning.check_eligibility(data['exam_id'], data['student_identifier'])
+    if outcome == scanning.EXAM_NOT_FOUND:
+        return _scan_response(outcome, 'Selected exam not found.')
+    if outcome == scanning.STUDENT_NOT_FOUND:
+        return _scan_response(outcome, f'Student ID "{data["student_identifier"]}" not found.')
+    if outcome == scanning.NOT_ELIGIBLE:
+        return _scan_response(outcome, f'Student {student.name} ({student.student_id}) is NOT ELIGIBLE for exam {exam.name} (not assigned).',
+                              student=scanning.student_info(student, exam))
+
+    job = print_jobs.submit_booklet_job(exam, student)
+    if job is None:
+        return jsonify({'ok': False, 'outcome': 'queue_full', 'student': scanning.student_info(student, exam),
+                        'message': 'Print queue is full. Please wait a moment and scan again.'}), 503
+    return _job_response(job, 202)
+
+
+def _job_response(job, status_code=200):
+    payload = dict(job, status_url=url_for('main.api_scan_job', job_id=job['job_id']))
+    return jsonify(payload), status_code
+
+
+@bp.route('/api/scan/jobs/<job_id>')
+@login_required
+def api_scan_job(job_id):
+    """
+    Status of a booklet job (queued, generating, spooling, recording, done, failed).
+
+    Pass ?wait=<seconds> (up to 25) together with ?since=<status> to long-poll: the response is
+    held until the job leaves that status, so a station does not need to poll in a tight loop.
+    """
+    wait = min(request.args.get('wait', 0, type=float), 25)
+    job = print_jobs.get_job_status(job_id, since=request.args.get('since'), wait=wait)
+    if job is None:
+        return jsonify({'ok': False, 'outcome': 'not_found', 'message': 'Unknown or expired job.'}), 404
+    return _job_response(job)
+
+
+@bp.route('/api/scan/jobs/<job_id>/retry', methods=['POST'])
+@login_required
+def api_scan_job_retry(job_id):
+    """Retries a failed booklet job without regenerating its PDF (see print_jobs.retry_job)."""
+    job = print_jobs.retry_job(job_id)
+    if job is None:
+        return jsonify({'ok': False, 'outcome': 'not_retryable',
+                        'message': 'Job not found, not failed, or the print queue is full.'}), 409
+    return _job_response(job, 202)
+
+
+@bp.route('/api/scan/record', methods=['POST'])
+@login_required
+def api_scan_record():
+    """
+    Records a pre-printed booklet code against an eligible student - the JSON
+    equivalent of the "Record Booklet Scan" step of scan_ui.
+
+    Body: {"exam_id": int, "student_identifier": str, "booklet_code": str}
+    """
+    data, error = _read_scan_payload('exam_id', 'student_identifier', 'booklet_code')
+    if error:
+        return error
+    booklet_code = str(data['booklet_code']).strip()
+    if not 3 <= len(booklet_code) <= 50: # Same bounds as ScanForm.booklet_code
+        return _bad_request('Booklet code must be between 3 and 50 characters.')
+
+    outcome, exam, student = scanning.check_eligibility(data['exam_id'], data['student_identifier'])
+    if outcome == scanning.EXAM_NOT_FOUND:
+        return _scan_response(outcome, 'Selected exam not found.')
+    if outcome == scanning.STUDENT_NOT_FOUND:
+        return _scan_response(outcome, f'Student ID "{data["student_identifier"]}" not found.')
+    if outcome == scanning.NOT_ELIGIBLE:
+        return _scan_response(outcome, f'Student {student.name} is not eligible for exam {exam.name}.',
+                              student=scanning.student_info(student, exam))
+
+    outcome, existing_scan = scanning.record_booklet(exam, student, booklet_code)
+    if outcome == scanning.DUPLICATE:
+        scanned_by = f' (Student: {existing_scan.student.name})' if existing_scan is not None and existing_scan.student else ''
+        return _scan_response(outcome, f'Booklet "{booklet_code}" already scanned for this exam{scanned_by}.',
+                              student=scanning.student_info(student, exam), booklet_code=booklet_code)
+    if outcome == scanning.SAVE_FAILED:
+        return _scan_response(outcome, 'Error saving scan record.',
+                              student=scanning.student_info(student, exam), booklet_code=booklet_code)
+    return _scan_response(outcome, f'Booklet "{booklet_code}" recorded for {student.name} ({exam.name}).',
+                          student=scanning.student_info(student, exam), booklet_code=booklet_code)
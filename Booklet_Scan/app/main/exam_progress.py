@@ -0,0 +1,199 @@
+from sqlalchemy import event, func, select, text, update
+from app import db
+from app.models import Exam, ExamProgress, PrintedBooklet, ScanRecord, StudentExamAssignment
+from app.utils import db_utils
+
+# Per-exam progress counters (the exam_progress table).
+#
+# "How many assigned students have a booklet yet" is answered from one exam_progress row instead
+# of counting assignments and scan records. On SQLite the row-backed counters - assigned,
+# booklets and students_scanned - are maintained by triggers on student_exam_assignment,
+# scan_record and exam, so every write path (ORM, the bulk INSERT ... SELECT of bulk assign, the
+# scan journal's batched inserts, deletes) updates them in its own transaction and no path can
+# forget to. duplicate_attempts counts an event that leaves no row; the scan paths add to it
+# with record_duplicate().
+#
+# Printed booklets are tracked per booklet: the print paths store each code they printed as a
+# printed_booklet row (record_printed()), whose recorded flag the scan_record triggers set and
+# clear, so a code typed in by hand, a scan recorded before printing was tracked or a printed
+# code that clashed with an existing record never skews the count. printed counts those rows
+# and printed_unrecorded is the number of rows not recorded yet (from their index).
+#
+# `flask rebuild-exam-progress` recomputes the row-backed counters from the tables. On other
+# databases there are no triggers and get() computes those counters on the fly instead.
+
+TRIGGERS = [
+    # A counters row for every exam, created with the exam and removed with it
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_exam_insert AFTER INSERT ON exam
+    BEGIN
+        INSERT OR IGNORE INTO exam_progress (exam_id) VALUES (NEW.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_exam_delete AFTER DELETE ON exam
+    BEGIN
+        DELETE FROM exam_progress WHERE exam_id = OLD.id;
+        DELETE FROM printed_booklet WHERE exam_id = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_assignment_insert AFTER INSERT ON student_exam_assignment
+    BEGIN
+        INSERT OR IGNORE INTO exam_progress (exam_id) VALUES (NEW.exam_id);
+        UPDATE exam_progress SET assigned = assigned + 1 WHERE exam_id = NEW.exam_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_assignment_delete AFTER DELETE ON student_exam_assignment
+    BEGIN
+        UPDATE exam_progress SET assigned = assigned - 1 WHERE exam_id = OLD.exam_id;
+    END""",
+    # students_scanned only counts a student's first booklet for the exam (ix_scan_record_exam_student)
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_scan_insert AFTER INSERT ON scan_record
+    BEGIN
+        INSERT OR IGNORE INTO exam_progress (exam_id) VALUES (NEW.exam_id);
+        UPDATE exam_progress SET booklets = booklets + 1,
+            students_scanned = students_scanned + NOT EXISTS (
+                SELECT 1 FROM scan_record WHERE exam_id = NEW.exam_id AND student_id = NEW.student_id AND id <> NEW.id)
+        WHERE exam_id = NEW.exam_id;
+        UPDATE printed_booklet SET recorded = 1 WHERE exam_id = NEW.exam_id AND booklet_code = NEW.booklet_code;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_scan_delete AFTER DELETE ON scan_record
+    BEGIN
+        UPDATE exam_progress SET booklets = booklets - 1,
+            students_scanned = students_scanned - NOT EXISTS (
+                SELECT 1 FROM scan_record WHERE exam_id = OLD.exam_id AND student_id = OLD.student_id)
+        WHERE exam_id = OLD.exam_id;
+        UPDATE printed_booklet SET recorded = 0 WHERE exam_id = OLD.exam_id AND booklet_code = OLD.booklet_code;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_scan_update AFTER UPDATE OF exam_id, booklet_code ON scan_record
+    BEGIN
+        UPDATE printed_booklet SET recorded = 0 WHERE exam_id = OLD.exam_id AND booklet_code = OLD.booklet_code;
+        UPDATE printed_booklet SET recorded = 1 WHERE exam_id = NEW.exam_id AND booklet_code = NEW.booklet_code;
+    END""",
+    # A printed booklet is recorded already if its code was scanned before it was printed (or reprinted)
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_printed_insert AFTER INSERT ON printed_booklet
+    BEGIN
+        INSERT OR IGNORE INTO exam_progress (exam_id) VALUES (NEW.exam_id);
+        UPDATE exam_progress SET printed = printed + 1 WHERE exam_id = NEW.exam_id;
+        UPDATE printed_booklet SET recorded = EXISTS (
+            SELECT 1 FROM scan_record WHERE exam_id = NEW.exam_id AND booklet_code = NEW.booklet_code)
+        WHERE id = NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS exam_progress_printed_delete AFTER DELETE ON printed_booklet
+    BEGIN
+        UPDATE exam_progress SET printed = printed - 1 WHERE exam_id = OLD.exam_id;
+    END""",
+]
+
+
+def is_maintained(connection=None):
+    """True when the row-backed counters are kept current by triggers (SQLite)."""
+    dialect = connection.dialect.name if connection is not None else db.session.get_bind().dialect.name
+    return dialect == 'sqlite'
+
+
+def install_triggers(connection):
+    """Creates the counter triggers if they don't exist yet. No-op on databases other than SQLite."""
+    if not is_maintained(connection):
+        return
+    for trigger in TRIGGERS:
+        connection.execute(text(trigger))
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _after_create(metadata, connection, tables=(), **kw):
+    # db.create_all(): add the triggers, and fill the table if it (or printed_booklet, which replaced
+    # the old printed event count) was only just created for an existing database
+    install_triggers(connection)
+    if ExamProgress.__table__ in tables or PrintedBooklet.__table__ in tables:
+        _rebuild(connection)
+
+
+def _rebuild(connection):
+    progress = ExamProgress.__table__
+    exams = Exam.__table__
+    connection.execute(progress.delete().where(progress.c.exam_id.not_in(select(exams.c.id))))
+    existing = select(progress.c.exam_id)
+    connection.execute(progress.insert().from_select(['exam_id'], select(exams.c.id).where(exams.c.id.not_in(existing))))
+    assignments = StudentExamAssignment.__table__
+    scans = ScanRecord.__table__
+    printed = PrintedBooklet.__table__
+    connection.execute(update(printed).values(recorded=select(scans.c.id).where(
+        scans.c.exam_id == printed.c.exam_id, scans.c.booklet_code == printed.c.booklet_code).exists()))
+    # duplicate_attempts leaves no rows to recount, so it is kept as it is
+    connection.execute(update(progress).values(
+        assigned=select(func.count()).where(assignments.c.exam_id == progress.c.exam_id).scalar_subquery(),
+        booklets=select(func.count()).where(scans.c.exam_id == progress.c.exam_id).scalar_subquery(),
+        students_scanned=select(func.count(scans.c.student_id.distinct()))
+                         .where(scans.c.exam_id == progress.c.exam_id).scalar_subquery(),
+        printed=select(func.count()).where(printed.c.exam_id == progress.c.exam_id).scalar_subquery(),
+    ))
+
+
+def rebuild():
+    """
+    Recomputes assigned, booklets, students_scanned and printed of every exam, and the recorded
+    flag of every printed booklet, from the tables in one transaction and (re)creates the triggers. Must be called inside an application context.
+
+    Returns:
+        int: Number of exams.
+    """
+    db.session.commit()  # start from a clean transaction
+    with db.engine.begin() as connection:
+        ExamProgress.__table__.create(connection, checkfirst=True)
+        PrintedBooklet.__table__.create(connection, checkfirst=True)
+        install_triggers(connection)
+        _rebuild(connection)
+        return connection.execute(select(func.count()).select_from(ExamProgress.__table__)).scalar()
+
+
+def _increment(exam_id, **counts):
+    # In the caller's transaction; the row is created if the exam has none yet
+    db_utils.insert_ignore(ExamProgress, [{'exam_id': exam_id}])
+    table = ExamProgress.__table__
+    db.session.execute(update(table).where(table.c.exam_id == exam_id)
+                       .values({name: table.c[name] + value for name, value in counts.items()}))
+
+
+def record_duplicate(exam_id):
+    """Counts a scan rejected as a duplicate booklet code. Joins the caller's transaction."""
+    _increment(exam_id, duplicate_attempts=1)
+
+
+def record_printed(exam_id, booklets):
+    """
+    Stores the booklets sent to the printer for an exam - (student_id, booklet_code) pairs - as
+    printed_booklet rows; a code printed before is kept once. Joins the caller's transaction.
+    """
+    db_utils.insert_ignore(PrintedBooklet, [{'exam_id': exam_id, 'student_id': student_id, 'booklet_code': code}
+                                            for student_id, code in booklets])
+
+
+def get(exam_id):
+    """
+    Returns the counters of an exam as a dict (all zero for an exam with no row yet):
+    assigned, booklets, students_scanned, duplicate_attempts, printed and printed_unrecorded.
+    """
+    progress = db.session.get(ExamProgress, exam_id)
+    counts = {'exam_id': exam_id, 'assigned': 0, 'booklets': 0, 'students_scanned': 0,
+              'duplicate_attempts': 0, 'printed': 0}
+    if progress is not None:
+        counts.update(assigned=progress.assigned, booklets=progress.booklets,
+                      students_scanned=progress.students_scanned,
+                      duplicate_attempts=progress.duplicate_attempts, printed=progress.printed)
+    if is_maintained():
+        # Rows of the (exam_id, recorded) index: only the booklets still unrecorded are counted
+        counts['printed_unrecorded'] = db.session.execute(
+            select(func.count()).select_from(PrintedBooklet)
+            .where(PrintedBooklet.exam_id == exam_id, PrintedBooklet.recorded.is_(False))).scalar()
+    else:
+        counts.update(
+            assigned=db.session.execute(select(func.count()).select_from(StudentExamAssignment)
+                                        .where(StudentExamAssignment.exam_id == exam_id)).scalar(),
+            booklets=db.session.execute(select(func.count()).select_from(ScanRecord)
+                                        .where(ScanRecord.exam_id == exam_id)).scalar(),
+            students_scanned=db.session.execute(select(func.count(ScanRecord.student_id.distinct()))
+                                                .where(ScanRecord.exam_id == exam_id)).scalar(),
+            printed=db.session.execute(select(func.count()).select_from(PrintedBooklet)
+                                       .where(PrintedBooklet.exam_id == exam_id)).scalar(),
+            printed_unrecorded=db.session.execute(
+                select(func.count()).select_from(PrintedBooklet)
+                .where(PrintedBooklet.exam_id == exam_id,
+                       ~select(ScanRecord.id).where(ScanRecord.exam_id == PrintedBooklet.exam_id,
+                                                   ScanRecord.booklet_code == PrintedBooklet.booklet_code).exists())).scalar())
+    return counts
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, SubmitField
 from wtforms.validators import DataRequired, Length ,Optional
-from app.models import Exam, Venue
+from app.utils import choices_cache
 
 class ScanForm(FlaskForm):
     exam_id = SelectField('Select Exam', coerce=int, validators=[DataRequired(message="Please select an exam.")])
@@ -22,9 +22,11 @@ class ScanForm(FlaskForm):
         # No explicit placeholder with ('', 'Text') is added here.
         # The browser will default to the first actual option or show nothing if the list is empty.
         # DataRequired validator will ensure an actual exam is selected on submit.
+        # Built from the cached exam rows (app/utils/choices_cache.py): the scan page is shown for
+        # every student, the exam list only changes when an admin edits exams or venues
         self.exam_id.choices = [
-            (e.id, f"{e.name} - {e.course} (on {e.date.strftime('%Y-%m-%d')} at {e.venue.name if e.venue else 'N/A'})")
-            for e in Exam.query.join(Venue).order_by(Exam.date.desc(), Exam.name).all()
+            (e.id, f"{e.name} - {e.course} (on {e.date.strftime('%Y-%m-%d')} at {e.venue_name or 'N/A'})")
+            for e in choices_cache.exams()
         ]
         # An empty list of choices is fine; DataRequired will handle validation.
         # The route will flash a message if no exams are available.
@@ -0,0 +1,194 @@
+import collections
+import datetime
+import json
+import threading
+import time
+from flask import current_app
+from sqlalchemy import func, select
+from app import db
+from app.main import exam_progress
+from app.models import ScanRecord, Student
+from app.utils import event_bus
+from app.utils.eligibility_index import IndexedStudent
+from app.utils.hardware import broadcast  # Every worker's dashboards see every scan (multi-worker server)
+
+# Live per-exam figures for the admin live dashboard (pushed to browsers over SSE).
+#
+# The figures of an exam are read from its exam_progress counters (students scanned, booklets,
+# duplicate attempts) once, when the first browser starts watching it; from then on
+# record_booklet() reports every scan here and the figures are updated in memory. After each
+# scan one JSON snapshot is built and published on the event bus, and every watching browser
+# is sent that same message - however many invigilators are watching, a scan costs one
+# snapshot. A student's first booklet while the exam is watched costs one indexed EXISTS, to
+# tell whether the student was already counted when the figures were loaded.
+#
+# Every open dashboard keeps one request thread of its server process busy for as long as it is
+# open, so a process serves at most LIVE_DASHBOARD_MAX_STREAMS of them at once (open_stream);
+# the next one is turned away with a 503 and tries again after STREAM_RETRY_MS, leaving the
+# other threads to the scan stations.
+#
+# Under a multi-worker server the browsers are spread over the workers, and a scan may be
+# recorded by another worker or by the hardware owner's print jobs: scan_recorded() is relayed
+# to every worker (hardware.broadcast), and each one updates the exams watched through it.
+
+RECENT_SCANS = 10
+RATE_WINDOW = 60  # seconds of scans counted in "scans per minute"
+STREAM_RETRY_MS = 10000  # how soon a dashboard turned away by the stream limit tries again
+
+_lock = threading.Lock()
+_exams = {}  # exam id -> _ExamFigures
+_streams = {'open': 0, 'rejected': 0}  # SSE streams of this process (open_stream)
+
+
+class _ExamFigures:
+    def __init__(self, exam_id, assigned, scanned, booklets, duplicates, recent, last_scan_id, app):
+        self.exam_id = exam_id
+        self.assigned = assigned
+        self.scanned = scanned  # students with at least one booklet
+        self.booklets = booklets
+        self.duplicates = duplicates
+        self.last_scan_id = last_scan_id  # scans up to this id are counted in the loaded figures
+        self.seen_students = set()  # ids of students whose booklets arrived while watched
+        self.app = app  # relayed scans arrive outside any application context
+        self.recent = collections.deque(recent, maxlen=RECENT_SCANS)  # newest first
+        self.scan_times = collections.deque(maxlen=10000)  # monotonic times of recent scans
+
+    def snapshot(self):
+        now = time.monotonic()
+        while self.scan_times and now - self.scan_times[0] > RATE_WINDOW:
+            self.scan_times.popleft()
+        return {
+            'exam_id': self.exam_id,
+            'assigned': self.assigned,
+            'scanned': self.scanned,
+            'booklets': self.booklets,
+            'duplicates': self.duplicates,
+            'scans_per_minute': len(self.scan_times) * 60 // RATE_WINDOW,
+            'recent': list(self.recent),
+        }
+
+
+def topic(exam_id):
+    return f'exam:{exam_id}'
+
+
+def format_sse(data, event=None):
+    """Encodes data as one Server-Sent Events message."""
+    message = f'data: {json.dumps(data)}\n\n'
+    return f'event: {event}\n{message}' if event else message
+
+
+def _load(exam_id):
+    # Caller must be inside an application context. Counts come from the exam_progress row, read
+    # in the same transaction as the highest scan id they include.
+    progress = exam_progress.get(exam_id)
+    last_scan_id = db.session.execute(select(func.max(ScanRecord.id))).scalar() or 0
+    recent = [{'booklet_code': code, 'student_id': student_id, 'name': name,
+               'time': timestamp.isoformat(), 'outcome': 'recorded'}
+              for code, student_id, name, timestamp in db.session.execute(
+                  select(ScanRecord.booklet_code, Student.student_id, Student.name, ScanRecord.timestamp)
+                  .join(Student, ScanRecord.student_id == Student.id)
+                  .where(ScanRecord.exam_id == exam_id)
+                  .order_by(ScanRecord.timestamp.desc(), ScanRecord.id.desc()).limit(RECENT_SCANS))]
+    return _ExamFigures(exam_id, progress['assigned'], progress['students_scanned'], progress['booklets'],
+                        progress['duplicate_attempts'], recent, last_scan_id, current_app._get_current_object())
+
+
+def watch(exam_id):
+    """
+    Subscribes to an exam's live figures. Must be called inside an application context.
+
+    Returns:
+        tuple: (initial snapshot dict, event_bus.Subscription delivering SSE-encoded snapshots).
+    """
+    figures = _load(exam_id)
+    with _lock:
+        current = _exams.get(exam_id)
+        if current is None:
+            _exams[exam_id] = current = figures
+        else:
+            # Already being watched: keep the live counters, refresh what scans don't change
+            current.assigned = figures.assigned
+        subscription = event_bus.subscribe(topic(exam_id))
+        snapshot = current.snapshot()
+    return snapshot, subscription
+
+
+def open_stream(limit):
+    """
+    Takes one of the limit stream slots of this process (limit 0: no limit).
+
+    Returns:
+        bool: True if the stream may be opened (release it with close_stream), False if all the
+              slots are taken.
+    """
+    with _lock:
+        if limit and _streams['open'] >= limit:
+            _streams['rejected'] += 1
+            return False
+        _streams['open'] += 1
+        return True
+
+
+def close_stream():
+    with _lock:
+        _streams['open'] -= 1
+
+
+def get_stream_stats():
+    """Returns the live dashboard streams open in this process and how many were turned away."""
+    with _lock:
+        return dict(_streams)
+
+
+def unwatch(subscription):
+    """Ends a subscription from watch(); the exam's figures are dropped with its last watcher."""
+    subscription.close()
+    with _lock:
+        if not event_bus.has_subscribers(subscription.topic):
+            _exams.pop(int(subscription.topic.split(':', 1)[1]), None)
+
+
+def scan_recorded(exam_id, student, booklet_code, outcome):
+    """
+    Reports a scan (outcome 'recorded' or 'duplicate') and broadcasts the exam's new figures
+    to its watchers. Cheap no-op when nobody is watching the exam.
+    """
+    # Only the fields the figures use, so the call can be relayed to the other workers
+    _scan_recorded(exam_id, IndexedStudent(student.id, student.student_id, student.name), booklet_code, outcome)
+
+
+def _scanned_before(figures, student_id):
+    # Whether the student had a booklet when the figures were loaded (so is counted in scanned):
+    # an EXISTS on the (exam_id, student_id) index, limited to the scans the figures include
+    with figures.app.app_context():
+        return db.session.execute(select(
+            select(ScanRecord.id).where(ScanRecord.exam_id == figures.exam_id, ScanRecord.student_id == student_id,
+                                        ScanRecord.id <= figures.last_scan_id).exists())).scalar()
+
+
+@broadcast
+def _scan_recorded(exam_id, student, booklet_code, outcome):
+    with _lock:
+        figures = _exams.get(exam_id)
+        if figures is None:
+            return
+        # Only the first booklet of a student while watched needs a look at the database; claiming
+        # the student here keeps two of their booklets arriving at once from both counting
+        new_student = outcome != 'duplicate' and student.id not in figures.seen_students
+        if new_student:
+            figures.seen_students.add(student.id)
+    first_booklet = new_student and not _scanned_before(figures, student.id)
+    with _lock:
+        figures.recent.appendleft({'booklet_code': booklet_code, 'student_id': student.student_id,
+                                   'name': student.name, 'time': datetime.datetime.utcnow().isoformat(),
+                                   'outcome': outcome})
+        if outcome == 'duplicate':
+            figures.duplicates += 1
+        else:
+            figures.booklets += 1
+            if first_booklet:
+                figures.scanned += 1
+            figures.scan_times.append(time.monotonic())
+        message = format_sse(figures.snapshot())
+    event_bus.publish(topic(exam_id), message)
@@ -0,0 +1,191 @@
+import datetime
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import current_app
+from sqlalchemy import update
+from app import db
+from app.models import Exam, Student, StudentExamAssignment, PregeneratedBooklet
+
+# Batch pre-generation of booklets for every student assigned to an exam.
+#
+# The ReportLab work runs across a process pool the night before; each resulting PDF and
+# barcode is stored as a PregeneratedBooklet so the live scan only looks it up and prints it.
+# Rows are committed in batches as PDFs complete, so an interrupted run can simply be
+# started again: students that already have a usable pre-generated booklet are skipped.
+
+COMMIT_BATCH_SIZE = 100
+
+_runs_lock = threading.Lock()
+_runs = {}  # exam id -> progress dict of the latest admin-triggered run in this process
+
+
+def booklet_folder(app, exam_id):
+    return os.path.join(app.root_path, '..', 'output_barcodes', f'exam_{exam_id}')
+
+
+def _generate_task(unique_id, output_folder, student_name, exam_name):
+    # Runs in a worker process; ReportLab is only imported where booklets are generated
+    from app.utils.booklet_generator import generate_single_booklet
+    return generate_single_booklet(unique_id=unique_id, output_folder=output_folder,
+                                   student_name=student_name, exam_name=exam_name)
+
+
+def _students_to_generate(exam):
+    """
+    Returns (student_id, name) rows of assigned students without a usable pre-generated booklet.
+    Rows whose PDF went missing are dropped so those students are generated again.
+    """
+    existing = {}
+    for booklet in PregeneratedBooklet.query.filter_by(exam_id=exam.id, used_at=None).all():
+        if os.path.exists(booklet.pdf_path):
+            existing[booklet.student_id] = booklet
+        else:
+            db.session.delete(booklet)
+    db.session.commit()
+
+    rows = db.session.query(Student.id, Student.name)\
+        .join(StudentExamAssignment, StudentExamAssignment.student_id == Student.id)\
+        .filter(StudentExamAssignment.exam_id == exam.id)\
+        .order_by(Student.id)\
+        .all()
+    # Students whose pre-generated booklet was already used are skipped as well: the unique
+    # constraint allows one per exam, and their next booklet is generated live.
+    used = {sid for (sid,) in db.session.query(PregeneratedBooklet.student_id)
+            .filter(PregeneratedBooklet.exam_id == exam.id, PregeneratedBooklet.used_at.isnot(None))}
+    return [row for row in rows if row.id not in existing and row.id not in used], len(rows)
+
+
+def pregenerate_exam_booklets(exam_id, workers=None, progress=None):
+    """
+    Generates booklets for every assigned student of an exam that does not have one yet.
+    Must be called inside an application context.
+
+    Args:
+        exam_id (int): The exam to prepare.
+        workers (int, optional): Size of the process pool. Defaults to PREGEN_WORKERS / CPU count.
+        progress (callable, optional): Called as progress(done, total, failed) after each PDF.
+
+    Returns:
+        dict: Summary with 'assigned', 'skipped', 'total', 'generated' and 'failed' counts.
+    """
+    app = current_app._get_current_object()
+    exam = Exam.query.get(exam_id)
+    if exam is None:
+        raise ValueError(f"Exam {exam_id} not found.")
+
+    todo, assigned = _students_to_generate(exam)
+    summary = {'assigned': assigned, 'skipped': assigned - len(todo), 'total': len(todo), 'generated': 0, 'failed': 0}
+    if progress:
+        progress(0, len(todo), 0)
+    if not todo:
+        return summary
+
+    output_folder = booklet_folder(app, exam.id)
+    os.makedirs(output_folder, exist_ok=True)
+    workers = workers or app.config.get('PREGEN_WORKERS') or os.cpu_count() or 1
+    batch_stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+
+    # 'spawn' keeps the workers independent of the web server's threads and open SQLite handles
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {
+            pool.submit(_generate_task, f"S{student_id}E{exam.id}P{batch_stamp}", output_folder, name, exam.name): student_id
+            for student_id, name in todo
+        }
+        pending_rows = 0
+        for future in as_completed(futures):
+            student_id = futures[future]
+            try:
+                pdf_file_path, barcode_value = future.result()
+            except Exception as e:
+                app.logger.error(f"Pre-generation failed for student {student_id}, exam {exam.id}: {e}")
+                pdf_file_path, barcode_value = None, None
+
+            if pdf_file_path and barcode_value:
+                db.session.add(PregeneratedBooklet(student_id=student_id, exam_id=exam.id,
+                                                   booklet_code=barcode_value, pdf_path=os.path.abspath(pdf_file_path)))
+                summary['generated'] += 1
+                pending_rows += 1
+                if pending_rows >= COMMIT_BATCH_SIZE:
+                    db.session.commit()
+                    pending_rows = 0
+            else:
+                summary['failed'] += 1
+            if progress:
+                progress(summary['generated'] + summary['failed'], len(todo), summary['failed'])
+        db.session.commit()
+    return summary
+
+
+def start_background_run(app, exam_id, workers=None):
+    """
+    Starts pregenerate_exam_booklets in a background thread (used by the admin action).
+
+    Returns:
+        bool: False if a run for this exam is already in progress in this process.
+    """
+    with _runs_lock:
+        run = _runs.get(exam_id)
+        if run and run['running']:
+            return False
+        run = {'running': True, 'done': 0, 'total': None, 'failed': 0, 'summary': None, 'error': None,
+               'started_at': datetime.datetime.utcnow().isoformat(), 'finished_at': None}
+        _runs[exam_id] = run
+
+    def on_progress(done, total, failed):
+        run.update(done=done, total=total, failed=failed)
+
+    def target():
+        try:
+            with app.app_context():
+                run['summary'] = pregenerate_exam_booklets(exam_id, workers=workers, progress=on_progress)
+        except Exception as e:
+            app.logger.error(f"Pre-generation for exam {exam_id} failed: {e}")
+            run['error'] = str(e)
+        finally:
+            run['running'] = False
+            run['finished_at'] = datetime.datetime.utcnow().isoformat()
+
+    threading.Thread(target=target, name=f'pregenerate-exam-{exam_id}', daemon=True).start()
+    return True
+
+
+def get_run(exam_id):
+    with _runs_lock:
+        run = _runs.get(exam_id)
+        return dict(run) if run else None
+
+
+def claim_unused_booklet(exam_id, student_id):
+    """
+    Claims the unused pre-generated booklet of a student for an exam if its PDF still exists.
+    The row is marked used by one conditional UPDATE and committed before the booklet is
+    printed, so two jobs for the same student can't both print it.
+
+    Returns:
+        tuple: (pdf_file_path, barcode_value), or (None, None) if there is none to claim.
+    """
+    booklet = PregeneratedBooklet.query.filter_by(exam_id=exam_id, student_id=student_id, used_at=None).first()
+    if booklet is None or not os.path.exists(booklet.pdf_path):
+        return None, None
+    pdf_path, booklet_code = booklet.pdf_path, booklet.booklet_code
+    claimed = db.session.execute(update(PregeneratedBooklet)
+                                 .where(PregeneratedBooklet.id == booklet.id, PregeneratedBooklet.used_at.is_(None))
+                                 .values(used_at=datetime.datetime.utcnow())).rowcount
+    db.session.commit()
+    return (pdf_path, booklet_code) if claimed else (None, None)
+
+
+def mark_used(exam_id, booklet_codes):
+    """
+    Marks the pre-generated booklets with these codes as used (printed or recorded some other
+    way than a print job's claim). Codes that aren't pre-generated are ignored. Joins the
+    caller's transaction.
+    """
+    if booklet_codes:
+        db.session.execute(update(PregeneratedBooklet)
+                           .where(PregeneratedBooklet.exam_id == exam_id,
+                                  PregeneratedBooklet.booklet_code.in_(list(booklet_codes)),
+                                  PregeneratedBooklet.used_at.is_(None))
+                           .values(used_at=datetime.datetime.utcnow()))
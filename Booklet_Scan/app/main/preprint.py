@@ -0,0 +1,71 @@
+import datetime
+import os
+from flask import current_app
+from app import db
+from app.models import Exam, Student, StudentExamAssignment, PregeneratedBooklet
+from app.main.pregenerate import booklet_folder, mark_used
+from app.main import exam_progress
+from app.utils.batch_printer import BatchPrinter
+
+# Pre-printing the booklets of a whole exam (venue) through the batch printer.
+#
+# Every assigned student gets one page. A student with an unused pre-generated booklet
+# (flask pregenerate-booklets) keeps that barcode so the printed page matches the stored PDF,
+# and that booklet is marked used once printed so a print job never prints the code again;
+# the others get a fresh code. The batch manifests map each page back to its barcode, and the
+# code is recorded at the desk by scanning the pre-printed booklet (manual booklet mode).
+
+
+def preprint_exam_booklets(exam_id, batch_size=None, flush_interval=None):
+    """
+    Prints one booklet per student assigned to an exam, merged into multi-page print jobs.
+    Must be called inside an application context.
+
+    Args:
+        exam_id (int): The exam to print for.
+        batch_size (int, optional): Booklets per print job. Defaults to PRINT_BATCH_SIZE.
+        flush_interval (float, optional): Seconds before a partial batch is printed anyway.
+                                          Defaults to PRINT_BATCH_FLUSH_INTERVAL.
+
+    Returns:
+        tuple: (stats, batches) - the BatchPrinter counters and the manifest of every batch.
+    """
+    app = current_app._get_current_object()
+    exam = Exam.query.get(exam_id)
+    if exam is None:
+        raise ValueError(f"Exam {exam_id} not found.")
+
+    prepared = dict(db.session.query(PregeneratedBooklet.student_id, PregeneratedBooklet.booklet_code)
+                    .filter(PregeneratedBooklet.exam_id == exam.id, PregeneratedBooklet.used_at.is_(None)))
+    rows = db.session.query(Student.id, Student.name)\
+        .join(StudentExamAssignment, StudentExamAssignment.student_id == Student.id)\
+        .filter(StudentExamAssignment.exam_id == exam.id)\
+        .order_by(Student.name)\
+        .all()
+
+    printer = BatchPrinter(
+        output_folder=os.path.join(booklet_folder(app, exam.id), 'batches'),
+        printer_name=app.config.get('DEFAULT_PRINTER_NAME'),
+        batch_size=batch_size or app.config.get('PRINT_BATCH_SIZE', 25),
+        flush_interval=app.config.get('PRINT_BATCH_FLUSH_INTERVAL', 5) if flush_interval is None else flush_interval,
+        command_name=app.config.get('PRINTER_COMMAND'),
+    )
+    batch_stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    students_by_code = {}
+    try:
+        for student_id, name in rows:
+            barcode_value = prepared.get(student_id) or f"BKS{student_id}E{exam.id}B{batch_stamp}"
+            students_by_code[barcode_value] = student_id
+            printer.add(barcode_value, student_name=name, exam_name=exam.name)
+    finally:
+        printer.close()
+        # Pre-printed booklets count as printed-but-unrecorded until they are scanned at the desk
+        try:
+            printed_codes = [code for batch in printer.batches if batch['printed'] for code in batch['pages'].values()]
+            mark_used(exam.id, set(printed_codes) & set(prepared.values()))
+            exam_progress.record_printed(exam.id, [(students_by_code[code], code) for code in printed_codes])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error counting pre-printed booklets for exam {exam.id}: {e}")
+    return printer.get_stats(), printer.batches
@@ -0,0 +1,289 @@
+import datetime
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app import db
+from app.main import scanning
+from app.main import pregenerate
+from app.main import exam_progress
+from app.utils import booklet_archive
+from app.utils.eligibility_index import IndexedExam, IndexedStudent
+from app.utils.hardware import owned  # Jobs run in the hardware owner process under a multi-worker server
+
+# Background booklet pipeline: generate PDF -> spool to printer -> record ScanRecord.
+#
+# The scan request only checks eligibility and submits a job, so the station gets its answer
+# (and a job id) immediately whatever the printer is doing. Jobs run on a small bounded
+# thread pool; their status is polled through /api/scan/jobs/<job_id>.
+#
+# Under a multi-worker server (serve.py) the jobs of every worker run in the hardware owner
+# process (app/utils/hardware.py): submit_booklet_job(), get_job_status() and retry_job() are
+# forwarded there and return the job as a dict, so a station's status poll or retry can be
+# answered by any worker. own_jobs() gives the owner the application the jobs run in.
+
+STATUS_QUEUED = 'queued'
+STATUS_GENERATING = 'generating'
+STATUS_SPOOLING = 'spooling'
+STATUS_RECORDING = 'recording'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED)
+
+_lock = threading.Lock()
+_app = None            # set by own_jobs() in the hardware owner; elsewhere jobs use current_app
+_executor = None
+_jobs = OrderedDict()  # job id -> PrintJob, oldest first
+_pending = 0           # jobs submitted but not finished, bounded by PRINT_JOB_QUEUE_LIMIT
+
+
+class PrintJob:
+    """
+    State of one booklet job. Read it through to_dict(); only the worker thread mutates it, apart
+    from retry_job re-queueing a failed job (under the changed condition).
+    """
+
+    def __init__(self, exam, student):
+        self.id = uuid.uuid4().hex
+        self.exam = IndexedExam(exam.id, exam.name)
+        self.student = IndexedStudent(student.id, student.student_id, student.name)
+        self.status = STATUS_QUEUED
+        self.outcome = None
+        self.message = 'Waiting for a print worker.'
+        self.pdf_file_path = None
+        self.pdf_data = None  # in-memory PDF in BOOKLET_ZERO_DISK mode, released once printed
+        self.barcode_value = None
+        self.printed = False
+        self.pregenerated = False
+        self.attempts = 0
+        self.created_at = datetime.datetime.utcnow()
+        self.updated_at = self.created_at
+        self.changed = threading.Condition()
+
+    def set_status(self, status, message, outcome=None):
+        with self.changed:
+            self.status = status
+            self.message = message
+            self.outcome = outcome
+            self.updated_at = datetime.datetime.utcnow()
+            self.changed.notify_all()
+
+    def wait_for_change(self, since_status, timeout):
+        """Blocks until the status differs from since_status, the job finishes, or timeout elapses."""
+        with self.changed:
+            self.changed.wait_for(lambda: self.status != since_status or self.status in FINISHED_STATUSES, timeout)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'finished': self.status in FINISHED_STATUSES,
+            'ok': self.status == STATUS_DONE,
+            'outcome': self.outcome,
+            'message': self.message,
+            'booklet_code': self.barcode_value,
+            'attempts': self.attempts,
+            'student': scanning.student_info(self.student, self.exam),
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat(),
+        }
+
+
+def _get_executor(app):
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=app.config.get('PRINT_JOB_WORKERS', 2),
+                                           thread_name_prefix='print-job')
+        return _executor
+
+
+def _remember(job, app):
+    """Stores a job and forgets the oldest finished ones beyond PRINT_JOB_HISTORY."""
+    history = app.config.get('PRINT_JOB_HISTORY', 200)
+    _jobs[job.id] = job
+    for job_id in list(_jobs):
+        if len(_jobs) <= history:
+            break
+        if _jobs[job_id].status in FINISHED_STATUSES:
+            del _jobs[job_id]
+
+
+def _enqueue(app, job):
+    global _pending
+    with _lock:
+        if _pending >= app.config.get('PRINT_JOB_QUEUE_LIMIT', 50):
+            return False
+        _pending += 1
+        _remember(job, app)
+    _get_executor(app).submit(_run_job, app, job)
+    return True
+
+
+def own_jobs(app):
+    """Runs the jobs submitted from any process in app (the hardware owner's application)."""
+    global _app
+    _app = app
+
+
+def _job_app():
+    return _app if _app is not None else current_app._get_current_object()
+
+
+def submit_booklet_job(exam, student):
+    """
+    Queues generate -> print -> record for an eligible student. Must be called inside an
+    application context.
+
+    Args:
+        exam, student: The exam and student (model instances or eligibility index entries).
+
+    Returns:
+        dict | None: The queued job (PrintJob.to_dict()), or None if the queue is full.
+    """
+    # Only the fields a job uses, so the call can be sent to the hardware owner
+    return _submit(IndexedExam(exam.id, exam.name), IndexedStudent(student.id, student.student_id, student.name))
+
+
+@owned()
+def _submit(exam, student):
+    job = PrintJob(exam, student)
+    return job.to_dict() if _enqueue(_job_app(), job) else None
+
+
+@owned()
+def get_job_status(job_id, since=None, wait=0):
+    """
+    Returns a job as a dict, or None if it is unknown or expired. With wait (seconds) and since
+    (a status) the answer is held until the job leaves that status (long-poll).
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+    if wait > 0 and since:
+        job.wait_for_change(since, wait)
+    return job.to_dict()
+
+
+@owned()
+def retry_job(job_id):
+    """
+    Re-queues a failed job. The steps it already completed are not repeated: an existing PDF is
+    re-spooled rather than regenerated, and a job that already printed only retries the record.
+
+    Returns:
+        dict | None: The job, or None if it does not exist, has not failed, or the queue is full.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+    # Check and re-queue in one step: of two retries at once (a double click, two tabs) only one
+    # gets the failed job, the other sees it queued and gets None - the booklet prints once
+    with job.changed:
+        if job.status != STATUS_FAILED:
+            return None
+        job.set_status(STATUS_QUEUED, 'Retry queued.')
+    if not _enqueue(_job_app(), job):
+        job.set_status(STATUS_FAILED, 'Print queue is full, retry later.', job.outcome)
+        return None
+    return job.to_dict()
+
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def get_jobs():
+    """Returns the remembered jobs (at most PRINT_JOB_HISTORY finished ones), oldest first."""
+    with _lock:
+        return list(_jobs.values())
+
+
+def get_stats():
+    """Returns the number of pending jobs and a count of remembered jobs per status."""
+    with _lock:
+        by_status = {}
+        for job in _jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {'pending': _pending, 'jobs': by_status}
+
+
+def shutdown(wait=True):
+    """
+    Stops accepting jobs; with wait=True blocks until queued and running jobs have finished
+    and the booklet PDFs they queued for the archive have been written.
+    """
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+    booklet_archive.shutdown(wait=wait)
+
+
+def _run_job(app, job):
+    global _pending
+    try:
+        with app.app_context():
+            _run_steps(job)
+    except Exception as e:
+        app.logger.error(f"Print job {job.id} crashed: {e}")
+        job.set_status(STATUS_FAILED, f'Internal error: {e}', scanning.SAVE_FAILED)
+    finally:
+        with _lock:
+            _pending -= 1
+
+
+def _count_printed(exam_id, student_id, booklet_code):
+    # Printed booklets are stored even if recording the scan then fails ("printed, not recorded")
+    try:
+        exam_progress.record_printed(exam_id, [(student_id, booklet_code)])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error counting printed booklet for exam {exam_id}: {e}")
+
+
+def _run_steps(job):
+    job.attempts += 1
+    student, exam = job.student, job.exam
+
+    # 1. Generate the booklet PDF - only once; retries reuse the file (or in-memory PDF). A booklet
+    #    pre-generated for this student (flask pregenerate-booklets) is claimed and used instead when
+    #    there is one.
+    if not job.printed and job.pdf_data is None and not (job.pdf_file_path and os.path.exists(job.pdf_file_path)):
+        job.pdf_file_path, job.barcode_value = pregenerate.claim_unused_booklet(exam.id, student.id)
+        job.pregenerated = job.pdf_file_path is not None
+        if not job.pregenerated:
+            job.set_status(STATUS_GENERATING, 'Generating booklet PDF...')
+            if current_app.config.get('BOOKLET_ZERO_DISK'):
+                job.pdf_data, job.barcode_value = scanning.render_booklet(exam, student)
+            else:
+                job.pdf_file_path, job.barcode_value = scanning.generate_booklet(exam, student)
+        if not (job.pdf_file_path or job.pdf_data):
+            job.set_status(STATUS_FAILED, 'Failed to generate booklet PDF.', scanning.PDF_FAILED)
+            return
+
+    # 2. Print the PDF
+    if not job.printed:
+        job.set_status(STATUS_SPOOLING, f'Sending booklet {job.barcode_value} to the printer...')
+        if not scanning.spool_booklet(job.pdf_file_path, job.barcode_value, student, pdf_data=job.pdf_data):
+            job.set_status(STATUS_FAILED, f'Booklet generated ({job.barcode_value}) but FAILED to print. Please check printer. Record not saved.',
+                           scanning.PRINT_FAILED)
+            return
+        job.printed = True
+        job.pdf_data = None
+        _count_printed(exam.id, student.id, job.barcode_value)
+
+    # 3. Record the scan
+    job.set_status(STATUS_RECORDING, f'Booklet {job.barcode_value} printed. Recording...')
+    outcome, _ = scanning.record_booklet(exam, student, job.barcode_value)
+    if outcome == scanning.RECORDED:
+        job.set_status(STATUS_DONE, f'Booklet "{job.barcode_value}" printed and recorded for {student.name} ({exam.name}).', outcome)
+    elif outcome == scanning.DUPLICATE:
+        job.set_status(STATUS_FAILED, f'Error: Booklet "{job.barcode_value}" already exists for this exam.', outcome)
+    else:
+        job.set_status(STATUS_FAILED, f'Booklet "{job.barcode_value}" printed, but failed to save record. Please record manually.', outcome)
@@ -0,0 +1,324 @@
+import datetime
+import json
+import multiprocessing
+import os
+import threading
+from app import db
+from app.models import Exam, ScanRecord, Student
+from app.utils import db_utils
+from app.main import pregenerate
+
+# Write-behind scan journal (SCAN_JOURNAL).
+#
+# Recording a booklet normally commits one ScanRecord per scan, i.e. several SQLite fsyncs per
+# booklet on the Pi's SD card. With the journal on, record_booklet appends the scan to an
+# append-only file (one JSON line, fsynced) and acknowledges it; a flusher thread then writes
+# the journalled scans to SQLite in one transaction per batch and rewrites the journal with
+# whatever is still unflushed. On startup a leftover journal (crash, power cut) is replayed.
+#
+# The _exam_booklet_uc uniqueness check is answered from memory: the booklet codes of each
+# exam are loaded from the database on first use and every journalled code is added to them.
+#
+# A journalled scan whose code turns out to be stored already for another scan (recorded by
+# another process, or added by hand before a replay) was acknowledged as recorded but cannot
+# be saved. Every such entry is logged, appended to the dropped file next to the journal
+# (scan_journal.dropped.jsonl) and listed on the admin scan records page (get_dropped()).
+#
+# Note: the journal belongs to one process. Run a single server process when it is enabled.
+
+_lock = threading.Lock()        # guards the journal file, _pending and _codes
+_flush_lock = threading.Lock()  # one flush at a time
+_app = None
+_file = None
+_pending = []      # journal entries not yet committed to SQLite, oldest first
+_codes = {}        # exam id -> set of booklet codes recorded (in SQLite or pending)
+_wakeup = threading.Event()
+_flusher = None
+_stopping = False
+_dropped = []      # most recent dropped entries (DROPPED_KEEP), oldest first
+_stats = {'appended': 0, 'flushed': 0, 'batches': 0, 'conflicts': 0, 'dropped': 0, 'replayed': 0, 'flush_errors': 0}
+
+DROPPED_KEEP = 200  # dropped entries kept in memory for the admin page; the dropped file keeps them all
+
+
+def is_enabled():
+    return _app is not None
+
+
+def init_app(app):
+    """
+    Opens the journal configured by SCAN_JOURNAL_PATH, queues any scans left in it for
+    replay and starts the flusher thread. Does nothing unless SCAN_JOURNAL is on.
+    """
+    global _app, _file, _pending, _flusher, _stopping
+    if not app.config.get('SCAN_JOURNAL'):
+        return
+    # Child processes (e.g. the booklet pre-generation pool re-importing run.py) must not
+    # replay or rewrite the server's journal.
+    if multiprocessing.parent_process() is not None:
+        return
+
+    path = app.config['SCAN_JOURNAL_PATH']
+    with _lock:
+        _dropped[:] = _read_journal(_dropped_path(path))[-DROPPED_KEEP:]
+        _pending = _read_journal(path)
+        _stats['replayed'] = len(_pending)
+        if _pending:
+            print(f"Scan journal: replaying {len(_pending)} scan(s) not yet saved to the database.")
+        _file = open(path, 'ab')
+        _app = app
+        _stopping = False
+    _flusher = threading.Thread(target=_run_flusher, name='scan-journal', daemon=True)
+    _flusher.start()
+    if _pending:
+        _wakeup.set()
+
+
+def _read_journal(path):
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'rb') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a crash mid-append: that scan was never acknowledged
+                print(f"Scan journal: skipping unreadable line {line_number} of {path}.")
+    return entries
+
+
+def _dropped_path(path):
+    base, extension = os.path.splitext(path)
+    return base + '.dropped' + (extension or '.jsonl')
+
+
+def _codes_for(exam_id):
+    # Caller holds _lock
+    codes = _codes.get(exam_id)
+    if codes is None:
+        codes = {code for (code,) in db.session.query(ScanRecord.booklet_code).filter(ScanRecord.exam_id == exam_id)}
+        codes.update(entry['booklet_code'] for entry in _pending if entry['exam_id'] == exam_id)
+        _codes[exam_id] = codes
+    return codes
+
+
+def append(exam, student, booklet_code):
+    """
+    Durably journals a scan. Must be called inside an application context.
+
+    Returns:
+        bool: True if the scan was journalled, False if the booklet code is already recorded
+              for this exam.
+
+    Raises:
+        OSError: If the journal could not be written; the scan is not recorded.
+    """
+    with _lock:
+        codes = _codes_for(exam.id)
+        if booklet_code in codes:
+            return False
+        entry = {'student_id': student.id, 'exam_id': exam.id, 'booklet_code': booklet_code,
+                 'timestamp': datetime.datetime.utcnow().isoformat()}
+        _file.write((json.dumps(entry) + '\n').encode())
+        _file.flush()
+        os.fsync(_file.fileno())
+        codes.add(booklet_code)
+        _pending.append(entry)
+        _stats['appended'] += 1
+        if len(_pending) >= _app.config.get('SCAN_JOURNAL_BATCH_SIZE', 50):
+            _wakeup.set()
+    return True
+
+
+def is_pending(exam_id, booklet_code):
+    """True if a scan of this booklet code is journalled but not yet committed to SQLite."""
+    with _lock:
+        return any(entry['exam_id'] == exam_id and entry['booklet_code'] == booklet_code for entry in _pending)
+
+
+def forget(exam_id, booklet_code):
+    """Drops a code from the in-memory uniqueness set, e.g. after its ScanRecord was deleted."""
+    with _lock:
+        _codes.get(exam_id, set()).discard(booklet_code)
+
+
+def flush():
+    """
+    Commits the pending journal entries to SQLite in one transaction and rewrites the journal
+    without them. Safe to call from any thread; a no-op when the journal is disabled.
+
+    Returns:
+        int: Number of entries taken off the journal.
+    """
+    if _app is None:
+        return 0
+    with _flush_lock:
+        with _lock:
+            batch = list(_pending)
+        if not batch:
+            return 0
+        with _app.app_context():
+            if not _commit_batch(batch):
+                return 0
+        with _lock:
+            del _pending[:len(batch)]
+            _rewrite_journal()
+            _stats['flushed'] += len(batch)
+            _stats['batches'] += 1
+        return len(batch)
+
+
+def _commit_batch(batch):
+    rows = [{'student_id': e['student_id'], 'exam_id': e['exam_id'], 'booklet_code': e['booklet_code'],
+             'timestamp': datetime.datetime.fromisoformat(e['timestamp'])} for e in batch]
+    try:
+        # Rows that already exist - typically a replay of scans committed just before a crash,
+        # before the journal was rewritten - are skipped by the unique constraint.
+        inserted = db_utils.insert_ignore(ScanRecord, rows)
+        dropped = _find_dropped(batch, rows) if inserted < len(rows) else []
+        codes = {}
+        for row in rows:
+            codes.setdefault(row['exam_id'], []).append(row['booklet_code'])
+        for exam_id, exam_codes in codes.items():
+            pregenerate.mark_used(exam_id, exam_codes)  # as _insert_booklet does for a single scan
+        db.session.commit()
+    except Exception as e:
+        # Database busy/unavailable: keep everything journalled and retry on the next flush
+        db.session.rollback()
+        _app.logger.error(f"Scan journal flush failed, will retry: {e}")
+        with _lock:
+            _stats['flush_errors'] += 1
+        return False
+    if inserted < len(rows):
+        with _lock:
+            _stats['conflicts'] += len(rows) - inserted
+    if dropped:
+        _record_dropped(dropped)
+    return True
+
+
+def _find_dropped(batch, rows):
+    # Inside the flush transaction: a skipped row is only harmless if the stored record is this
+    # very scan (same student and time, i.e. a replay); otherwise the entry is lost.
+    stored = {}
+    for exam_id in {row['exam_id'] for row in rows}:
+        exam_codes = [row['booklet_code'] for row in rows if row['exam_id'] == exam_id]
+        for record in ScanRecord.query.filter(ScanRecord.exam_id == exam_id, ScanRecord.booklet_code.in_(exam_codes)):
+            stored[(exam_id, record.booklet_code)] = record
+    dropped = []
+    for entry, row in zip(batch, rows):
+        record = stored.get((row['exam_id'], row['booklet_code']))
+        if record is not None and (record.student_id, record.timestamp) != (row['student_id'], row['timestamp']):
+            dropped.append(dict(entry, stored_student_id=record.student_id))
+    if dropped:
+        # Names for the log and the admin page; the ids alone may not resolve later
+        exams = dict(db.session.query(Exam.id, Exam.name).filter(Exam.id.in_({e['exam_id'] for e in dropped})))
+        student_ids = {e['student_id'] for e in dropped} | {e['stored_student_id'] for e in dropped}
+        students = dict(db.session.query(Student.id, Student.student_id).filter(Student.id.in_(student_ids)))
+        for entry in dropped:
+            entry.update(exam_name=exams.get(entry['exam_id']), student_identifier=students.get(entry['student_id']),
+                         stored_student_identifier=students.get(entry['stored_student_id']))
+    return dropped
+
+
+def _record_dropped(dropped):
+    # Logs each dropped entry and keeps it in the dropped file (fsynced) and in memory
+    dropped_at = datetime.datetime.utcnow().isoformat()
+    for entry in dropped:
+        entry['dropped_at'] = dropped_at
+        _app.logger.error(f"Scan journal: dropped scan of booklet {entry['booklet_code']} for student "
+                          f"{entry['student_identifier'] or entry['student_id']} in exam "
+                          f"{entry['exam_name'] or entry['exam_id']} (scanned {entry['timestamp']} UTC): "
+                          f"the code is already recorded for student "
+                          f"{entry['stored_student_identifier'] or entry['stored_student_id']}")
+    with _lock:
+        try:
+            dropped_path = _dropped_path(_app.config['SCAN_JOURNAL_PATH'])
+            with open(dropped_path, 'ab') as f:
+                for entry in dropped:
+                    f.write((json.dumps(entry) + '\n').encode())
+                f.flush()
+                os.fsync(f.fileno())
+            _fsync_directory(dropped_path)  # the file may have just been created
+        except OSError as e:
+            _app.logger.error(f"Scan journal: could not write the dropped file: {e}")
+        _dropped.extend(dropped)
+        del _dropped[:-DROPPED_KEEP]
+        _stats['dropped'] += len(dropped)
+
+
+def get_dropped():
+    """
+    Returns the journalled scans that were acknowledged but could not be saved (their booklet
+    code was already recorded for another scan), newest first, as dicts with exam_id/exam_name,
+    student_id/student_identifier, booklet_code, timestamp, the stored_student_* the code
+    belongs to and dropped_at.
+    """
+    with _lock:
+        return [dict(entry) for entry in reversed(_dropped)]
+
+
+def _rewrite_journal():
+    # Caller holds _lock. Atomically replaces the journal with the entries still pending.
+    global _file
+    path = _app.config['SCAN_JOURNAL_PATH']
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        for entry in _pending:
+            f.write((json.dumps(entry) + '\n').encode())
+        f.flush()
+        os.fsync(f.fileno())
+    _file.close()
+    os.replace(tmp_path, path)
+    _fsync_directory(path)  # makes the rename itself durable, not only the new file's contents
+    _file = open(path, 'ab')
+
+
+def _fsync_directory(path):
+    # A power cut after os.replace could otherwise bring back the old journal, whose entries
+    # would then be replayed on the next start, e.g. bringing back scans deleted since
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _run_flusher():
+    interval = _app.config.get('SCAN_JOURNAL_FLUSH_INTERVAL', 1.0)
+    while not _stopping:
+        _wakeup.wait(interval)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception as e:
+            _app.logger.error(f"Scan journal flusher error: {e}")
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['enabled'] = _app is not None
+        stats['pending'] = len(_pending)
+    return stats
+
+
+def shutdown():
+    """Stops the flusher, commits whatever is still pending and closes the journal."""
+    global _app, _file, _flusher, _stopping
+    if _app is None:
+        return
+    _stopping = True
+    _wakeup.set()
+    if _flusher is not None:
+        _flusher.join()
+        _flusher = None
+    flush()
+    with _lock:
+        _file.close()
+        _file = None
+        _app = None
+        _codes.clear()
@@ -0,0 +1,251 @@
+import datetime
+import os
+from flask import current_app
+from app import db
+from app.models import Exam, Student, ScanRecord, StudentExamAssignment
+from app.main import scan_journal, live_dashboard, exam_progress, pregenerate
+from app.utils import lcd_display, eligibility_index, booklet_archive, db_utils, perf
+from app.utils.printer_utils import print_pdf, print_pdf_data
+
+# Outcome codes shared by the form-based scan page (scan_ui) and the JSON scan API.
+# Keeping the scan logic here means both front ends behave identically.
+EXAM_NOT_FOUND = 'exam_not_found'
+STUDENT_NOT_FOUND = 'student_not_found'
+NOT_ELIGIBLE = 'not_eligible'
+ELIGIBLE = 'eligible'
+PDF_FAILED = 'pdf_failed'
+PRINT_FAILED = 'print_failed'
+DUPLICATE = 'duplicate'
+SAVE_FAILED = 'save_failed'
+RECORDED = 'recorded'
+
+
+def student_info(student, exam):
+    """Returns the small dict describing a verified student, as used by the scan templates and API."""
+    return {'id': student.id, 'name': student.name, 'student_id': student.student_id,
+            'exam_id': exam.id, 'exam_name': exam.name}
+
+
+def check_eligibility(exam_id, student_identifier):
+    """
+    Looks up the exam and student and checks the student is assigned to the exam.
+
+    The in-memory eligibility index is tried first; the three database lookups below only
+    run on an index miss. The returned exam/student may be index entries rather than model
+    instances, so callers should only rely on their id, name (and student_id) attributes.
+
+    Returns:
+        tuple: (outcome, exam, student). outcome is ELIGIBLE on success, otherwise
+               EXAM_NOT_FOUND, STUDENT_NOT_FOUND or NOT_ELIGIBLE.
+    """
+    indexed = eligibility_index.lookup(exam_id, student_identifier)
+    if indexed:
+        exam, student = indexed
+        return ELIGIBLE, exam, student
+
+    exam = Exam.query.get(exam_id)
+    if not exam:
+        lcd_display.display_alert("Error:", "Exam Not Found")
+        return EXAM_NOT_FOUND, None, None
+
+    # Rebuild the index if the exam is in authentication mode but not indexed in this process
+    # (e.g. after a restart), so the following scans are served from memory.
+    if exam.exam_status == Exam.STATUS_AUTH_ACTIVE and not eligibility_index.is_loaded_for(exam.id):
+        eligibility_index.load(exam)
+
+    student = Student.query.filter_by(student_id=student_identifier).first()
+    if not student:
+        lcd_display.display_alert(f"Stud ID:{student_identifier[:8]}", "Not Found")
+        return STUDENT_NOT_FOUND, exam, None
+
+    assignment = StudentExamAssignment.query.filter_by(student_id=student.id, exam_id=exam.id).first()
+    if not assignment:
+        lcd_display.display_alert(f"{student.name[:16]}", "NOT ELIGIBLE")
+        return NOT_ELIGIBLE, exam, student
+
+    return ELIGIBLE, exam, student
+
+
+def generate_booklet(exam, student):
+    """
+    Generates the booklet PDF for an eligible student.
+
+    Returns:
+        tuple: (pdf_file_path, barcode_value), both None if generation failed.
+    """
+    lcd_display.display_message(f"{student.name[:8]} ELIGIBLE", "Printing...", delay_after=1)
+
+    # Using a combination of student ID, exam ID, and timestamp for uniqueness
+    timestamp_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    unique_booklet_id = f"S{student.id}E{exam.id}T{timestamp_str}"
+
+    # If run.py is in Booklet_Scan, then `current_app.root_path` is `Booklet_Scan/app`,
+    # so `../output_barcodes` is `Booklet_Scan/output_barcodes`.
+    booklet_output_dir = os.path.join(current_app.root_path, '..', 'output_barcodes')
+
+    # Imported here: ReportLab loads on the first booklet (or in the background warm-up,
+    # app/utils/startup.py, warm_up) rather than delaying the server's start
+    from app.utils.booklet_generator import generate_single_booklet
+
+    with perf.span('booklet_pdf'):
+        pdf_file_path, barcode_value = generate_single_booklet(
+            unique_id=unique_booklet_id,
+            output_folder=booklet_output_dir,
+            student_name=student.name,
+            exam_name=exam.name
+        )
+    if not pdf_file_path or not barcode_value:
+        lcd_display.display_alert("Error:", "PDF Gen Failed")
+        return None, None
+    return pdf_file_path, barcode_value
+
+
+def render_booklet(exam, student):
+    """
+    Zero-disk variant of generate_booklet (BOOKLET_ZERO_DISK): renders the booklet PDF into
+    memory. If BOOKLET_ARCHIVE is on, a copy is queued for writing in the background.
+
+    Returns:
+        tuple: (pdf_data, barcode_value), both None if generation failed.
+    """
+    lcd_display.display_message(f"{student.name[:8]} ELIGIBLE", "Printing...", delay_after=1)
+
+    timestamp_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+    unique_booklet_id = f"S{student.id}E{exam.id}T{timestamp_str}"
+
+    from app.utils.booklet_generator import render_single_booklet, booklet_filename  # see generate_booklet
+
+    with perf.span('booklet_pdf'):
+        pdf_data, barcode_value = render_single_booklet(
+            unique_id=unique_booklet_id,
+            student_name=student.name,
+            exam_name=exam.name
+        )
+    if not pdf_data or not barcode_value:
+        lcd_display.display_alert("Error:", "PDF Gen Failed")
+        return None, None
+
+    if current_app.config.get('BOOKLET_ARCHIVE'):
+        archive_dir = os.path.join(current_app.root_path, '..', 'output_barcodes', 'archive', timestamp_str[:8])
+        booklet_archive.archive(os.path.join(archive_dir, booklet_filename(unique_booklet_id)), pdf_data)
+    return pdf_data, barcode_value
+
+
+def spool_booklet(pdf_file_path, barcode_value, student, pdf_data=None):
+    """
+    Sends a generated booklet to the printer: the in-memory PDF if pdf_data is given
+    (piped to the spooler), otherwise the file at pdf_file_path.
+
+    Returns:
+        bool: True if the print job was accepted by the spooler.
+    """
+    with perf.span('print_pdf'):
+        if pdf_data is not None:
+            print_success = print_pdf_data(pdf_data, printer_name=current_app.config.get('DEFAULT_PRINTER_NAME'),
+                                           command_name=current_app.config.get('PRINTER_COMMAND'), title=barcode_value)
+        else:
+            print_success = print_pdf(pdf_file_path, printer_name=current_app.config.get('DEFAULT_PRINTER_NAME'),
+                                      command_name=current_app.config.get('PRINTER_COMMAND'))
+    if not print_success:
+        lcd_display.display_alert(f"BK:{barcode_value[:7]} GenOK", "PRINT FAILED")
+        return False
+    lcd_display.display_message(f"BK:{barcode_value[:7]} OK", f"{student.name[:8]} Printed", delay_after=2)
+    return True
+
+
+def record_booklet(exam, student, booklet_code):
+    """
+    Records a booklet code against a student for an exam.
+
+    Returns:
+        tuple: (outcome, existing_scan). outcome is RECORDED, DUPLICATE or SAVE_FAILED;
+               existing_scan is the clashing ScanRecord for DUPLICATE (None if it was deleted
+               in the meantime), otherwise None.
+    """
+    if scan_journal.is_enabled():
+        outcome, existing_scan = _journal_booklet(exam, student, booklet_code)
+    else:
+        outcome, existing_scan = _insert_booklet(exam, student, booklet_code)
+    if outcome in (RECORDED, DUPLICATE):
+        # Push the exam's new figures to any live dashboards watching it
+        live_dashboard.scan_recorded(exam.id, student, booklet_code, outcome)
+    return outcome, existing_scan
+
+
+def _insert_booklet(exam, student, booklet_code):
+    """record_booklet without the journal: the scan is committed straight to the database."""
+    # A single insert-or-ignore statement: the _exam_booklet_uc constraint decides, so two
+    # stations scanning the same booklet at the same moment cannot both record it.
+    # The exam's progress counters are updated in the same transaction (by trigger for a new record).
+    try:
+        inserted = db_utils.insert_ignore(ScanRecord, [{'student_id': student.id, 'exam_id': exam.id,
+                                                        'booklet_code': booklet_code}])
+        if inserted:
+            # A recorded pre-generated code (e.g. pre-printed by flask print-booklets) must not be printed again
+            pregenerate.mark_used(exam.id, [booklet_code])
+        else:
+            exam_progress.record_duplicate(exam.id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error saving scan record: {e}")
+        lcd_display.display_alert("Error:", "Save Failed")
+        return SAVE_FAILED, None
+
+    if not inserted:
+        existing_scan = ScanRecord.query.filter_by(exam_id=exam.id, booklet_code=booklet_code).first()
+        lcd_display.display_alert(f"BK:{booklet_code[:10]}", "WARN:DUPLICATE")
+        return DUPLICATE, existing_scan
+
+    lcd_display.display_message(f"BK:{booklet_code[:7]} Saved", f"{student.name[:8]} Done", delay_after=3)
+    return RECORDED, None
+
+
+def _count_duplicate(exam_id):
+    # Journal mode: a duplicate is decided in memory, so its counter gets a small transaction of its own
+    try:
+        exam_progress.record_duplicate(exam_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error counting duplicate scan for exam {exam_id}: {e}")
+
+
+def _flushed_scan(exam, booklet_code):
+    # Journal mode: the stored ScanRecord holding a code, after flushing the journal (None if the flush failed)
+    scan_journal.flush()
+    return ScanRecord.query.filter_by(exam_id=exam.id, booklet_code=booklet_code).first()
+
+
+def _journal_booklet(exam, student, booklet_code):
+    """record_booklet with the write-behind scan journal (SCAN_JOURNAL): same outcomes and LCD messages."""
+    try:
+        journalled = scan_journal.append(exam, student, booklet_code)
+        if not journalled:
+            # Rare path: flush so the clashing scan can be returned as a ScanRecord. If there is
+            # none and the code is not waiting in the journal either (the record was deleted
+            # since), the in-memory check was stale - try again.
+            existing_scan = _flushed_scan(exam, booklet_code)
+            if existing_scan is None and not scan_journal.is_pending(exam.id, booklet_code):
+                scan_journal.forget(exam.id, booklet_code)
+                journalled = scan_journal.append(exam, student, booklet_code)
+                if not journalled:
+                    # Another station journalled the same code in between
+                    existing_scan = _flushed_scan(exam, booklet_code)
+    except OSError as e:
+        current_app.logger.error(f"Error writing scan journal: {e}")
+        lcd_display.display_alert("Error:", "Save Failed")
+        return SAVE_FAILED, None
+    if not journalled:
+        if existing_scan is None:
+            # The clashing scan is still journalled because the flush failed: there is no record
+            # to show, and this scan is not journalled either - the station has to try again
+            current_app.logger.error(f"Scan journal: booklet {booklet_code} for exam {exam.id} is journalled but "
+                                     f"could not be saved yet; scan of student {student.student_id} not recorded")
+            lcd_display.display_alert("Error:", "Save Failed")
+            return SAVE_FAILED, None
+        _count_duplicate(exam.id)
+        lcd_display.display_alert(f"BK:{booklet_code[:10]}", "WARN:DUPLICATE")
+        return DUPLICATE, existing_scan
+    lcd_display.display_message(f"BK:{booklet_code[:7]} Saved", f"{student.name[:8]} Done", delay_after=3)
+    return RECORDED, None
@@ -23,7 +23,7 @@ def load_user(id):
 
 class Student(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128), nullable=False)
+    name = db.Column(db.String(128), nullable=False, index=True) # Sort key of the admin student list
     student_id = db.Column(db.String(64), unique=True, nullable=False, index=True)
     course = db.Column(db.String(128))
 
@@ -57,7 +57,7 @@ class Exam(db.Model):
     name = db.Column(db.String(128), nullable=False)
     course = db.Column(db.String(128)) # Course for which the exam is being held
     venue_id = db.Column(db.Integer, db.ForeignKey('venue.id'), nullable=False)
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True) # Sort key of the admin exam/assignment lists
     start_time = db.Column(db.Time, nullable=False)
     end_time = db.Column(db.Time, nullable=False)
     # New field for exam status
@@ -94,8 +94,69 @@ class ScanRecord(db.Model):
     booklet_code = db.Column(db.String(128), nullable=False, index=True)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow, nullable=False)
 
-    # Unique constraint for booklet_code per exam to prevent duplicate booklet scans for the same exam
-    __table_args__ = (db.UniqueConstraint('exam_id', 'booklet_code', name='_exam_booklet_uc'),)
+    # Unique constraint for booklet_code per exam to prevent duplicate booklet scans for the same exam.
+    # The (exam, student) index answers "has this student scanned already" for the progress counters.
+    __table_args__ = (db.UniqueConstraint('exam_id', 'booklet_code', name='_exam_booklet_uc'),
+                      db.Index('ix_scan_record_exam_student', 'exam_id', 'student_id'))
 
     def __repr__(self):
         return f'<ScanRecord Student: {self.student.student_id if self.student else "N/A"} - Exam: {self.exam.name if self.exam else "N/A"} - Booklet: {self.booklet_code}>'
+
+class PregeneratedBooklet(db.Model):
+    # Booklet PDFs generated ahead of an exam (see app/main/pregenerate.py) so the live scan only prints them
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False)
+    booklet_code = db.Column(db.String(128), nullable=False)
+    pdf_path = db.Column(db.String(512), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    used_at = db.Column(db.DateTime, nullable=True) # Set when a print job claims it, or once printed by print-booklets or recorded
+
+    # One pre-generated booklet per student per exam; later booklets for the same student are generated live
+    __table_args__ = (db.UniqueConstraint('student_id', 'exam_id', name='_pregen_student_exam_uc'),
+                      db.UniqueConstraint('exam_id', 'booklet_code', name='_pregen_exam_booklet_uc'))
+
+    def __repr__(self):
+        return f'<PregeneratedBooklet {self.booklet_code} Exam: {self.exam_id} Student: {self.student_id}{" (used)" if self.used_at else ""}>'
+
+class PrintedBooklet(db.Model):
+    # Every booklet code sent to the printer (print jobs, flask print-booklets). recorded is kept in step with
+    # scan_record by SQLite triggers (see app/main/exam_progress.py), so printed-but-unrecorded is per booklet
+    id = db.Column(db.Integer, primary_key=True)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+    booklet_code = db.Column(db.String(128), nullable=False)
+    printed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    recorded = db.Column(db.Boolean, nullable=False, default=False, server_default='0') # A scan record has this code
+
+    # A code printed again (a retried job) is still one booklet; unrecorded booklets are counted from the index
+    __table_args__ = (db.UniqueConstraint('exam_id', 'booklet_code', name='_printed_exam_booklet_uc'),
+                      db.Index('ix_printed_booklet_exam_recorded', 'exam_id', 'recorded'))
+
+    def __repr__(self):
+        return f'<PrintedBooklet {self.booklet_code} Exam: {self.exam_id} Student: {self.student_id}{" (recorded)" if self.recorded else ""}>'
+
+class ExamProgress(db.Model):
+    # Per-exam counters (see app/main/exam_progress.py). assigned, booklets, students_scanned and printed are
+    # kept in step with their tables by SQLite triggers; duplicate_attempts counts events that leave no row.
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), primary_key=True)
+    assigned = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    booklets = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Scan records
+    students_scanned = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Students with at least one booklet
+    duplicate_attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    printed = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Booklet codes printed (printed_booklet rows)
+
+    exam = db.relationship('Exam', backref=db.backref('progress', uselist=False, cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<ExamProgress Exam: {self.exam_id} {self.students_scanned}/{self.assigned} students, {self.booklets} booklets>'
+
+
+class CacheVersion(db.Model):
+    # Version stamp per cached list (see app/utils/choices_cache.py): bumped in the same transaction as
+    # the change, so every server process knows when its cached copy is out of date.
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name} v{self.version}>'
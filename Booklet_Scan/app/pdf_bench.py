@@ -0,0 +1,231 @@
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource  # peak RSS; Unix only
+except ImportError:
+    resource = None
+
+# Booklet PDF benchmark suite (flask bench-pdf).
+#
+# Every case runs in a fresh process, so its peak RSS is its own and one case cannot warm the
+# caches of the next. A case renders a few booklets to warm up, then times `count` more -
+# `rounds` times, keeping the fastest round to damp scheduler noise:
+#
+#   single/file    - generate_single_booklet writing to a scratch folder, one case per barcode
+#                    prefix and length (the live scan path)
+#   single/memory  - render_single_booklet (BOOKLET_ZERO_DISK)
+#   pool/file      - generate_single_booklet across a process pool (pregenerate-booklets)
+#
+# and reports booklets/s, bytes per PDF and peak RSS. Import cost is measured in fresh
+# interpreters as well: the first one is the "cold" start, the median of the next ones "warm"
+# (bytecode and the OS file cache already populated).
+#
+# Results can be saved as a baseline; a later run fails when any case's booklets/s drops more
+# than the threshold below it. Baselines are only comparable on the same hardware - keep one
+# per station model.
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))),
+                                     'booklet_bench_baseline.json')  # next to app.db
+DEFAULT_THRESHOLD = 0.15
+DEFAULT_ROUNDS = 3
+DEFAULT_PREFIXES = ('BK', 'EXAM')
+DEFAULT_LENGTHS = (12, 28, 48)  # characters after the prefix; live booklets are ~28 (S<id>E<id>T<timestamp>)
+DEFAULT_LENGTH = 28
+WARMUP_BOOKLETS = 5
+
+# Run with `python -c` from the Booklet_Scan directory; prints one JSON line of timings in seconds
+IMPORT_PROBE = """
+import json, time
+started = time.perf_counter()
+import reportlab.pdfgen.canvas, reportlab.graphics.barcode.code128
+reportlab_done = time.perf_counter()
+from app.utils import booklet_generator
+module_done = time.perf_counter()
+booklet_generator.render_single_booklet('S1E1T20250101120000000000')
+first_done = time.perf_counter()
+booklet_generator.render_single_booklet('S2E1T20250101120000000000')
+second_done = time.perf_counter()
+print(json.dumps({'reportlab_import': reportlab_done - started, 'module_import': module_done - reportlab_done,
+                  'first_booklet': first_done - module_done, 'next_booklet': second_done - first_done}))
+"""
+
+
+def _peak_rss_kb(who='self'):
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == 'self' else resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+
+
+def booklet_ids(count, length, start=0):
+    """Unique ids shaped like the live ones (S<n>E1T<digits>) and exactly `length` characters long."""
+    ids = []
+    for n in range(start, start + count):
+        head = f'S{n}E1T'
+        if len(head) >= length:
+            ids.append(f'{n:0{length}d}'[-length:])
+        else:
+            ids.append(head + '20250101120000000000000000000000000000000000000000'[:length - len(head)])
+    return ids
+
+
+def _generate_chunk(ids, prefix, output_folder):
+    # Runs in a pool worker: returns the bytes written
+    from app.utils.booklet_generator import generate_single_booklet
+
+    written = 0
+    for unique_id in ids:
+        path, _ = generate_single_booklet(unique_id, output_folder=output_folder, barcode_prefix=prefix,
+                                          student_name='Benchmark Student', exam_name='Benchmark Exam')
+        written += os.path.getsize(path)
+        os.remove(path)
+    return written
+
+
+def _run_case(mode, target, prefix, length, count, workers, rounds):
+    # Runs in a fresh process per case
+    from app.utils.booklet_generator import generate_single_booklet, render_single_booklet
+
+    output_folder = tempfile.mkdtemp(prefix='booklet-bench-')
+
+    def one(unique_id):
+        if target == 'memory':
+            pdf_data, _ = render_single_booklet(unique_id, barcode_prefix=prefix,
+                                                student_name='Benchmark Student', exam_name='Benchmark Exam')
+            return len(pdf_data)
+        path, _ = generate_single_booklet(unique_id, output_folder=output_folder, barcode_prefix=prefix,
+                                          student_name='Benchmark Student', exam_name='Benchmark Exam')
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+
+    try:
+        for unique_id in booklet_ids(WARMUP_BOOKLETS, length, start=10 ** 6):
+            one(unique_id)
+        ids = booklet_ids(count, length)
+        elapsed = None
+        if mode == 'single':
+            worker_rss = None
+            for _ in range(rounds):
+                started = time.perf_counter()
+                total_bytes = sum(one(unique_id) for unique_id in ids)
+                elapsed = min(elapsed or float('inf'), time.perf_counter() - started)
+        else:
+            chunk = max(1, count // (workers * 4))
+            chunks = [ids[i:i + chunk] for i in range(0, len(ids), chunk)]
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                # Start (and warm) every worker before the clock starts
+                list(pool.map(_generate_chunk, [booklet_ids(1, length, start=10 ** 6 + n) for n in range(workers)],
+                              [prefix] * workers, [output_folder] * workers))
+                for _ in range(rounds):
+                    started = time.perf_counter()
+                    total_bytes = sum(pool.map(_generate_chunk, chunks, [prefix] * len(chunks),
+                                               [output_folder] * len(chunks)))
+                    elapsed = min(elapsed or float('inf'), time.perf_counter() - started)
+            worker_rss = _peak_rss_kb('children')
+    finally:
+        for name in os.listdir(output_folder):
+            os.remove(os.path.join(output_folder, name))
+        os.rmdir(output_folder)
+
+    return {'booklets_per_second': round(count / elapsed, 1), 'bytes_per_pdf': round(total_bytes / count),
+            'seconds': round(elapsed, 3), 'peak_rss_kb': _peak_rss_kb(), 'peak_worker_rss_kb': worker_rss}
+
+
+def case_name(mode, target, prefix, length):
+    return f'{mode}/{target}/{prefix or "-"}/{length}'
+
+
+def measure_imports(repeats=5):
+    """
+    Times importing ReportLab and the booklet module and rendering the first booklet, each in
+    a fresh interpreter: the first run is 'cold', the median of `repeats` more runs 'warm'.
+    """
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = []
+    for _ in range(1 + repeats):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=project_dir, check=True,
+                                capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    def in_ms(run):
+        return {key: round(value * 1000, 1) for key, value in run.items()}
+    warm = {key: statistics.median(run[key] for run in runs[1:]) for key in runs[0]} if repeats else None
+    return {'cold_ms': in_ms(runs[0]), 'warm_ms': in_ms(warm) if warm else None}
+
+
+def run_benchmarks(count=200, workers=None, prefixes=DEFAULT_PREFIXES, lengths=DEFAULT_LENGTHS,
+                   rounds=DEFAULT_ROUNDS, import_repeats=5):
+    """
+    Runs the benchmark suite.
+
+    Args:
+        count (int): Booklets timed per round.
+        workers (int, optional): Pool size for the pool case (default: CPU count).
+        prefixes (iterable): Barcode prefixes for the single/file cases.
+        lengths (iterable): Barcode lengths (after the prefix) for the single/file cases.
+        rounds (int): Timed rounds per case; the fastest one counts.
+        import_repeats (int): Fresh interpreters timed after the cold one.
+
+    Returns:
+        dict: 'cases' (name -> booklets_per_second, bytes_per_pdf, seconds, peak_rss_kb,
+              peak_worker_rss_kb), 'imports', and the settings.
+    """
+    workers = workers or os.cpu_count() or 1
+    default_prefix = list(prefixes)[0] if prefixes else DEFAULT_PREFIXES[0]
+    cases = [('single', 'file', prefix, length) for prefix in prefixes for length in lengths]
+    cases.append(('single', 'memory', default_prefix, DEFAULT_LENGTH))
+    cases.append(('pool', 'file', default_prefix, DEFAULT_LENGTH))
+
+    results = {}
+    for mode, target, prefix, length in cases:
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as runner:
+            results[case_name(mode, target, prefix, length)] = runner.submit(
+                _run_case, mode, target, prefix, length, count, workers, rounds).result()
+    return {'count': count, 'rounds': rounds, 'workers': workers, 'python': sys.version.split()[0],
+            'machine': os.uname().machine if hasattr(os, 'uname') else sys.platform,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'cases': results, 'imports': measure_imports(import_repeats)}
+
+
+def compare_to_baseline(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares booklets/s of every case also in the baseline.
+
+    Args:
+        threshold (float): Largest allowed drop, as a fraction of the baseline (0.15 = 15%).
+
+    Returns:
+        list: One dict per compared case - 'case', 'baseline', 'current', 'change' (fraction)
+              and 'regressed'.
+    """
+    comparison = []
+    for name, current in results['cases'].items():
+        previous = baseline.get('cases', {}).get(name)
+        if not previous:
+            continue
+        change = current['booklets_per_second'] / previous['booklets_per_second'] - 1
+        comparison.append({'case': name, 'baseline': previous['booklets_per_second'],
+                           'current': current['booklets_per_second'], 'change': round(change, 3),
+                           'regressed': change < -threshold})
+    return comparison
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
@@ -0,0 +1,146 @@
+import contextlib
+import datetime
+import os
+import tempfile
+import threading
+from sqlalchemy import event
+from config import Config
+
+# SQL statement budget per page (flask check-query-budget).
+#
+# Fills a scratch database with a few pages' worth of every kind of row, logs in as an admin
+# and requests each list page and form below, counting the SQL statements each request runs.
+# A page over its budget usually means an N+1 has crept in - a template or choice list
+# touching a relationship (assignment.exam.venue, exam.venue.name ...) that the query did not
+# load, so every row costs another query. The budgets don't depend on the number of rows.
+
+BUDGET_ROWS = 30  # rows of each kind, more than one page of every list
+
+# (endpoint, URL arguments, most SQL statements allowed). Every request also loads the
+# logged-in admin, the list pages count their table the first time (row_counts) and the forms
+# load each choice list the first time, after reading the list versions (choices_cache).
+QUERY_BUDGETS = [
+    ('admin.dashboard', {}, 1),
+    ('admin.list_courses', {}, 3),
+    ('admin.list_students', {}, 3),
+    ('admin.list_venues', {}, 3),
+    ('admin.list_exams', {}, 3),
+    ('admin.list_assignments', {}, 3),
+    ('admin.list_scan_records', {}, 3),
+    ('admin.export_scan_records', {}, 4),
+    ('admin.add_student', {}, 2),
+    ('admin.edit_student', {'id': 1}, 3),
+    ('admin.add_exam', {}, 2),
+    ('admin.edit_exam', {'id': 1}, 3),
+    ('admin.live_exam', {'exam_id': 1}, 2),
+    ('admin.perf_report', {}, 1),
+    ('admin.add_assignment', {}, 3),
+    ('admin.bulk_assignment', {}, 3),
+    ('admin.search_students', {'q': 'Student 1'}, 2),
+    ('main.scan_ui', {}, 2),
+    ('main.scan_station', {}, 2),
+]
+
+
+class QueryCounter:
+    """Counts the SQL statements run on an engine while it is active (see count_queries)."""
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+        self._thread = threading.get_ident()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Only the statements of the thread being measured (not e.g. the scan journal flusher)
+        if threading.get_ident() == self._thread:
+            self.count += 1
+            self.statements.append(statement)
+
+
+@contextlib.contextmanager
+def count_queries(engine):
+    """
+    Context manager counting the SQL statements the current thread runs on engine.
+
+        with count_queries(db.engine) as counter:
+            ...
+        counter.count, counter.statements
+    """
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._before_cursor_execute)
+
+
+def _seed(db):
+    from app.models import AdminUser, Course, Venue, Exam, Student, StudentExamAssignment, ScanRecord
+
+    admin = AdminUser(username='budget')
+    admin.set_password('budget')
+    db.session.add(admin)
+    for n in range(BUDGET_ROWS):
+        db.session.add(Course(name=f'Course {n:02d}', code=f'C{n:02d}'))
+        db.session.add(Venue(name=f'Venue {n:02d}'))
+    db.session.flush()
+    for n in range(BUDGET_ROWS):
+        db.session.add(Exam(name=f'Exam {n:02d}', course=f'Course {n:02d}', venue_id=n + 1,
+                            date=datetime.date(2025, 1, 1) + datetime.timedelta(days=n),
+                            start_time=datetime.time(9), end_time=datetime.time(12)))
+        db.session.add(Student(name=f'Student {n:02d}', student_id=f'BUDGET{n:04d}', course=f'Course {n:02d}'))
+    db.session.flush()
+    for n in range(BUDGET_ROWS):
+        db.session.add(StudentExamAssignment(student_id=n + 1, exam_id=n + 1))
+        db.session.add(ScanRecord(student_id=n + 1, exam_id=n + 1, booklet_code=f'BUDGET{n:06d}'))
+    db.session.commit()
+
+
+def run_query_budget(base_config=None):
+    """
+    Requests every page in QUERY_BUDGETS against a scratch database and counts its SQL statements.
+
+    Args:
+        base_config (dict, optional): Config to copy the SQLITE_* settings from.
+
+    Returns:
+        list: One dict per page - 'endpoint', 'url', 'status', 'queries', 'budget', 'passed'
+              and, for pages over budget, the 'statements' they ran.
+    """
+    from flask import url_for
+    from app import create_app, db
+
+    temp_dir = tempfile.mkdtemp(prefix='booklet-query-budget-')
+    overrides = {key: value for key, value in (base_config or {}).items() if key.startswith('SQLITE_')}
+    overrides.update(SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(temp_dir, 'budget.db'),
+                     SCAN_JOURNAL=False, TESTING=True, WTF_CSRF_ENABLED=False,
+                     CHOICES_CHECK_INTERVAL=3600)  # versions read once, whatever the run takes
+    app = create_app(type('QueryBudgetConfig', (Config,), overrides))
+
+    results = []
+    try:
+        with app.app_context():
+            db.create_all()
+            _seed(db)
+            engine = db.engine
+        client = app.test_client()
+        client.post('/auth/login', data={'username': 'budget', 'password': 'budget'})
+        for endpoint, arguments, budget in QUERY_BUDGETS:
+            with app.test_request_context():
+                url = url_for(endpoint, **arguments)
+            with count_queries(engine) as counter:
+                response = client.get(url)
+            result = {'endpoint': endpoint, 'url': url, 'status': response.status_code,
+                      'queries': counter.count, 'budget': budget,
+                      'passed': response.status_code == 200 and counter.count <= budget}
+            if not result['passed']:
+                result['statements'] = counter.statements
+            results.append(result)
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        for name in os.listdir(temp_dir):
+            os.remove(os.path.join(temp_dir, name))
+        os.rmdir(temp_dir)
+    return results
@@ -0,0 +1,362 @@
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from werkzeug.wsgi import ClosingIterator
+from config import Config
+
+# Production server (python serve.py).
+#
+# run.py starts Flask's debug server: one process with the reloader, and the database setup
+# and LCD start-up on every launch. serve.py runs the app under a real WSGI server instead:
+#
+# - waitress when it is installed (SERVER_THREADS request threads per process), otherwise
+#   Werkzeug's threaded server (one thread per request);
+# - SERVER_WORKERS processes (Unix only) all accepting on one listening socket that the parent
+#   binds before forking them; the parent only supervises and restarts a worker that dies;
+# - with more than one worker, one more process - the hardware owner - drives the LCD and runs
+#   the print commands and booklet print jobs for all of them (app/utils/hardware.py), so only
+#   one process ever writes to the I2C bus and any worker can answer a station about its job.
+#   It also relays each recorded scan to every worker's live dashboards, and the workers check
+#   the eligibility index against the database (ELIGIBILITY_VERSION_CHECK). The PERF_MONITOR
+#   samples of every worker are shipped to it too, so the Performance page and its reset
+#   cover the whole server whichever worker serves them. A single worker owns the hardware
+#   itself;
+# - SIGTERM or Ctrl+C stops it gracefully: the workers stop accepting connections, let the
+#   requests in progress finish and drain the print job queue, the booklet archive and the
+#   scan journal within SERVER_SHUTDOWN_TIMEOUT; the hardware owner is stopped last, once no
+#   worker can submit a job any more, and drains the print jobs it runs.
+#
+# The database tables and indexes are created once, by the parent, before anything is forked.
+
+
+class _Stop(Exception):
+    """Raised by the SIGTERM/SIGINT handlers to leave a blocking accept or wait."""
+
+
+def _raise_stop(signum, frame):
+    raise _Stop()
+
+
+class _InFlight:
+    """WSGI middleware counting the requests being handled, so shutdown can wait for them."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.count = 0
+        self.streaming = 0  # response bodies still being sent after their request returned
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        with self._idle:
+            self.count += 1
+        try:
+            body = self.wsgi_app(environ, start_response)
+        finally:
+            with self._idle:
+                self.count -= 1
+                self._idle.notify_all()
+        # The body is sent after this returns; a streamed one (live dashboard, export) keeps its
+        # thread until closed. Counted so shutdown can report them, but not waited for (a
+        # dashboard never ends)
+        with self._idle:
+            self.streaming += 1
+        return ClosingIterator(body, self._stream_closed)
+
+    def _stream_closed(self):
+        with self._idle:
+            self.streaming -= 1
+
+    def wait(self, timeout):
+        with self._idle:
+            return self._idle.wait_for(lambda: self.count == 0, timeout)
+
+
+class _WaitressServer:
+    name = 'waitress'
+
+    def __init__(self, app, sock, threads):
+        from waitress.server import create_server
+        self.server = create_server(app, sockets=[sock], threads=threads)
+
+    def run(self):
+        self.server.run()
+
+    def stop(self):
+        # Called from the signal handler: waitress takes SystemExit in its loop as the signal to
+        # finish the requests in progress and return from run()
+        raise SystemExit()
+
+    def close(self):
+        self.server.close()
+
+
+class _WerkzeugServer:
+    name = 'werkzeug'
+
+    def __init__(self, app, sock, threads):
+        from werkzeug.serving import make_server
+        host, port = sock.getsockname()[:2]
+        self.server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+        # Every worker accepts on this socket; a worker that loses the race must not block in accept()
+        self.server.socket.setblocking(False)
+
+    def run(self):
+        self.server.serve_forever(poll_interval=0.5)
+
+    def stop(self):
+        # shutdown() waits for serve_forever() to return, so it can't run in the signal handler's thread
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def close(self):
+        self.server.server_close()
+
+
+def _create_server(app, sock, threads):
+    try:
+        return _WaitressServer(app, sock, threads)
+    except ImportError:
+        return _WerkzeugServer(app, sock, threads)
+
+
+def _setup_config(config_class):
+    # The parent only creates tables; it must not open (or replay) the scan journal
+    return type('ServerSetupConfig', (config_class,), {'SCAN_JOURNAL': False})
+
+
+def _worker_config(config_class):
+    # Several workers: each one's eligibility index must notice changes made through the others
+    return type('ServerWorkerConfig', (config_class,), {'ELIGIBILITY_VERSION_CHECK': True})
+
+
+def prepare_database(config_class=Config):
+    """Creates missing tables and indexes (what run.py does on every start), then closes the connections."""
+    from app import create_app, db
+    from app.utils import db_utils
+
+    app = create_app(_setup_config(config_class))
+    with app.app_context():
+        db.create_all()
+        for index_name in db_utils.create_missing_indexes():
+            print(f"Created index {index_name}")
+        db.session.remove()
+        db.engine.dispose()  # no connection may be shared with the forked workers
+
+
+def _start_display():
+    from app.utils import lcd_display
+    lcd_display.init_lcd()
+    lcd_display.display_ip_address()
+
+
+def _drain_print_jobs(deadline, timeout):
+    from app.main import print_jobs
+
+    pending = print_jobs.get_stats()['pending']
+    if pending:
+        print(f"Shutdown: waiting for {pending} print job(s)...")
+    drainer = threading.Thread(target=print_jobs.shutdown, kwargs={'wait': True}, name='print-job-drain', daemon=True)
+    drainer.start()
+    drainer.join(max(0.0, deadline - time.monotonic()))
+    if drainer.is_alive():
+        print(f"Shutdown: {print_jobs.get_stats()['pending']} print job(s) not finished after {timeout:.0f}s.")
+
+
+def _drain(app, in_flight, timeout):
+    # Runs once the server has stopped accepting connections
+    from app import db
+    from app.main import scan_journal
+    from app.utils import lcd_display
+
+    deadline = time.monotonic() + timeout
+    if not in_flight.wait(timeout):
+        print(f"Shutdown: {in_flight.count} request(s) still running after {timeout:.0f}s.")
+    if in_flight.streaming:
+        print(f"Shutdown: closing {in_flight.streaming} response(s) still being sent (live dashboards, exports).")
+
+    _drain_print_jobs(deadline, timeout)  # nothing to wait for when the hardware owner runs the jobs
+    scan_journal.shutdown()  # commits the journalled scans still pending
+    lcd_display.shutdown()
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _run_worker(config_class, sock, threads, shutdown_timeout, hardware_channel=None, number=0):
+    """Serves requests on sock until SIGTERM/SIGINT, then drains. hardware_channel: (address, authkey) of the owner."""
+    from app import create_app
+    from app.utils import hardware, startup
+
+    if hardware_channel is not None:
+        hardware.connect(*hardware_channel)
+    app = create_app(config_class)
+    in_flight = _InFlight(app.wsgi_app)
+    app.wsgi_app = in_flight
+    server = _create_server(app, sock, threads)
+    if hardware_channel is None:
+        _start_display()
+        startup.warm_up_in_background(app)  # ReportLab loads while the first requests are already served
+
+    stopping = []
+
+    def on_signal(signum, frame):
+        if not stopping:
+            stopping.append(signum)
+            server.stop()
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+
+    print(f"Worker {number} (pid {os.getpid()}) serving with {server.name}"
+          f"{f', {threads} threads' if server.name == 'waitress' else ''}.")
+    try:
+        server.run()
+    finally:
+        server.close()
+    _drain(app, in_flight, shutdown_timeout)
+    hardware.disconnect()
+    print(f"Worker {number} (pid {os.getpid()}) stopped.")
+
+
+def _run_hardware_owner(config_class, hardware_channel, shutdown_timeout):
+    """Drives the LCD and printer and runs the print jobs for the workers until the parent sends SIGTERM."""
+    from app import create_app, db
+    from app.main import print_jobs
+    from app.utils import hardware, lcd_display, startup
+
+    # Ctrl+C reaches every process of the terminal; the owner keeps going until the workers are done
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _raise_stop)
+    # The app registers the @owned() functions and is what the print jobs run in
+    app = create_app(_worker_config(config_class))
+    print_jobs.own_jobs(app)
+    owner = hardware.HardwareOwner(*hardware_channel)
+    print(f"Hardware owner (pid {os.getpid()}) driving the LCD and printer.")
+    try:
+        _start_display()
+        startup.warm_up_in_background(app)
+        owner.serve_forever()
+    except _Stop:
+        pass
+    if not owner.close():
+        print(f"Hardware owner: {owner.active} call(s) still running at shutdown.")
+    _drain_print_jobs(time.monotonic() + shutdown_timeout, shutdown_timeout)
+    lcd_display.shutdown()
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    print(f"Hardware owner (pid {os.getpid()}) stopped.")
+
+
+def _fork(target, *args):
+    pid = os.fork()
+    if pid:
+        return pid
+    code = 0
+    try:
+        target(*args)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)  # never return into the parent's code
+
+
+def _stop_children(pids, timeout):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.monotonic() + timeout
+    remaining = set(pids)
+    while remaining:
+        for pid in list(remaining):
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                remaining.discard(pid)
+        if remaining and time.monotonic() >= deadline:
+            for pid in remaining:
+                print(f"Shutdown: killing process {pid}.")
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            break
+        time.sleep(0.1)
+
+
+def serve(config_class=Config, host=None, port=None, workers=None, threads=None):
+    """
+    Runs the production server until SIGTERM or Ctrl+C.
+
+    Args:
+        config_class: App configuration; the SERVER_* settings are the defaults for the rest.
+        host (str), port (int): Address to listen on.
+        workers (int): Worker processes. More than one needs os.fork (Unix).
+        threads (int): Request threads per worker (waitress; Werkzeug starts one per request).
+    """
+    host = host or config_class.SERVER_HOST
+    port = port or config_class.SERVER_PORT
+    workers = max(1, workers or config_class.SERVER_WORKERS)
+    threads = max(1, threads or config_class.SERVER_THREADS)
+    shutdown_timeout = config_class.SERVER_SHUTDOWN_TIMEOUT
+    if workers > 1 and not hasattr(os, 'fork'):
+        print("Several worker processes need os.fork; serving with one.")
+        workers = 1
+    if workers > 1 and config_class.SCAN_JOURNAL:
+        raise SystemExit("SCAN_JOURNAL needs a single server process: use --workers 1.")
+
+    prepare_database(config_class)
+    sock = socket.create_server((host, port), backlog=128)
+    print(f"Serving on http://{host}:{port} with {workers} worker process(es).")
+    if workers == 1:
+        _run_worker(config_class, sock, threads, shutdown_timeout)
+        sock.close()
+        return
+
+    config_class = _worker_config(config_class)
+    runtime_dir = tempfile.mkdtemp(prefix='booklet-server-')
+    hardware_channel = (os.path.join(runtime_dir, 'hardware.sock'), os.urandom(32))
+    # Forked before any thread is started in this process; it stays single-threaded so it can fork replacements
+    owner = _fork(_run_hardware_owner, config_class, hardware_channel, shutdown_timeout)
+    children = {owner: None}  # pid -> worker number (None: the hardware owner)
+    for number in range(workers):
+        children[_fork(_run_worker, config_class, sock, threads, shutdown_timeout, hardware_channel, number)] = number
+
+    signal.signal(signal.SIGTERM, _raise_stop)
+    signal.signal(signal.SIGINT, _raise_stop)
+    try:
+        while True:
+            pid, status = os.wait()
+            if pid not in children:
+                continue
+            number = children.pop(pid)
+            print(f"{'Hardware owner' if number is None else f'Worker {number}'} (pid {pid}) exited "
+                  f"with status {status}; restarting it.")
+            time.sleep(1)  # don't spin if it dies on start
+            if number is None:
+                owner = _fork(_run_hardware_owner, config_class, hardware_channel, shutdown_timeout)
+                children[owner] = None
+            else:
+                children[_fork(_run_worker, config_class, sock, threads, shutdown_timeout, hardware_channel,
+                               number)] = number
+    except _Stop:
+        pass
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Workers first (their print jobs still need the owner), then the owner
+    print("Shutting down: finishing requests and print jobs...")
+    _stop_children([pid for pid, number in children.items() if number is not None], shutdown_timeout + 10)
+    _stop_children([pid for pid, number in children.items() if number is None], shutdown_timeout + 10)
+    sock.close()
+    shutil.rmtree(runtime_dir, ignore_errors=True)
+    print("Server stopped.")
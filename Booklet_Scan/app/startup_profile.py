@@ -0,0 +1,123 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Start-up profile (flask startup-profile).
+#
+# After a power cut the stations can only scan once the server is back, so the time from
+# starting Python to serving the first request is measured in fresh interpreters, split into:
+#
+#   interpreter  - Python itself, up to the first line of the probe
+#   import_app   - importing the app package (Flask, SQLAlchemy, the blueprints ...)
+#   create_app   - create_app(), with its own phases (app.extensions['startup_phases'])
+#   create_all / indexes - db.create_all() and the missing-index check run.py and serve.py do
+#   first_request - the login page: first template compile, first database connection
+#
+# The booklet warm-up (ReportLab import and first booklet, app/utils/startup.py) runs after
+# that in the background and is reported separately. One more run with `python -X importtime`
+# breaks the imports down per package and per app module.
+#
+# The first run is reported as 'cold' and the median of the others as 'warm'. Only a reboot
+# gives a truly cold start (empty OS file cache); run it on a freshly booted station for that.
+
+# Run with `python -c` from the Booklet_Scan directory; prints one JSON line of timings in ms
+STARTUP_PROBE = """
+import json, os, time
+def since_launch():
+    return round((time.time() - float(os.environ['STARTUP_PROFILE_LAUNCHED'])) * 1000, 1)
+def ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+interpreter = since_launch()
+started = time.perf_counter()
+from app import create_app, db
+import_app = ms(started)
+started = time.perf_counter()
+app = create_app()
+create_app_ms = ms(started)
+with app.app_context():
+    started = time.perf_counter()
+    db.create_all()
+    create_all = ms(started)
+    from app.utils import db_utils
+    started = time.perf_counter()
+    db_utils.create_missing_indexes()
+    indexes = ms(started)
+started = time.perf_counter()
+status = app.test_client().get('/auth/login').status_code
+first_request = ms(started)
+ready = since_launch()
+from app.utils import startup
+warmup = startup.warm_up()
+print(json.dumps({'boot_to_ready': ready, 'interpreter': interpreter, 'import_app': import_app,
+                  'create_app': create_app_ms, 'create_all': create_all, 'indexes': indexes,
+                  'first_request': first_request, 'first_request_status': status,
+                  'create_app_phases': dict(app.extensions['startup_phases']),
+                  'warmup_import': warmup['import_ms'], 'warmup_first_booklet': warmup['first_booklet_ms']}))
+"""
+
+STEPS = ('interpreter', 'import_app', 'create_app', 'create_all', 'indexes', 'first_request')
+
+
+def _run_probe(importtime=False):
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    # The probe must not replay or rewrite the scan journal of a server that may be running
+    env = dict(os.environ, SCAN_JOURNAL='0', STARTUP_PROFILE_LAUNCHED=repr(time.time()))
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', STARTUP_PROBE]
+    result = subprocess.run(command, cwd=project_dir, env=env, check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr, top=10):
+    """
+    Summarises `python -X importtime` output.
+
+    Returns:
+        dict: 'packages' - [package, ms] by self time summed over the package's modules, and
+              'app_modules' - [module, ms] by cumulative time (including what they import);
+              the `top` slowest of each.
+    """
+    packages = {}
+    app_modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        # "import time:  <self us> | <cumulative us> | <indented module name>"
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        module = module.strip()
+        root = module.split('.')[0]
+        packages[root] = packages.get(root, 0) + int(self_us)
+        if root == 'app':
+            app_modules[module] = int(cumulative_us)
+
+    def slowest(values):
+        return [[name, round(us / 1000, 1)] for name, us in sorted(values.items(), key=lambda item: -item[1])[:top]]
+    return {'packages': slowest(packages), 'app_modules': slowest(app_modules)}
+
+
+def _median_run(runs):
+    merged = {key: round(statistics.median(run[key] for run in runs), 1)
+              for key in ('boot_to_ready',) + STEPS + ('warmup_import', 'warmup_first_booklet')
+              if all(run.get(key) is not None for run in runs)}
+    merged['create_app_phases'] = {phase: round(statistics.median(run['create_app_phases'][phase] for run in runs), 1)
+                                   for phase in runs[0]['create_app_phases']}
+    return merged
+
+
+def run_profile(runs=3, top=10):
+    """
+    Profiles the server start-up in `runs` fresh interpreters plus one with -X importtime.
+
+    Returns:
+        dict: 'cold' (first run) and 'warm' (median of the other runs, None with runs=1) - each
+              with 'boot_to_ready', the STEPS, 'create_app_phases' and the warm-up timings, in
+              ms - and 'imports' (see parse_importtime).
+    """
+    results = [_run_probe()[0] for _ in range(max(1, runs))]
+    _, importtime = _run_probe(importtime=True)
+    return {'runs': len(results), 'python': sys.version.split()[0],
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'cold': results[0], 'warm': _median_run(results[1:]) if len(results) > 1 else None,
+            'imports': parse_importtime(importtime, top)}
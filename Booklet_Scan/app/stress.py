@@ -0,0 +1,169 @@
+import datetime
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import Config
+
+# Multi-station stress test (flask stress-scans).
+#
+# Several processes - standing in for server workers / stations - each run several threads
+# that all try to record the same set of booklet codes through scanning.record_booklet against
+# one scratch SQLite database. Afterwards every code must have been recorded exactly once, with
+# every other attempt reported as a duplicate, and no attempt may have failed with
+# "database is locked".
+
+STRESS_EXAM_ID = 1
+STRESS_STUDENTS = 20
+
+
+def _stress_config(database_uri, base_config):
+    overrides = {key: value for key, value in base_config.items()
+                 if key.startswith('SQLITE_') or key == 'SQLALCHEMY_ENGINE_OPTIONS'}
+    overrides.update(SQLALCHEMY_DATABASE_URI=database_uri, SCAN_JOURNAL=False, TESTING=True)
+    return type('StressConfig', (Config,), overrides)
+
+
+class _LockedErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.locked = 0
+        self.errors = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if 'locked' in message:
+            self.locked += 1
+        if len(self.errors) < 5:
+            self.errors.append(message)
+
+
+def _stress_worker(database_uri, base_config, codes, threads, seed):
+    # Runs in a worker process
+    from app import create_app
+    from app.main import scanning
+    from app.models import Exam, Student
+    from app.utils import lcd_display
+
+    lcd_display.set_backend(lcd_display.ConsoleBackend(echo=False))
+    app = create_app(_stress_config(database_uri, base_config))
+    counter = _LockedErrorCounter()
+    app.logger.addHandler(counter)
+    outcomes = {}
+    outcomes_lock = threading.Lock()
+
+    def run_thread(thread_number):
+        rng = random.Random(seed * 1000 + thread_number)
+        order = list(codes)
+        rng.shuffle(order)
+        with app.app_context():
+            exam = Exam.query.get(STRESS_EXAM_ID)
+            students = Student.query.all()
+            for code in order:
+                outcome, _ = scanning.record_booklet(exam, rng.choice(students), code)
+                with outcomes_lock:
+                    outcomes.setdefault(outcome, []).append(code)
+
+    workers = [threading.Thread(target=run_thread, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    lcd_display.shutdown()
+    return outcomes, counter.locked, counter.errors
+
+
+def run_stress_test(processes=4, threads=4, codes=200, database=None, base_config=None):
+    """
+    Runs the multi-station stress test against a scratch database.
+
+    Args:
+        processes (int): Worker processes (stations / server workers).
+        threads (int): Threads per process, each recording every code once.
+        codes (int): Distinct booklet codes; each is attempted processes * threads times.
+        database (str, optional): SQLite file to use; a temporary file by default.
+        base_config (dict, optional): Config to copy the SQLITE_* and pool settings from.
+
+    Returns:
+        dict: Attempt/outcome counts, timings and 'passed' plus a list of 'problems'.
+    """
+    from app import create_app, db
+    from app.models import Exam, Student, Venue, ScanRecord
+
+    base_config = {key: value for key, value in (base_config or {}).items()
+                   if key.startswith('SQLITE_') or key == 'SQLALCHEMY_ENGINE_OPTIONS'}
+    temp_dir = None
+    if database is None:
+        temp_dir = tempfile.mkdtemp(prefix='booklet-stress-')
+        database = os.path.join(temp_dir, 'stress.db')
+    database_uri = 'sqlite:///' + os.path.abspath(database)
+
+    app = create_app(_stress_config(database_uri, base_config))
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        venue = Venue(name='Stress Hall')
+        db.session.add(venue)
+        db.session.flush()
+        db.session.add(Exam(id=STRESS_EXAM_ID, name='Stress Exam', course='STRESS', venue_id=venue.id,
+                            date=datetime.date.today(), start_time=datetime.time(9), end_time=datetime.time(12)))
+        db.session.add_all([Student(name=f'Stress Student {n}', student_id=f'STRESS{n:04d}', course='STRESS')
+                            for n in range(STRESS_STUDENTS)])
+        db.session.commit()
+        db.engine.dispose()  # don't hand open connections to the worker processes
+
+    booklet_codes = [f'STRESS{n:06d}' for n in range(codes)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(_stress_worker, database_uri, base_config, booklet_codes, threads, seed)
+                   for seed in range(processes)]
+        results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    outcomes, locked, errors = {}, 0, []
+    for worker_outcomes, worker_locked, worker_errors in results:
+        for outcome, recorded_codes in worker_outcomes.items():
+            outcomes.setdefault(outcome, []).extend(recorded_codes)
+        locked += worker_locked
+        errors.extend(worker_errors)
+
+    with app.app_context():
+        rows = ScanRecord.query.count()
+        duplicate_rows = db.session.query(ScanRecord.booklet_code)\
+            .group_by(ScanRecord.exam_id, ScanRecord.booklet_code)\
+            .having(db.func.count(ScanRecord.id) > 1).count()
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+        db.engine.dispose()
+
+    recorded = outcomes.get('recorded', [])
+    attempts = sum(len(v) for v in outcomes.values())
+    problems = []
+    if duplicate_rows:
+        problems.append(f'{duplicate_rows} booklet codes stored more than once')
+    if rows != codes:
+        problems.append(f'{rows} scan records stored, expected {codes}')
+    if len(recorded) != codes or len(set(recorded)) != codes:
+        problems.append(f'{len(recorded)} attempts reported as recorded ({len(set(recorded))} distinct), expected {codes}')
+    if locked:
+        problems.append(f'{locked} "database is locked" errors')
+    other = {k: len(v) for k, v in outcomes.items() if k not in ('recorded', 'duplicate')}
+    if other:
+        problems.append(f'unexpected outcomes: {other}')
+
+    if temp_dir is not None:
+        for name in os.listdir(temp_dir):
+            os.remove(os.path.join(temp_dir, name))
+        os.rmdir(temp_dir)
+
+    return {
+        'processes': processes, 'threads': threads, 'codes': codes,
+        'attempts': attempts, 'outcomes': {k: len(v) for k, v in outcomes.items()},
+        'rows': rows, 'duplicate_rows': duplicate_rows, 'locked_errors': locked,
+        'journal_mode': journal_mode, 'seconds': round(elapsed, 2),
+        'attempts_per_second': round(attempts / elapsed, 1) if elapsed else None,
+        'errors': errors[:5], 'problems': problems, 'passed': not problems,
+    }
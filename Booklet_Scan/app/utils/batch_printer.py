@@ -0,0 +1,172 @@
+import datetime
+import json
+import os
+import threading
+import time
+from app.utils.booklet_generator import generate_booklet_batch
+from app.utils.printer_utils import print_pdf
+
+# Batch printing: many booklets, one print job.
+#
+# print_pdf forks one `lp` process per booklet and CUPS rasterises every job separately, so
+# when a whole venue is pre-printed the per-job overhead dominates. A BatchPrinter collects
+# booklets and renders them as pages of a single PDF, which is submitted once when the
+# batch is full or when the oldest queued booklet has waited flush_interval seconds.
+#
+# Next to every batch PDF a manifest (<batch>.json) records which barcode is on which page,
+# so a jammed or misprinted page can be matched back to its booklet.
+
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_FLUSH_INTERVAL = 5.0  # seconds
+
+
+class BatchPrinter:
+    """
+    Collects booklets and prints them in multi-page jobs. Thread safe; call close() when done
+    so the last partial batch is printed.
+
+    Args:
+        output_folder (str): Where batch PDFs and their manifests are written.
+        printer_name (str, optional): Printer queue, None for the system default.
+        batch_size (int): Booklets per print job.
+        flush_interval (float): Seconds a partial batch may wait before it is printed anyway.
+                                0 disables the timer (batches are only printed when full or on flush()).
+        command_name (str, optional): lp-compatible command, e.g. a fake `lp` for testing.
+    """
+
+    def __init__(self, output_folder, printer_name=None, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, command_name=None):
+        self.output_folder = output_folder
+        self.printer_name = printer_name
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.command_name = command_name
+        self.batches = []  # manifest dict of every batch submitted, in order
+
+        self._lock = threading.Lock()
+        self._print_lock = threading.Lock()  # one job at a time, keeps batches in order
+        self._pending = []  # (barcode_value, student_name, exam_name) waiting for the next batch
+        self._oldest = None  # monotonic time the first pending booklet was added
+        self._closed = False
+        self._wakeup = threading.Event()
+        self._stats = {'jobs': 0, 'pages': 0, 'failed_jobs': 0, 'failed_pages': 0,
+                       'render_seconds': 0.0, 'print_seconds': 0.0, 'started': None}
+
+        self._timer = None
+        if flush_interval and flush_interval > 0:
+            self._timer = threading.Thread(target=self._flush_timer, name='batch-printer', daemon=True)
+            self._timer.start()
+
+    def add(self, barcode_value, student_name="N/A", exam_name="N/A"):
+        """Queues one booklet; prints the batch straight away if it is now full."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchPrinter is closed.")
+            if self._stats['started'] is None:
+                self._stats['started'] = time.monotonic()
+            if not self._pending:
+                self._oldest = time.monotonic()
+                self._wakeup.set()
+            self._pending.append((barcode_value, student_name, exam_name))
+            batch = self._take_batch() if len(self._pending) >= self.batch_size else None
+        if batch:
+            self._print_batch(batch)
+
+    def flush(self):
+        """Prints whatever is pending now. Returns the batch manifest, or None if nothing was pending."""
+        with self._lock:
+            batch = self._take_batch()
+        return self._print_batch(batch) if batch else None
+
+    def close(self):
+        """Prints the last partial batch and stops the flush timer."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.set()
+        self.flush()
+        if self._timer is not None:
+            self._timer.join()
+
+    def page_map(self):
+        """Returns {barcode: (pdf_path, page_number, printed)} over every batch submitted so far."""
+        with self._lock:
+            return {barcode: (batch['pdf_path'], page, batch['printed'])
+                    for batch in self.batches for page, barcode in batch['pages'].items()}
+
+    def get_stats(self):
+        """Returns job/page counters with jobs/s and pages/s over the wall-clock time since the first add()."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        started = stats.pop('started')
+        elapsed = time.monotonic() - started if started is not None else 0.0
+        stats['elapsed_seconds'] = round(elapsed, 3)
+        stats['jobs_per_second'] = round(stats['jobs'] / elapsed, 2) if elapsed else None
+        stats['pages_per_second'] = round(stats['pages'] / elapsed, 2) if elapsed else None
+        stats['render_seconds'] = round(stats['render_seconds'], 3)
+        stats['print_seconds'] = round(stats['print_seconds'], 3)
+        return stats
+
+    def _take_batch(self):
+        # Caller holds self._lock
+        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        self._oldest = time.monotonic() if self._pending else None
+        return batch
+
+    def _flush_timer(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                oldest = self._oldest
+            if oldest is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            remaining = oldest + self.flush_interval - time.monotonic()
+            if remaining > 0:
+                self._wakeup.wait(remaining)
+                self._wakeup.clear()
+                continue
+            self.flush()
+
+    def _print_batch(self, batch):
+        with self._print_lock:
+            batch_id = f"batch_{datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+            pdf_path = os.path.join(self.output_folder, f"{batch_id}.pdf")
+
+            render_started = time.monotonic()
+            pages = generate_booklet_batch(batch, pdf_path)
+            print_started = time.monotonic()
+            printed = bool(pages) and print_pdf(pdf_path, printer_name=self.printer_name,
+                                                command_name=self.command_name)
+            finished = time.monotonic()
+
+            manifest = {
+                'batch_id': batch_id,
+                'pdf_path': os.path.abspath(pdf_path),
+                # Page numbers are 1-based, as printed by CUPS; JSON keys are strings.
+                'pages': {number: booklet[0] for number, booklet in enumerate(batch, start=1)},
+                'printed': printed,
+                'submitted_at': datetime.datetime.utcnow().isoformat(),
+            }
+            if pages:
+                try:
+                    with open(os.path.join(self.output_folder, f"{batch_id}.json"), 'w') as f:
+                        json.dump(manifest, f, indent=2)
+                except OSError as e:
+                    print(f"Error writing batch manifest for {batch_id}: {e}")
+            else:
+                print(f"Error: batch {batch_id} could not be rendered, {len(batch)} booklets not printed.")
+
+            with self._lock:
+                self.batches.append(manifest)
+                self._stats['render_seconds'] += print_started - render_started
+                self._stats['print_seconds'] += finished - print_started
+                if printed:
+                    self._stats['jobs'] += 1
+                    self._stats['pages'] += len(batch)
+                else:
+                    self._stats['failed_jobs'] += 1
+                    self._stats['failed_pages'] += len(batch)
+            return manifest
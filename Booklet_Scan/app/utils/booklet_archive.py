@@ -0,0 +1,82 @@
+import os
+import queue
+import threading
+
+# Asynchronous archive of booklet PDFs rendered in memory (BOOKLET_ZERO_DISK mode).
+#
+# When BOOKLET_ARCHIVE is on, the scan path hands the PDF bytes to archive() and carries on
+# printing; a single background thread writes them out, so SD-card write latency never
+# delays a student at the door. The queue is bounded: if the card falls that far behind,
+# further PDFs are dropped (and counted) rather than held in memory - the booklet code is
+# in the ScanRecord either way.
+
+ARCHIVE_QUEUE_SIZE = 500
+
+_lock = threading.Lock()
+_queue = queue.Queue(maxsize=ARCHIVE_QUEUE_SIZE)
+_worker = None
+_stats = {'queued': 0, 'written': 0, 'dropped': 0, 'failed': 0}
+
+
+def _run():
+    while True:
+        item = _queue.get()
+        if item is None:
+            _queue.task_done()
+            return
+        file_path, pdf_data = item
+        try:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as f:
+                f.write(pdf_data)
+            with _lock:
+                _stats['written'] += 1
+        except OSError as e:
+            print(f"Error archiving booklet PDF '{file_path}': {e}")
+            with _lock:
+                _stats['failed'] += 1
+        finally:
+            _queue.task_done()
+
+
+def archive(file_path, pdf_data):
+    """
+    Queues a PDF to be written to file_path in the background.
+
+    Returns:
+        bool: False if the archive queue is full and the PDF was dropped.
+    """
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name='booklet-archive', daemon=True)
+            _worker.start()
+    try:
+        _queue.put_nowait((file_path, pdf_data))
+    except queue.Full:
+        print(f"Warning: booklet archive queue full, '{os.path.basename(file_path)}' not archived.")
+        with _lock:
+            _stats['dropped'] += 1
+        return False
+    with _lock:
+        _stats['queued'] += 1
+    return True
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+    stats['backlog'] = _queue.qsize()
+    return stats
+
+
+def shutdown(wait=True):
+    """Stops the writer thread; with wait=True the PDFs still queued are written first."""
+    global _worker
+    with _lock:
+        worker, _worker = _worker, None
+    if worker is None or not worker.is_alive():
+        return
+    _queue.put(None)
+    if wait:
+        worker.join()
@@ -1,8 +1,13 @@
 from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfdoc
 from reportlab.lib.pagesizes import A4
 from reportlab.graphics.barcode import code128
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from string import ascii_lowercase, ascii_uppercase
+import io
 import os
 import datetime
+import time
 
 # Default configuration (can be overridden by function arguments)
 DEFAULT_BARCODE_PREFIX = "BK"
@@ -13,6 +18,35 @@ BARCODE_WIDTH_POINTS = 113.4  # approx 4 cm at 72 DPI
 BARCODE_HEIGHT_POINTS = 30    # approx 1.05 cm at 72 DPI
 BARCODE_X_POS = 150
 BARCODE_Y_POS = 700 # Positioned higher on the page
+BARCODE_BAR_WIDTH = 0.8 # points, see draw_booklet_page
+
+# Name of the form XObject holding the static part of the page (see stamp_booklet_page)
+STATIC_FORM_NAME = "BookletStatic"
+
+class BookletCanvas(canvas.Canvas):
+    """
+    Canvas for booklets. Booklets go straight to the printer, so page and form streams are kept
+    as binary zlib data instead of being ASCII85-wrapped as well; that encoder is pure Python and
+    was the largest single cost of saving a booklet. The setting belongs to this canvas only:
+    ReportLab's global rl_config.useA85 is left alone, so other PDFs (and canvases being saved by
+    other threads) are not affected.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        add_page, add_form = self._doc.addPage, self._doc.addForm
+        self._doc.addPage = lambda page: add_page(_binary_stream(page, "page stream"))
+        self._doc.addForm = lambda name, form: add_form(name, _binary_stream(form, "xobject form stream"))
+
+def _binary_stream(page_or_form, comment):
+    # Builds the content stream ReportLab would build on save, but with the filters chosen here;
+    # a page or form that already has its Contents (and compression off) keeps them as they are
+    if page_or_form.compression and page_or_form.stream:
+        stream = pdfdoc.PDFStream(content=page_or_form.stream, filters=[pdfdoc.PDFZCompress])
+        stream.__Comment__ = comment
+        page_or_form.Contents = stream
+        page_or_form.compression = 0
+    return page_or_form
 
 def generate_single_booklet(
     unique_id: str,
@@ -39,55 +73,12 @@ def generate_single_booklet(
     os.makedirs(output_folder, exist_ok=True)
 
     barcode_value = f"{barcode_prefix}{unique_id}"
-
-    # Sanitize unique_id for use in filename (replace non-alphanumeric)
-    safe_filename_id = "".join(c if c.isalnum() else "_" for c in unique_id)
-    pdf_filename = f"Booklet_{barcode_prefix}_{safe_filename_id}.pdf"
+    pdf_filename = booklet_filename(unique_id, barcode_prefix)
     pdf_file_path = os.path.join(output_folder, pdf_filename)
 
     try:
-        # Create barcode object
-        # Adjust barWidth dynamically: ReportLab's barWidth is per bar, not total width.
-        # A common approach is to estimate based on desired total width and number of characters.
-        # For Code128, the number of bars varies. Let's use a fixed reasonable barWidth.
-        # If barcode_width_pts is the total desired width, barWidth might be barcode_width_pts / (len(barcode_value) * N_MODULES_PER_CHAR_APPROX)
-        # For simplicity, we'll use a fixed bar width that generally looks good.
-        # You might need to fine-tune this if barcodes are too wide/narrow.
-        estimated_bar_width = 0.8 # points
-        barcode = code128.Code128(
-            barcode_value,
-            barHeight=BARCODE_HEIGHT_POINTS,
-            barWidth=estimated_bar_width
-        )
-
-        # Create PDF
-        c = canvas.Canvas(pdf_file_path, pagesize=A4)
-        page_width, page_height = A4
-
-        # Add Title and Info
-        c.setFont("Helvetica-Bold", 18)
-        c.drawCentredString(page_width / 2, page_height - 70, "Exam Booklet")
-
-        c.setFont("Helvetica", 12)
-        c.drawString(BARCODE_X_POS, BARCODE_Y_POS + BARCODE_HEIGHT_POINTS + 25, f"Student: {student_name}")
-        c.drawString(BARCODE_X_POS, BARCODE_Y_POS + BARCODE_HEIGHT_POINTS + 10, f"Exam: {exam_name}")
-
-        # Draw Barcode at specified position
-        # barcode.drawOn might require x, y for bottom-left corner of the barcode graphics area
-        barcode.drawOn(c, BARCODE_X_POS, BARCODE_Y_POS)
-
-        # Draw barcode value as text below barcode for human readability
-        c.setFont("Helvetica", 10)
-        # Calculate center for text under barcode based on its actual drawn width
-        # barcode.width gives the calculated width of the barcode graphic
-        text_x_pos = BARCODE_X_POS + barcode.width / 2
-        c.drawCentredString(text_x_pos, BARCODE_Y_POS - 15, barcode_value)
-
-        # Add a footer with generation date
-        generation_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        c.setFont("Helvetica-Oblique", 8)
-        c.drawCentredString(page_width / 2, 30, f"Generated: {generation_time}")
-
+        c = BookletCanvas(pdf_file_path, pagesize=A4)
+        stamp_booklet_page(c, barcode_value, student_name, exam_name)
         c.save()
         return pdf_file_path, barcode_value
 
@@ -95,6 +86,218 @@ def generate_single_booklet(
         print(f"Error generating booklet PDF '{pdf_filename}': {e}")
         return None, None
 
+def booklet_filename(unique_id: str, barcode_prefix: str = DEFAULT_BARCODE_PREFIX) -> str:
+    """Returns the PDF filename used for a booklet, e.g. Booklet_BK_S1E2T2025....pdf."""
+    # Sanitize unique_id for use in filename (replace non-alphanumeric)
+    safe_filename_id = "".join(c if c.isalnum() else "_" for c in unique_id)
+    return f"Booklet_{barcode_prefix}_{safe_filename_id}.pdf"
+
+def render_single_booklet(
+    unique_id: str,
+    barcode_prefix: str = DEFAULT_BARCODE_PREFIX,
+    student_name: str = "N/A",
+    exam_name: str = "N/A"
+) -> tuple[bytes | None, str | None]:
+    """
+    Like generate_single_booklet, but renders the PDF into memory instead of writing a file.
+
+    Returns:
+        tuple[bytes | None, str | None]: A tuple containing (pdf_data, barcode_value).
+                                         Returns (None, None) if generation fails.
+    """
+    barcode_value = f"{barcode_prefix}{unique_id}"
+    try:
+        buffer = io.BytesIO()
+        c = BookletCanvas(buffer, pagesize=A4)
+        stamp_booklet_page(c, barcode_value, student_name, exam_name)
+        c.save()
+        return buffer.getvalue(), barcode_value
+    except Exception as e:
+        print(f"Error rendering booklet PDF for '{barcode_value}': {e}")
+        return None, None
+
+def generate_booklet_batch(
+    booklets,
+    pdf_file_path: str
+) -> list[str] | None:
+    """
+    Renders several booklets into one multi-page PDF, one booklet per page, so they can be
+    sent to the printer as a single job.
+
+    Args:
+        booklets (iterable): (barcode_value, student_name, exam_name) tuples, in page order.
+        pdf_file_path (str): Path of the PDF to write.
+
+    Returns:
+        list[str] | None: The barcode printed on each page (index 0 is page 1),
+                          or None if generation fails.
+    """
+    os.makedirs(os.path.dirname(pdf_file_path) or '.', exist_ok=True)
+    pages = []
+    try:
+        c = BookletCanvas(pdf_file_path, pagesize=A4)
+        for barcode_value, student_name, exam_name in booklets:
+            stamp_booklet_page(c, barcode_value, student_name, exam_name)
+            c.showPage()
+            pages.append(barcode_value)
+        c.save()
+        return pages
+    except Exception as e:
+        print(f"Error generating booklet batch PDF '{pdf_file_path}': {e}")
+        return None
+
+def draw_booklet_page(c, barcode_value: str, student_name: str = "N/A", exam_name: str = "N/A"):
+    """
+    Draws one booklet (title, student/exam details, barcode and footer) on the current page
+    of a ReportLab canvas, everything from scratch.
+
+    This is the reference layout; the generators use the faster stamp_booklet_page, which
+    must produce the same page. benchmark_booklets compares the two.
+    """
+    # Create barcode object
+    # Adjust barWidth dynamically: ReportLab's barWidth is per bar, not total width.
+    # A common approach is to estimate based on desired total width and number of characters.
+    # For Code128, the number of bars varies. Let's use a fixed reasonable barWidth.
+    # If barcode_width_pts is the total desired width, barWidth might be barcode_width_pts / (len(barcode_value) * N_MODULES_PER_CHAR_APPROX)
+    # For simplicity, we'll use a fixed bar width that generally looks good.
+    # You might need to fine-tune this if barcodes are too wide/narrow.
+    estimated_bar_width = BARCODE_BAR_WIDTH
+    barcode = code128.Code128(
+        barcode_value,
+        barHeight=BARCODE_HEIGHT_POINTS,
+        barWidth=estimated_bar_width
+    )
+
+    page_width, page_height = A4
+
+    # Add Title and Info
+    c.setFont("Helvetica-Bold", 18)
+    c.drawCentredString(page_width / 2, page_height - 70, "Exam Booklet")
+
+    c.setFont("Helvetica", 12)
+    c.drawString(BARCODE_X_POS, BARCODE_Y_POS + BARCODE_HEIGHT_POINTS + 25, f"Student: {student_name}")
+    c.drawString(BARCODE_X_POS, BARCODE_Y_POS + BARCODE_HEIGHT_POINTS + 10, f"Exam: {exam_name}")
+
+    # Draw Barcode at specified position
+    # barcode.drawOn might require x, y for bottom-left corner of the barcode graphics area
+    barcode.drawOn(c, BARCODE_X_POS, BARCODE_Y_POS)
+
+    # Draw barcode value as text below barcode for human readability
+    c.setFont("Helvetica", 10)
+    # Calculate center for text under barcode based on its actual drawn width
+    # barcode.width gives the calculated width of the barcode graphic
+    text_x_pos = BARCODE_X_POS + barcode.width / 2
+    c.drawCentredString(text_x_pos, BARCODE_Y_POS - 15, barcode_value)
+
+    # Add a footer with generation date
+    generation_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawCentredString(page_width / 2, 30, f"Generated: {generation_time}")
+
+def _define_static_form(c):
+    """
+    Records the parts of the page that are identical on every booklet (title, field labels)
+    as a form XObject. It is written once per PDF and referenced by every page, so a batch
+    PDF carries the static content once instead of once per booklet.
+    """
+    page_width, page_height = A4
+    c.beginForm(STATIC_FORM_NAME)
+    c.setFont("Helvetica-Bold", 18)
+    c.drawCentredString(page_width / 2, page_height - 70, "Exam Booklet")
+    c.setFont("Helvetica", 12)
+    c.drawString(BARCODE_X_POS, _STUDENT_Y, "Student:")
+    c.drawString(BARCODE_X_POS, _EXAM_Y, "Exam:")
+    c.endForm()
+
+# Precomputed positions of the variable fields, so they line up with the labels in the form
+_STUDENT_Y = BARCODE_Y_POS + BARCODE_HEIGHT_POINTS + 25
+_EXAM_Y = BARCODE_Y_POS + BARCODE_HEIGHT_POINTS + 10
+_STUDENT_VALUE_X = BARCODE_X_POS + stringWidth("Student: ", "Helvetica", 12)
+_EXAM_VALUE_X = BARCODE_X_POS + stringWidth("Exam: ", "Helvetica", 12)
+
+def _barcode_bars(barcode_value: str):
+    """
+    Returns (pdf_operators, total_width) for the Code128 bars of a value, drawn at
+    (BARCODE_X_POS, BARCODE_Y_POS) as a single filled path.
+
+    Code128.drawOn issues one canvas.rect call per bar, and formatting those numbers dominates
+    the per-booklet cost; here the bar geometry comes from the barcode's decomposed pattern and
+    is written straight into the page stream.
+    """
+    barcode = code128.Code128(barcode_value, barHeight=BARCODE_HEIGHT_POINTS, barWidth=BARCODE_BAR_WIDTH)
+    width = barcode.width  # computes the encoding (barcode.decomposed) on first access
+    # Lower case letters are spaces, upper case letters bars; the letter gives the width in modules
+    oa, oA = ord('a') - 1, ord('A') - 1
+    left = BARCODE_X_POS + (barcode.lquiet if barcode.quiet else 0)
+    ops = []
+    for ch in barcode.decomposed:
+        if ch in ascii_lowercase:
+            left += (ord(ch) - oa) * BARCODE_BAR_WIDTH
+        elif ch in ascii_uppercase:
+            w = (ord(ch) - oA) * BARCODE_BAR_WIDTH
+            ops.append("%.2f %d %.2f %d re" % (left, BARCODE_Y_POS, w, BARCODE_HEIGHT_POINTS))
+            left += w
+    ops.append("f")
+    return " ".join(ops), width
+
+def stamp_booklet_page(c, barcode_value: str, student_name: str = "N/A", exam_name: str = "N/A"):
+    """
+    Draws one booklet on the current page from the cached template: the static form XObject
+    (defined on first use in each PDF) plus only the variable fields, barcode bars and footer.
+    Produces the same page as draw_booklet_page.
+    """
+    if not c.hasForm(STATIC_FORM_NAME):
+        _define_static_form(c)
+    c.doForm(STATIC_FORM_NAME)
+
+    c.setFont("Helvetica", 12)
+    c.drawString(_STUDENT_VALUE_X, _STUDENT_Y, student_name)
+    c.drawString(_EXAM_VALUE_X, _EXAM_Y, exam_name)
+
+    bars, barcode_width = _barcode_bars(barcode_value)
+    c.addLiteral(bars)
+
+    c.setFont("Helvetica", 10)
+    c.drawCentredString(BARCODE_X_POS + barcode_width / 2, BARCODE_Y_POS - 15, barcode_value)
+
+    generation_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawCentredString(A4[0] / 2, 30, f"Generated: {generation_time}")
+
+def benchmark_booklets(count: int = 200) -> dict:
+    """
+    Micro-benchmark of booklet rendering: booklets per second with the original drawing
+    (draw_booklet_page, ASCII85 streams) and with the cached template (stamp_booklet_page), one PDF per
+    booklet, plus the template in a single multi-page batch PDF. PDFs are rendered to memory
+    so disk speed does not skew the numbers.
+
+    Returns:
+        dict: 'count', booklets/s for 'reference', 'template' and 'template_batch', and 'speedup'.
+    """
+    def run(draw, per_booklet_pdf=True, canvas_class=BookletCanvas):
+        started = time.perf_counter()
+        c = None
+        for i in range(count):
+            if per_booklet_pdf or c is None:
+                c = canvas_class(io.BytesIO(), pagesize=A4)
+            draw(c, f"{DEFAULT_BARCODE_PREFIX}S{i}E1T20250101120000000000", "Benchmark Student", "Benchmark Exam")
+            if per_booklet_pdf:
+                c.save()
+            else:
+                c.showPage()
+        if not per_booklet_pdf:
+            c.save()
+        return count / (time.perf_counter() - started)
+
+    run(stamp_booklet_page, True)  # warm-up: font metrics, module caches
+    # The reference run reproduces the original path: a plain canvas, ASCII85 stream encoding
+    # included (ReportLab's default), without touching any global setting
+    reference = run(draw_booklet_page, canvas_class=canvas.Canvas)
+    template = run(stamp_booklet_page)
+    batch = run(stamp_booklet_page, per_booklet_pdf=False)
+    return {'count': count, 'reference': round(reference, 1), 'template': round(template, 1),
+            'template_batch': round(batch, 1), 'speedup': round(template / reference, 2)}
+
 if __name__ == '__main__':
     print("Generating sample booklets using the refactored function...")
 
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, update
+from app import db
+from app.models import CacheVersion, Course, Exam, Venue
+
+# Cached choice lists for the select fields: exams (with their venue), venues and courses.
+#
+# The scan page builds its exam dropdown for every student who walks in, and the admin forms
+# build theirs on every GET and POST; these lists only change when an admin edits an exam,
+# venue or course. Each process keeps the rows of each list, together with the version they
+# were loaded at. The admin create/edit/delete routes call invalidate(), which bumps the
+# list's row in cache_version in the same transaction as the change. Before a cached list
+# is used, the versions are read again - one small query for all lists, at most every
+# CHOICES_CHECK_INTERVAL seconds - so a change made through another server process is picked
+# up within that interval. This process's own changes drop the list as soon as they commit.
+
+ExamChoice = namedtuple('ExamChoice', ['id', 'name', 'course', 'date', 'venue_name'])
+
+EXAMS = 'exams'
+VENUES = 'venues'
+COURSES = 'courses'
+# Lists that show another list's rows: exam labels include the venue name
+DEPENDENTS = {VENUES: (EXAMS,)}
+
+_lock = threading.Lock()
+_listening = False
+_INVALIDATED = 'choices_invalidated'  # session.info key for the lists changed by the open transaction
+_stats = {'hits': 0, 'loads': 0, 'version_checks': 0}
+
+
+def _load_exams():
+    return [ExamChoice(*row) for row in db.session.execute(
+        select(Exam.id, Exam.name, Exam.course, Exam.date, Venue.name)
+        .join(Venue, Exam.venue_id == Venue.id).order_by(Exam.date.desc(), Exam.name))]
+
+
+def _load_venues():
+    return [tuple(row) for row in db.session.execute(select(Venue.id, Venue.name).order_by(Venue.name))]
+
+
+def _load_courses():
+    return list(db.session.execute(select(Course.name).order_by(Course.name)).scalars())
+
+
+LOADERS = {EXAMS: _load_exams, VENUES: _load_venues, COURSES: _load_courses}
+
+
+def init_app(app):
+    """Sets up the choices cache for app and hooks the session events that drop changed lists."""
+    global _listening
+    # lists: name -> (version, rows); versions: the stamps read at `checked` (monotonic)
+    app.extensions['choices_cache'] = {'lists': {}, 'versions': {}, 'checked': None}
+    with _lock:
+        if not _listening:
+            event.listen(db.session, 'after_commit', _after_commit)
+            event.listen(db.session, 'after_rollback', _after_rollback)
+            _listening = True
+
+
+def _after_commit(session):
+    names = session.info.pop(_INVALIDATED, None)
+    if not names or not has_app_context():
+        return
+    cache = current_app.extensions.get('choices_cache')
+    if cache is None:
+        return
+    with _lock:
+        for name in names:
+            cache['lists'].pop(name, None)
+        cache['checked'] = None  # the stamps read before this commit are out of date
+
+
+def _after_rollback(session):
+    session.info.pop(_INVALIDATED, None)
+
+
+def _read_versions():
+    _stats['version_checks'] += 1
+    return dict(db.session.execute(select(CacheVersion.name, CacheVersion.version)).all())
+
+
+def get(name):
+    """
+    Returns the rows of a choice list (EXAMS, VENUES or COURSES), loading them only when the
+    list changed since they were cached. Must be called inside an application context.
+    """
+    cache = current_app.extensions.get('choices_cache')
+    if cache is None:
+        return LOADERS[name]()
+    interval = current_app.config.get('CHOICES_CHECK_INTERVAL', 2)
+    with _lock:
+        fresh = cache['checked'] is not None and time.monotonic() - cache['checked'] < interval
+        entry = cache['lists'].get(name)
+        if fresh and entry is not None:
+            _stats['hits'] += 1
+            return entry[1]
+        versions = cache['versions']
+
+    if not fresh:
+        # The versions are read before the rows: a change committed in between makes the rows
+        # newer than their version, and they are simply loaded again after the next check
+        versions = _read_versions()
+        with _lock:
+            cache['versions'] = versions
+            cache['checked'] = time.monotonic()
+            # Drop every list another process has changed, not only this one
+            for other, (version, _) in list(cache['lists'].items()):
+                if versions.get(other, 0) != version:
+                    del cache['lists'][other]
+            entry = cache['lists'].get(name)
+            if entry is not None:
+                _stats['hits'] += 1
+                return entry[1]
+    rows = LOADERS[name]()
+    with _lock:
+        cache['lists'][name] = (versions.get(name, 0), rows)
+        _stats['loads'] += 1
+    return rows
+
+
+def exams():
+    """ExamChoice rows (id, name, course, date, venue_name), newest exam first."""
+    return get(EXAMS)
+
+
+def venues():
+    """(id, name) of every venue, by name."""
+    return get(VENUES)
+
+
+def courses():
+    """Course names, sorted."""
+    return get(COURSES)
+
+
+def invalidate(*names):
+    """
+    Marks choice lists as changed by the current transaction: their version stamps are bumped in
+    it (so other processes reload them once it commits) and this process drops them on commit.
+    Call it from the route making the change, before committing.
+    """
+    from app.utils import db_utils
+
+    changed = set()
+    for name in names:
+        changed.add(name)
+        changed.update(DEPENDENTS.get(name, ()))
+    db_utils.insert_ignore(CacheVersion, [{'name': name, 'version': 0} for name in sorted(changed)])
+    db.session.execute(update(CacheVersion).where(CacheVersion.name.in_(changed))
+                       .values(version=CacheVersion.version + 1))
+    db.session.info.setdefault(_INVALIDATED, set()).update(changed)
+
+
+def get_stats():
+    """Cache hits, list loads and version checks of this process, and the cached versions."""
+    stats = dict(_stats)
+    cache = current_app.extensions.get('choices_cache', {'lists': {}})
+    with _lock:
+        stats['cached'] = {name: {'version': version, 'rows': len(rows)}
+                           for name, (version, rows) in cache['lists'].items()}
+    return stats
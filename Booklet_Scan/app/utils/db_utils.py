@@ -0,0 +1,137 @@
+from sqlalchemy import event, insert
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.utils import row_counts
+
+# Database helpers for the multi-station deployment: SQLite connection pragmas and
+# race-free "insert unless it already exists" statements.
+
+
+def init_app(app):
+    """
+    Applies the SQLITE_* pragmas from the config to every new SQLite connection:
+    WAL journal (readers never block the writer), a busy timeout (writers wait for the lock
+    instead of failing with "database is locked") and the synchronous level.
+    Does nothing for other databases.
+    """
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+    journal_mode = app.config.get('SQLITE_JOURNAL_MODE')
+    busy_timeout = app.config.get('SQLITE_BUSY_TIMEOUT')
+    synchronous = app.config.get('SQLITE_SYNCHRONOUS')
+
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if busy_timeout is not None:
+            cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+        if journal_mode:
+            cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        if synchronous:
+            cursor.execute(f"PRAGMA synchronous = {synchronous}")
+        cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_sqlite_pragmas)
+
+
+def create_missing_indexes():
+    """
+    Creates the indexes declared on the models that an existing database does not have yet.
+    db.create_all() only creates missing tables, so indexes added to a model later (e.g. the
+    sort keys of the admin lists) would otherwise never reach a database made before them.
+    Must be called inside an application context.
+
+    Returns:
+        list: Names of the indexes created.
+    """
+    created = []
+    with db.engine.begin() as connection:
+        existing_tables = set(db.inspect(connection).get_table_names())
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {index['name'] for index in db.inspect(connection).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(connection)
+                    created.append(index.name)
+    return created
+
+
+def insert_ignore_statement(model):
+    """
+    Returns an INSERT for model that skips rows clashing with a unique constraint
+    (INSERT ... ON CONFLICT DO NOTHING / INSERT IGNORE), or None if the database
+    dialect has no such statement.
+    """
+    # Built on the Table rather than the mapped class so it runs as a plain Core statement and
+    # reports rowcount (column defaults such as ScanRecord.timestamp still apply)
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing()
+    if dialect in ('mysql', 'mariadb'):
+        return insert(table).prefix_with('IGNORE')
+    return None
+
+
+def insert_ignore(model, rows):
+    """
+    Inserts rows (a list of column -> value dicts) into model's table in the current
+    transaction, skipping any row that violates a unique constraint. The caller commits.
+
+    The duplicate check is done by the database in the same statement as the insert, so two
+    stations inserting the same row at the same time cannot both succeed.
+
+    Returns:
+        int: Number of rows actually inserted.
+    """
+    if not rows:
+        return 0
+    statement = insert_ignore_statement(model)
+    if statement is not None:
+        inserted = db.session.execute(statement, rows).rowcount
+        row_counts.track(model, inserted)
+        return inserted
+
+    # Other databases: one savepoint per row, a clash only rolls back that row
+    inserted = 0
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(model.__table__), [row])
+            inserted += 1
+        except IntegrityError:
+            pass
+    row_counts.track(model, inserted)
+    return inserted
+
+
+def insert_ignore_from_select(model, columns, select_statement):
+    """
+    Set-based INSERT INTO model (columns) SELECT ..., skipping rows that violate a unique
+    constraint (INSERT OR IGNORE / ON CONFLICT DO NOTHING / INSERT IGNORE). One statement,
+    however many rows the select produces. The caller commits.
+
+    Returns:
+        int: Number of rows actually inserted.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        statement = insert(table).prefix_with('OR IGNORE').from_select(columns, select_statement)
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table).from_select(columns, select_statement).on_conflict_do_nothing()
+    elif dialect in ('mysql', 'mariadb'):
+        statement = insert(table).prefix_with('IGNORE').from_select(columns, select_statement)
+    else:
+        rows = [dict(zip(columns, row)) for row in db.session.execute(select_statement)]
+        return insert_ignore(model, rows)
+    inserted = db.session.execute(statement).rowcount
+    row_counts.track(model, inserted)
+    return inserted
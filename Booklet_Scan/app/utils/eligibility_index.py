@@ -0,0 +1,189 @@
+import threading
+from collections import namedtuple
+from flask import current_app, has_app_context
+from sqlalchemy import event, select, text
+from app import db
+from app.models import CacheVersion, Student, StudentExamAssignment
+
+# In-memory eligibility index for the exam currently in authentication mode.
+#
+# The database stays the source of truth: the index is loaded when an exam moves to
+# Exam.STATUS_AUTH_ACTIVE (admin.set_exam_status) and patched by the admin routes that
+# add/delete assignments, edit/delete students and edit the exam. A lookup that is not in the index
+# (index not loaded, another exam, unknown or not eligible student) is a miss and the
+# caller falls back to the database.
+#
+# The index lives in the process that serves the scan station. With several worker
+# processes (serve.py, ELIGIBILITY_VERSION_CHECK) each one holds its own copy and only patches
+# it for the admin changes it served itself. So on SQLite, triggers bump the 'eligibility'
+# row of cache_version in the same transaction as any change to assignments, students or
+# exams (including an exam leaving authentication mode), whichever process or path makes it.
+# Each lookup then reads that stamp - one primary-key query - and drops the index if it
+# changed since the index was loaded; the next scan of the exam loads it again. On other
+# databases there are no triggers and the index is not used when the check is on.
+
+VERSION_NAME = 'eligibility'
+
+TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS eligibility_version_{table}_{operation.lower()} AFTER {operation} ON {table}
+    BEGIN
+        INSERT OR IGNORE INTO cache_version (name, version) VALUES ('{VERSION_NAME}', 0);
+        UPDATE cache_version SET version = version + 1 WHERE name = '{VERSION_NAME}';
+    END"""
+    for table, operations in (('student_exam_assignment', ('INSERT', 'UPDATE', 'DELETE')),
+                              ('student', ('UPDATE', 'DELETE')),
+                              ('exam', ('UPDATE', 'DELETE')))
+    for operation in operations
+]
+
+IndexedExam = namedtuple('IndexedExam', ['id', 'name'])
+IndexedStudent = namedtuple('IndexedStudent', ['id', 'student_id', 'name'])
+
+_lock = threading.Lock()
+_exam = None       # IndexedExam of the indexed exam, None when nothing is loaded
+_students = {}     # scanned student identifier (Student.student_id) -> IndexedStudent
+_version = None    # the 'eligibility' stamp the index was loaded at
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0, 'loads': 0, 'stale': 0}
+
+
+@event.listens_for(db.metadata, 'after_create')
+def _after_create(metadata, connection, **kw):
+    # db.create_all(): add the version triggers (also to an existing database)
+    if connection.dialect.name == 'sqlite':
+        for trigger in TRIGGERS:
+            connection.execute(text(trigger))
+
+
+def _checks_version():
+    return has_app_context() and current_app.config.get('ELIGIBILITY_VERSION_CHECK', False)
+
+
+def _read_version():
+    # None when the stamp isn't maintained (no triggers): the index can't be trusted then
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return None
+    return db.session.execute(select(CacheVersion.version)
+                              .where(CacheVersion.name == VERSION_NAME)).scalar() or 0
+
+
+def load(exam):
+    """
+    (Re)builds the index for an exam with a single joined query over its assignments.
+
+    Args:
+        exam (Exam): The exam entering authentication mode.
+
+    Returns:
+        int: Number of eligible students indexed.
+    """
+    global _exam, _students, _version
+    # Read before the rows: a change committed in between makes the stamp differ on the next lookup
+    checking = _checks_version()
+    version = _read_version() if checking else None
+    if checking and version is None:
+        return 0  # can't be kept current on this database; every lookup goes to the database
+    rows = db.session.query(Student.id, Student.student_id, Student.name)\
+        .join(StudentExamAssignment, StudentExamAssignment.student_id == Student.id)\
+        .filter(StudentExamAssignment.exam_id == exam.id)\
+        .all()
+    students = {row.student_id: IndexedStudent(row.id, row.student_id, row.name) for row in rows}
+    with _lock:
+        _exam = IndexedExam(exam.id, exam.name)
+        _students = students
+        _version = version
+        _stats['loads'] += 1
+    return len(students)
+
+
+def clear():
+    """Drops the index, e.g. when authentication for the indexed exam stops."""
+    global _exam, _students
+    with _lock:
+        _exam = None
+        _students = {}
+        _stats['invalidations'] += 1
+
+
+def is_loaded_for(exam_id):
+    return _exam is not None and _exam.id == exam_id
+
+
+def lookup(exam_id, student_identifier):
+    """
+    Hot-path eligibility check: a single dictionary hit, no database access - except for the
+    version stamp read when ELIGIBILITY_VERSION_CHECK is on.
+
+    Returns:
+        tuple | None: (IndexedExam, IndexedStudent) when the student is known to be eligible
+                      for exam_id, otherwise None (the caller must check the database).
+    """
+    global _exam, _students
+    if _exam is not None and _exam.id == exam_id and _checks_version():
+        version = _read_version()
+        with _lock:
+            if _exam is not None and (version is None or version != _version):
+                # Changed through another process (or not trackable): drop it, the caller reloads it
+                _exam = None
+                _students = {}
+                _stats['stale'] += 1
+                _stats['invalidations'] += 1
+    with _lock:
+        if _exam is not None and _exam.id == exam_id:
+            student = _students.get(student_identifier)
+            if student is not None:
+                _stats['hits'] += 1
+                return _exam, student
+        _stats['misses'] += 1
+        return None
+
+
+def add_assignment(exam_id, student):
+    """Adds a newly assigned student if the assignment is for the indexed exam."""
+    with _lock:
+        if _exam is not None and _exam.id == exam_id:
+            _students[student.student_id] = IndexedStudent(student.id, student.student_id, student.name)
+            _stats['invalidations'] += 1
+
+
+def remove_assignment(exam_id, student):
+    """Removes a student whose assignment to the indexed exam was deleted."""
+    with _lock:
+        if _exam is not None and _exam.id == exam_id and _students.pop(student.student_id, None) is not None:
+            _stats['invalidations'] += 1
+
+
+def update_exam(exam):
+    """Renames the indexed exam after an edit. Other exams are ignored."""
+    global _exam
+    with _lock:
+        if _exam is not None and _exam.id == exam.id and _exam.name != exam.name:
+            _exam = IndexedExam(exam.id, exam.name)
+            _stats['invalidations'] += 1
+
+
+def update_student(old_student_identifier, student):
+    """Re-keys/renames an indexed student after an edit. Students not in the index are ignored."""
+    with _lock:
+        if _students.pop(old_student_identifier, None) is not None:
+            _students[student.student_id] = IndexedStudent(student.id, student.student_id, student.name)
+            _stats['invalidations'] += 1
+
+
+def remove_student(student_identifier):
+    """Removes a deleted student from the index."""
+    with _lock:
+        if _students.pop(student_identifier, None) is not None:
+            _stats['invalidations'] += 1
+
+
+def get_stats():
+    """Returns the hit/miss/invalidation counters and what is currently indexed."""
+    with _lock:
+        stats = dict(_stats)
+        stats['exam_id'] = _exam.id if _exam else None
+        stats['exam_name'] = _exam.name if _exam else None
+        stats['size'] = len(_students)
+        stats['version'] = _version
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
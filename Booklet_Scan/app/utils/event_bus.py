@@ -0,0 +1,95 @@
+import queue
+import threading
+
+# Minimal in-process publish/subscribe bus (used by the live exam dashboard).
+#
+# Each subscriber gets its own bounded queue; publish() hands the same message object to every
+# subscriber of a topic without blocking. A subscriber that stops reading (a stalled browser)
+# loses its oldest messages rather than holding up the publisher - the messages published
+# here are complete snapshots, so only the newest one matters anyway.
+#
+# Note: only subscribers in this process see the messages; with several server processes
+# each one has its own bus. The live dashboard relays the scans themselves to every worker
+# (app/main/live_dashboard.py), and each worker publishes on its own bus.
+
+DEFAULT_QUEUE_SIZE = 20
+
+_lock = threading.Lock()
+_subscribers = {}  # topic -> set of Subscription
+_stats = {'published': 0, 'delivered': 0, 'dropped': 0}
+
+
+class Subscription:
+    """A subscriber's queue of messages for one topic. Close it when done."""
+
+    def __init__(self, topic, maxsize):
+        self.topic = topic
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def get(self, timeout=None):
+        """Next message, or None if none arrived within timeout seconds."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        unsubscribe(self)
+
+
+def subscribe(topic, maxsize=DEFAULT_QUEUE_SIZE):
+    subscription = Subscription(topic, maxsize)
+    with _lock:
+        _subscribers.setdefault(topic, set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription):
+    with _lock:
+        subscribers = _subscribers.get(subscription.topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del _subscribers[subscription.topic]
+
+
+def has_subscribers(topic):
+    with _lock:
+        return bool(_subscribers.get(topic))
+
+
+def publish(topic, message):
+    """
+    Delivers message to every current subscriber of topic without blocking.
+
+    Returns:
+        int: Number of subscribers it was delivered to.
+    """
+    with _lock:
+        subscribers = list(_subscribers.get(topic, ()))
+        _stats['published'] += 1
+    dropped = 0
+    for subscription in subscribers:
+        while True:
+            try:
+                subscription.queue.put_nowait(message)
+                break
+            except queue.Full:
+                # Make room by discarding the subscriber's oldest message
+                try:
+                    subscription.queue.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    pass
+    with _lock:
+        _stats['delivered'] += len(subscribers)
+        _stats['dropped'] += dropped
+    return len(subscribers)
+
+
+def get_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['topics'] = len(_subscribers)
+        stats['subscribers'] = sum(len(s) for s in _subscribers.values())
+    return stats
@@ -0,0 +1,272 @@
+import functools
+import os
+import threading
+import time
+from multiprocessing.connection import AuthenticationError, Client, Listener
+
+# Hardware owner: one process drives the LCD and the printer for the whole server.
+#
+# With several server worker processes (serve.py --workers N) every worker would otherwise
+# bring up the I2C LCD and run its own LCD owner thread, and two processes writing to the I2C
+# bus at once garble the display. Instead one designated process - the hardware owner started
+# by app/server.py - keeps the only LCD owner thread and runs the print commands. The workers
+# reach it over a local socket (multiprocessing.connection, with a per-launch authentication
+# key), and every function marked @owned() runs there instead of in the worker. The booklet
+# print jobs run there too (app/main/print_jobs.py), so any worker can answer for any job.
+#
+# Functions marked @broadcast update state that every worker keeps for itself (the live
+# dashboard figures): a call made in any process is relayed by the owner to every connected
+# worker, and each one runs it. The workers keep a second connection open for these.
+#
+# In a single-process server, the development server and the CLI nothing is connected and
+# the marked functions run locally as before.
+
+CONNECT_TIMEOUT = 5.0  # seconds a worker keeps trying to reach the owner (it may still be starting)
+
+_calls = {}      # 'module.function' -> the undecorated function, run by the owner
+_client = None   # HardwareClient in a worker process, None everywhere else
+_owner = None    # HardwareOwner in the hardware owner process, None everywhere else
+_SUBSCRIBE = 'hardware.subscribe'  # first message of a worker's broadcast connection
+_RELAY = 'hardware.relay'          # call asking the owner to broadcast a call
+
+
+def owned(default=None):
+    """
+    Marks a function that touches the LCD or the printer. In a worker process connected with
+    connect() the call is run by the hardware owner and its result sent back; if the owner
+    cannot be reached the call is skipped and `default` returned.
+    """
+    def decorator(function):
+        name = f'{function.__module__}.{function.__name__}'
+        _calls[name] = function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            client = _client
+            if client is None:
+                return function(*args, **kwargs)
+            return client.call(name, args, kwargs, default)
+        return wrapper
+    return decorator
+
+
+def broadcast(function):
+    """
+    Marks a function that updates per-process state. In a worker process connected with
+    connect(), or in the owner, the call is sent to every connected worker and run there
+    (including the calling worker) and None is returned; elsewhere it runs locally.
+    Arguments must be picklable.
+    """
+    name = f'{function.__module__}.{function.__name__}'
+    _calls[name] = function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        client, owner = _client, _owner
+        if client is not None:
+            client.call(_RELAY, (name, args, kwargs), {})
+        elif owner is not None:
+            owner.broadcast(name, args, kwargs)
+        else:
+            function(*args, **kwargs)
+    return wrapper
+
+
+def _relay(name, args, kwargs):
+    # Runs in the owner for a worker's @broadcast call
+    if _owner is not None:
+        _owner.broadcast(name, args, kwargs)
+
+
+_calls[_RELAY] = _relay
+
+
+def connect(address, authkey):
+    """
+    Sends the calls of @owned() functions made in this process to the owner at address, and
+    runs the @broadcast calls the owner relays.
+    """
+    global _client
+    _client = HardwareClient(address, authkey)
+    _client.subscribe()
+
+
+def disconnect():
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+def is_connected():
+    return _client is not None
+
+
+def is_owner():
+    """True in the hardware owner process of a multi-worker server."""
+    return _owner is not None
+
+
+class HardwareClient:
+    """Worker side of the channel: a small pool of connections to the owner, shared by the worker's threads."""
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self._idle = []  # connections not in use by a thread
+        self._lock = threading.Lock()
+        self._subscription = None  # connection the owner sends @broadcast calls on
+        self._closed = False
+
+    def _connect(self):
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while True:
+            try:
+                return Client(self.address, family='AF_UNIX', authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+
+    def call(self, name, args, kwargs, default=None):
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        try:
+            if connection is None:
+                connection = self._connect()
+            connection.send((name, args, kwargs))
+            ok, result = connection.recv()
+        except (OSError, EOFError, AuthenticationError) as e:
+            # Not retried: the owner may have run the call (e.g. printed) before the connection broke
+            print(f"Hardware owner unreachable, {name} skipped: {e}")
+            if connection is not None:
+                connection.close()
+            return default
+        with self._lock:
+            self._idle.append(connection)
+        if not ok:
+            print(f"Hardware owner: {name} failed: {result}")
+            return default
+        return result
+
+    def subscribe(self):
+        """Starts the thread that receives and runs the @broadcast calls relayed by the owner."""
+        threading.Thread(target=self._receive_broadcasts, name='hardware-broadcasts', daemon=True).start()
+
+    def _receive_broadcasts(self):
+        while not self._closed:
+            try:
+                connection = self._connect()
+                connection.send((_SUBSCRIBE, (), {}))
+            except (OSError, EOFError, AuthenticationError) as e:
+                print(f"Hardware owner unreachable, broadcasts paused: {e}")
+                time.sleep(1)
+                continue
+            self._subscription = connection
+            try:
+                while True:
+                    name, args, kwargs = connection.recv()
+                    try:
+                        _calls[name](*args, **kwargs)
+                    except Exception as e:
+                        print(f"Broadcast {name} failed: {e}")
+            except (OSError, EOFError):
+                pass  # owner restarted (reconnect) or close() was called
+            connection.close()
+            if not self._closed:
+                time.sleep(1)  # a broadcast sent while reconnecting is missed
+
+    def close(self):
+        self._closed = True
+        if self._subscription is not None:
+            self._subscription.close()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class HardwareOwner:
+    """
+    Owner side of the channel: accepts the workers' connections and runs their calls, one
+    thread per connection. serve_forever() blocks; stop it by raising an exception in the
+    calling thread (app/server.py does so from its SIGTERM handler).
+    """
+
+    def __init__(self, address, authkey):
+        global _owner
+        if os.path.exists(address):
+            os.unlink(address)  # left behind by an owner that crashed
+        self.listener = Listener(address, family='AF_UNIX', authkey=authkey)
+        self.active = 0  # calls running or not yet answered
+        self._idle = threading.Condition()
+        self._subscribers = []  # the workers' broadcast connections
+        self._subscribers_lock = threading.Lock()
+        _owner = self
+
+    def broadcast(self, name, args, kwargs):
+        """Sends a @broadcast call to every subscribed worker; a worker that has gone is dropped."""
+        with self._subscribers_lock:
+            for connection in list(self._subscribers):
+                try:
+                    connection.send((name, args, kwargs))
+                except OSError:
+                    self._subscribers.remove(connection)
+                    connection.close()
+
+    def serve_forever(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError) as e:
+                print(f"Hardware owner: rejected a connection: {e}")
+                continue
+            threading.Thread(target=self._serve_connection, args=(connection,),
+                             name='hardware-connection', daemon=True).start()
+
+    def _serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    name, args, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return  # the worker closed the connection or exited
+                if name == _SUBSCRIBE:
+                    # From now on the owner only sends on this connection; broadcast() closes it
+                    with self._subscribers_lock:
+                        self._subscribers.append(connection)
+                    return self._wait_for_subscriber(connection)
+                with self._idle:
+                    self.active += 1
+                try:
+                    function = _calls.get(name)
+                    if function is None:
+                        reply = (False, f'unknown call {name}')
+                    else:
+                        reply = (True, function(*args, **kwargs))
+                except Exception as e:
+                    reply = (False, repr(e))
+                try:
+                    connection.send(reply)
+                except OSError:
+                    return
+                finally:
+                    with self._idle:
+                        self.active -= 1
+                        self._idle.notify_all()
+
+    def _wait_for_subscriber(self, connection):
+        # The worker never sends on its broadcast connection: recv() returns when it closes it
+        try:
+            connection.recv()
+        except (EOFError, OSError):
+            pass
+        with self._subscribers_lock:
+            if connection in self._subscribers:
+                self._subscribers.remove(connection)
+
+    def close(self, timeout=10.0):
+        """Stops accepting connections and waits up to timeout seconds for the calls in progress."""
+        self.listener.close()
+        with self._idle:
+            return self._idle.wait_for(lambda: self.active == 0, timeout)
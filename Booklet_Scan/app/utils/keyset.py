@@ -0,0 +1,166 @@
+import base64
+import datetime
+import json
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.sql import operators
+
+# Keyset ("seek") pagination for the admin list pages.
+#
+# .paginate() pages with OFFSET, so page N makes the database walk and throw away N * per_page
+# rows, and it runs a COUNT(*) on every view. Here a page is instead fetched with
+# "WHERE sort key is past the last row shown ... ORDER BY sort key LIMIT per_page + 1", which
+# an index on the sort key answers in the same time on page 1 and page 10,000. The position is
+# carried in the URL as an opaque cursor (?after=... / ?before=...), and the total shown under
+# the list comes from the cached counts in row_counts rather than a COUNT(*).
+#
+# The last sort key must be unique (normally the primary key) so that rows with equal names
+# or dates are neither skipped nor repeated between pages.
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated query. Offers the attributes the list templates use from
+    Flask-SQLAlchemy's Pagination (items, total, pages, has_prev, has_next), plus the cursors
+    for the neighbouring pages.
+    """
+
+    def __init__(self, items, per_page, total, has_prev, has_next, prev_cursor, next_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.total = total
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+
+    @property
+    def pages(self):
+        # Only used to decide whether to show the page links at all
+        if self.total is None:
+            return 2 if (self.has_prev or self.has_next) else 1
+        return max(1, -(-self.total // self.per_page))
+
+
+def _sort_keys(order_by):
+    # [(column expression, descending), ...] from e.g. [Exam.date.desc(), Exam.id.desc()]
+    keys = []
+    for clause in order_by:
+        modifier = getattr(clause, 'modifier', None)
+        if modifier in (operators.desc_op, operators.asc_op):
+            keys.append((clause.element, modifier is operators.desc_op))
+        else:
+            keys.append((clause, False))
+    return keys
+
+
+def encode_cursor(values):
+    """Packs the sort key values of a row into a URL-safe cursor string."""
+    values = [v.isoformat() if isinstance(v, (datetime.date, datetime.time)) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, keys):
+    """
+    Unpacks a cursor made by encode_cursor() for the given sort keys.
+
+    Raises:
+        ValueError: If the cursor is malformed or does not match the sort keys.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid page cursor: {e}")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError("Invalid page cursor.")
+    decoded = []
+    for value, (column, _) in zip(values, keys):
+        try:
+            python_type = column.type.python_type
+        except NotImplementedError:
+            python_type = None
+        if value is not None and python_type in (datetime.datetime, datetime.date, datetime.time):
+            value = python_type.fromisoformat(value)
+        decoded.append(value)
+    return decoded
+
+
+def _seek_condition(keys, values, forward):
+    # Rows strictly after (forward) or before the row with the given key values, in list order
+    def past(column, descending, value):
+        return column < value if descending != (not forward) else column > value
+
+    descending = {d for _, d in keys}
+    if len(descending) == 1:
+        # Same direction on every key: a row-value comparison, which SQLite (3.15+) and
+        # PostgreSQL answer with a single index range scan
+        columns = tuple_(*[c for c, _ in keys])
+        return past(columns, descending.pop(), tuple_(*values))
+
+    # Mixed directions: (k1 past v1) OR (k1 = v1 AND k2 past v2) OR ...
+    terms = []
+    for i, (column, desc) in enumerate(keys):
+        equal = [c == v for (c, _), v in zip(keys[:i], values[:i])]
+        terms.append(and_(*equal, past(column, desc, values[i])))
+    # The redundant bound on the first key lets the database use its index to find the start
+    first_column, first_desc = keys[0]
+    bound = first_column <= values[0] if first_desc == forward else first_column >= values[0]
+    return and_(bound, or_(*terms))
+
+
+def paginate(query, order_by, per_page=10, after=None, before=None, total=None):
+    """
+    Fetches one page of query, ordered by order_by, starting after (or ending before) a cursor.
+
+    Args:
+        query: A legacy Model.query / db.session.query, without ORDER BY, LIMIT or OFFSET.
+        order_by (list): Sort clauses, e.g. [Student.name, Student.id]; .desc() is allowed per
+                         clause. The last one must be unique.
+        per_page (int): Rows per page.
+        after (str, optional): next_cursor of the previous page - fetch the page after it.
+        before (str, optional): prev_cursor of the next page - fetch the page before it.
+        total (int, optional): Total row count to show (see row_counts.count).
+
+    Returns:
+        KeysetPage: The page. A malformed cursor gives the first page.
+    """
+    keys = _sort_keys(order_by)
+    # The sort key values are selected alongside each row so the cursors can be built from them
+    key_labels = [f'_keyset_{i}' for i in range(len(keys))]
+    single_entity = len(query.column_descriptions) == 1
+    paged = query.add_columns(*[column.label(label) for (column, _), label in zip(keys, key_labels)])
+
+    forward, cursor = True, after
+    if before and not after:
+        forward, cursor = False, before
+    values = None
+    if cursor:
+        try:
+            values = decode_cursor(cursor, keys)
+        except ValueError:
+            forward, values = True, None
+    if values is not None:
+        paged = paged.filter(_seek_condition(keys, values, forward))
+
+    if forward:
+        ordering = [column.desc() if desc else column.asc() for column, desc in keys]
+    else:
+        ordering = [column.asc() if desc else column.desc() for column, desc in keys]
+    rows = paged.order_by(*ordering).limit(per_page + 1).all()
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    if forward:
+        has_prev, has_next = values is not None, more
+    else:
+        has_prev, has_next = more, True
+
+    def cursor_of(row):
+        return encode_cursor([getattr(row, label) for label in key_labels])
+
+    items = [row[0] if single_entity else row for row in rows]
+    return KeysetPage(items, per_page, total, has_prev, has_next,
+                      cursor_of(rows[0]) if rows and has_prev else None,
+                      cursor_of(rows[-1]) if rows and has_next else None)
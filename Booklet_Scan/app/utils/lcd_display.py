@@ -1,238 +1,513 @@
+import heapq
+import itertools
+import queue
+import threading
 import time
-from .network_utils import get_ip_address  # Import for fetching IP
-
-I2C_HARDWARE_AVAILABLE = False
+from collections import deque
+from . import network_utils  # Cached IP address, refreshed on network changes
+from . import perf
+from .hardware import owned  # Run by the hardware owner process under a multi-worker server
+
+# All LCD output goes through one owner thread fed by a priority queue, so HTTP handlers
+# never block on I2C writes or sleeps: display_message() and friends only enqueue.
+#
+# - Messages have a duration: the owner keeps a message on screen for that long before
+#   showing the next queued message of the same or lower priority.
+# - Messages carry a coalescing key: a newer message with the same key replaces a pending
+#   one (and the one on screen), so a burst of scans never builds up a backlog of stale text.
+# - Warnings and errors (display_alert) have a key of their own and high priority: they show
+#   at once, and the status messages of the next scans wait until they have been up for their
+#   duration instead of replacing them.
+# - When no message has been shown for IDLE_TIMEOUT seconds the idle screen comes back
+#   (IP address, or the scrolling exam instructions while authentication is active).
+#   The address comes from the cache of network_utils' address monitor; when it changes
+#   the idle screen is redrawn.
+# - Output goes to an I2C backend (RPLCD) when available, otherwise to a console backend
+#   that can also be installed explicitly with set_backend() for tests and benchmarks.
+# - Under a multi-worker server (serve.py) only the hardware owner process has an owner
+#   thread; the public functions marked @owned() are forwarded to it (app/utils/hardware.py).
+
+# The I2C libraries are imported by the first init_lcd() (see _load_i2c_libraries), not when
+# this module is imported: server start-up, the CLI and the tests don't pay for them or print
+# anything. None = not tried yet; set it to False to keep the console backend on a Pi.
+I2C_HARDWARE_AVAILABLE = None
 CharLCD = None
 SMBus = None
 
-try:
-    from RPLCD.i2c import CharLCD
-    from smbus2 import SMBus
-    I2C_HARDWARE_AVAILABLE = True
-    print("I2C libraries loaded successfully.")
-except ImportError:
-    print("Warning: I2C libraries (RPLCD or smbus2) not found. LCD will be disabled.")
-    pass
-
 DEFAULT_I2C_ADDRESS = 0x27
 DEFAULT_I2C_BUS = 1
 LCD_COLS = 16
 LCD_ROWS = 2
 
-lcd = None
-lcd_active = False
+# Message priorities (lower value wins)
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+DEFAULT_MESSAGE_DURATION = 2  # seconds a message stays up when no duration is given
+IDLE_TIMEOUT = 5              # seconds after the last message expired before the idle screen returns
+DEFAULT_MESSAGE_KEY = 'status'
+ALERT_MESSAGE_KEY = 'alert'   # warnings and errors (display_alert)
+ALERT_DURATION = 3            # seconds a warning or error stays up at least
+HARDWARE_RETRY_INTERVAL = 30  # seconds between attempts to bring up the I2C LCD after a failure
+
+
+class ConsoleBackend:
+    """
+    Stand-in for the LCD that prints frames to the console and keeps the recent ones in memory.
+
+    Args:
+        echo (bool): Print each frame to stdout.
+        write_latency (float): Seconds to sleep per write, to simulate a slow I2C bus.
+        history (int): Number of frames kept in self.frames.
+    """
+    animates = False  # Scrolling text is printed once instead of frame by frame
+    is_hardware = False
+
+    def __init__(self, echo=True, write_latency=0.0, history=100):
+        self.echo = echo
+        self.write_latency = write_latency
+        self.frames = deque(maxlen=history)
+
+    def write(self, line1, line2):
+        if self.write_latency:
+            time.sleep(self.write_latency)
+        self.frames.append((line1, line2))
+        if self.echo:
+            print(f"Console LCD: L1: {line1}, L2: {line2}")
+
+    def clear(self):
+        self.write("", "")
+
+    def close(self):
+        pass
+
+
+class I2CBackend:
+    """Character LCD on a PCF8574 I2C backpack, driven through RPLCD."""
+    animates = True
+    is_hardware = True
+
+    def __init__(self, i2c_address=DEFAULT_I2C_ADDRESS, i2c_bus=DEFAULT_I2C_BUS, cols=LCD_COLS, rows=LCD_ROWS):
+        self.cols = cols
+        self.lcd = CharLCD(i2c_expander='PCF8574',
+                           address=i2c_address,
+                           port=i2c_bus,
+                           cols=cols,
+                           rows=rows,
+                           dotsize=8,
+                           charmap='A02',
+                           auto_linebreaks=True,
+                           backlight_enabled=True)
+        self.lcd.clear()
+
+    def write(self, line1, line2):
+        # Overwrite both full lines instead of clear() + write to avoid flicker
+        self.lcd.cursor_pos = (0, 0)
+        self.lcd.write_string(line1[:self.cols].ljust(self.cols))
+        self.lcd.cursor_pos = (1, 0)
+        self.lcd.write_string(line2[:self.cols].ljust(self.cols))
+
+    def clear(self):
+        self.lcd.clear()
+
+    def close(self):
+        self.lcd.close(clear=False)
+
+
+class _Message:
+    __slots__ = ('priority', 'seq', 'key', 'line1', 'line2', 'duration')
+
+    def __init__(self, priority, seq, key, line1, line2, duration):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.line1 = line1
+        self.line2 = line2
+        self.duration = duration
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+# Idle screen kinds
+IDLE_IP = 'ip'
+IDLE_TEXT = 'text'
+IDLE_SCROLL = 'scroll'
+
+_seq = itertools.count()
+_commands = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+_backend = None
+_last_hardware_attempt = 0.0
+_stats_lock = threading.Lock()
+_stats = {
+    'enqueued': 0, 'displayed': 0, 'coalesced': 0, 'writes': 0, 'write_errors': 0,
+    'write_latency_total': 0.0, 'write_latency_max': 0.0, 'write_latency_last': 0.0,
+    'pending': 0,
+}
+
 current_display_mode = "default"
-scroll_thread = None
-stop_scroll_event = None
 
 
+class _LcdWorker(threading.Thread):
+    """The single owner of the LCD. Only this thread touches the backend."""
+
+    def __init__(self):
+        super().__init__(name='lcd-owner', daemon=True)
+        self.pending = []          # heap of _Message waiting to be shown
+        self.current = None        # _Message on screen, None when the idle screen is shown
+        self.current_until = 0.0   # when the current message's duration ends
+        self.idle = (IDLE_IP, "", "", 0.3)  # (kind, line1, line2, scroll_delay)
+        self.idle_shown = False
+        self.scroll_pos = 0
+        self.next_scroll_at = 0.0
+        self.running = True
+
+    # --- queue handling ---
+    def _accept(self, command):
+        kind = command[0]
+        if kind == 'message':
+            message = command[1]
+            # Coalesce: a newer message replaces pending ones with the same key
+            before = len(self.pending)
+            self.pending = [m for m in self.pending if m.key != message.key]
+            if len(self.pending) != before:
+                heapq.heapify(self.pending)
+                _bump('coalesced', before - len(self.pending))
+            heapq.heappush(self.pending, message)
+        elif kind == 'idle':
+            self.idle = command[1]
+            self.scroll_pos = 0
+            if command[2] or self.idle_shown:  # show now, or refresh the idle screen already up
+                self.current = None
+                self.idle_shown = False
+                self._show_idle()
+        elif kind == 'address':
+            if self.idle_shown and self.idle[0] == IDLE_IP:  # redraw only an IP screen that is up
+                self._show_idle()
+        elif kind == 'clear':
+            self.pending = []
+            self.current = None
+            self.idle_shown = True  # Stay blank until the next message or idle change
+            self.idle = (IDLE_TEXT, "", "", 0.3)
+            self._write("", "")
+        elif kind == 'stop':
+            self.running = False
+
+    def _can_show_next(self, now):
+        if not self.pending:
+            return False
+        if self.current is None or now >= self.current_until:
+            return True
+        nxt = self.pending[0]
+        # A newer message for the same key, or a more urgent one, preempts the current message
+        return nxt.key == self.current.key or nxt.priority < self.current.priority
+
+    def _timeout(self, now):
+        if self._can_show_next(now) or (self.current is None and not self.idle_shown):
+            return 0
+        deadlines = []
+        if self.current is not None:
+            if now < self.current_until:
+                deadlines.append(self.current_until)
+            else:
+                deadlines.append(self.current_until + IDLE_TIMEOUT)
+        elif self.idle_shown and self.idle[0] == IDLE_SCROLL and _backend.animates:
+            deadlines.append(self.next_scroll_at)
+        if not deadlines:
+            return None
+        return max(0, min(deadlines) - now)
+
+    def run(self):
+        while self.running:
+            try:
+                command = _commands.get(timeout=self._timeout(time.monotonic()))
+                self._accept(command)
+                while True:  # Drain whatever else is queued so coalescing sees all of it
+                    self._accept(_commands.get_nowait())
+            except queue.Empty:
+                pass
+            with _stats_lock:
+                _stats['pending'] = len(self.pending)
+            if not self.running:
+                break
+
+            now = time.monotonic()
+            if self._can_show_next(now):
+                message = heapq.heappop(self.pending)
+                self.current = message
+                self.current_until = now + message.duration
+                self.idle_shown = False
+                _bump('displayed')
+                self._write(message.line1, message.line2)
+            elif self.current is not None and now >= self.current_until + IDLE_TIMEOUT:
+                self.current = None
+                self._show_idle()
+            elif self.current is None and not self.idle_shown:
+                self._show_idle()
+            elif self.idle_shown and self.idle[0] == IDLE_SCROLL and _backend.animates and now >= self.next_scroll_at:
+                self._scroll_frame()
+
+    # --- drawing ---
+    def _show_idle(self):
+        global current_display_mode
+        kind, line1, line2, _ = self.idle
+        self.idle_shown = True
+        if kind == IDLE_IP:
+            ip = network_utils.get_cached_ip_address()  # Probed by the monitor, not per redraw
+            self._write("IP Address:", ip)
+            current_display_mode = "ip"
+        elif kind == IDLE_SCROLL:
+            current_display_mode = "scrolling_message"
+            self.scroll_pos = 0
+            if _backend.animates:
+                self._scroll_frame()
+            else:
+                self._write(line1, line2)
+        else:
+            current_display_mode = "default"
+            self._write(line1, line2)
+
+    def _scroll_frame(self):
+        _, line1, line2, delay = self.idle
+        self._write(_scroll_window(line1, self.scroll_pos), _scroll_window(line2, self.scroll_pos))
+        self.scroll_pos += 1
+        self.next_scroll_at = time.monotonic() + delay
+
+    def _write(self, line1, line2):
+        started = time.perf_counter()
+        with perf.span('lcd_write'):
+            try:
+                _backend.write(line1, line2)
+            except Exception as e:
+                print(f"Error writing to LCD: {e}")
+                _bump('write_errors')
+                _fall_back_to_console()
+                _backend.write(line1, line2)
+        elapsed = time.perf_counter() - started
+        with _stats_lock:
+            _stats['writes'] += 1
+            _stats['write_latency_total'] += elapsed
+            _stats['write_latency_last'] = elapsed
+            _stats['write_latency_max'] = max(_stats['write_latency_max'], elapsed)
+
+
+def _scroll_window(text, pos):
+    """Returns the LCD_COLS wide window of a scrolling line; short lines do not scroll."""
+    if len(text) <= LCD_COLS:
+        return text
+    padded = " " * LCD_COLS + text + " " * LCD_COLS
+    start = pos % (len(padded) - LCD_COLS + 1)
+    return padded[start:start + LCD_COLS]
+
+
+def _bump(counter, amount=1):
+    with _stats_lock:
+        _stats[counter] += amount
+
+
+def _fall_back_to_console():
+    global _backend
+    if _backend is not None:
+        try:
+            _backend.close()
+        except Exception:
+            pass
+    _backend = ConsoleBackend()
+
+
+def _load_i2c_libraries():
+    """Imports RPLCD and smbus2 once. Returns I2C_HARDWARE_AVAILABLE."""
+    global I2C_HARDWARE_AVAILABLE, CharLCD, SMBus
+    if I2C_HARDWARE_AVAILABLE is None:
+        try:
+            from RPLCD.i2c import CharLCD
+            from smbus2 import SMBus
+            I2C_HARDWARE_AVAILABLE = True
+            print("I2C libraries loaded successfully.")
+        except ImportError:
+            I2C_HARDWARE_AVAILABLE = False
+            print("Warning: I2C libraries (RPLCD or smbus2) not found. LCD will be disabled.")
+    return I2C_HARDWARE_AVAILABLE
+
+
+def _on_address_change(address):
+    # Called on the address monitor's thread; the owner thread does the redraw
+    if _worker is not None and _worker.is_alive():
+        _commands.put(('address',))
+
+
+network_utils.add_listener(_on_address_change)
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            if _backend is None:
+                _fall_back_to_console()
+            _worker = _LcdWorker()
+            _worker.start()
+
+
+def _enqueue(command):
+    _ensure_worker()
+    _commands.put(command)
+
+
+@owned(default=False)
 def is_lcd_active():
-    return lcd_active
+    """True when the physical I2C LCD is driving the display (not the console fallback)."""
+    return _backend is not None and _backend.is_hardware
+
+
+def set_backend(backend):
+    """
+    Replaces the display backend, e.g. with ConsoleBackend(echo=False, write_latency=0.005)
+    in tests and load benchmarks. Takes effect for the next write.
+    """
+    global _backend
+    _backend = backend
+    _ensure_worker()
 
 
+@owned(default=False)
 def init_lcd(i2c_address=DEFAULT_I2C_ADDRESS, i2c_bus=DEFAULT_I2C_BUS, cols=LCD_COLS, rows=LCD_ROWS):
-    global lcd, lcd_active
+    """
+    Starts the LCD owner thread and tries to bring up the I2C LCD. If the hardware is missing
+    the console backend is used and the hardware is retried at most every HARDWARE_RETRY_INTERVAL
+    seconds, so calling this on every request is cheap.
 
-    if lcd_active:
-        print("LCD already initialized.")
+    Returns:
+        bool: True if the I2C LCD is active.
+    """
+    global _backend, _last_hardware_attempt
+
+    if is_lcd_active():
         return True
 
-    if not I2C_HARDWARE_AVAILABLE:
-        print("LCD disabled: I2C libraries not available.")
-        lcd_active = False
-        lcd = None
+    now = time.monotonic()
+    if not _load_i2c_libraries() or (_last_hardware_attempt and now - _last_hardware_attempt < HARDWARE_RETRY_INTERVAL):
+        _ensure_worker()
         return False
+    _last_hardware_attempt = now
 
     try:
-        bus = SMBus(i2c_bus)
-
-        lcd = CharLCD(i2c_expander='PCF8574',
-                      address=i2c_address,
-                      # bus=bus,
-                      cols=cols,
-                      rows=rows,
-                      dotsize=8,
-                      charmap='A02',
-                      auto_linebreaks=True,
-                      backlight_enabled=True)
-
-        lcd.clear()
-        lcd.write_string("Initializing...")
-        lcd_active = True
+        _backend = I2CBackend(i2c_address, i2c_bus, cols, rows)
         print("LCD Initialized Successfully.")
+        _ensure_worker()
+        display_message("Initializing...", duration=1)
         return True
     except Exception as e:
         print(f"Error initializing LCD: {e}")
         print("LCD functionality will be disabled.")
-        lcd = None
-        lcd_active = False
+        _fall_back_to_console()
+        _ensure_worker()
         return False
 
 
+@owned()
 def display_ip_address():
-    global current_display_mode
-    stop_scrolling_message_if_active()
-
-    ip = get_ip_address()
-    if not is_lcd_active():
-        if not init_lcd():
-            print(f"Console LCD: IP: {ip}")
-            print(f"Console LCD: Line 2: System Online")
-            return
-
-    display_message("IP Address:", ip, clear_first=True)
-    current_display_mode = "ip"
-    print(f"LCD: Displaying IP Address - {ip}")
-
-
-def display_message(line1, line2="", clear_first=True, delay_after=None):
-    global lcd, lcd_active
-
-    if not lcd_active:
-        if not init_lcd():
-            print(f"Console LCD: L1: {line1}, L2: {line2}")
-            return
-
-    try:
-        if clear_first:
-            lcd.clear()
-
-        lcd.cursor_pos = (0, 0)
-        lcd.write_string(line1[:LCD_COLS])
-
-        if line2:
-            lcd.cursor_pos = (1, 0)
-            lcd.write_string(line2[:LCD_COLS])
-
-        if delay_after:
-            time.sleep(delay_after)
-
-    except Exception as e:
-        print(f"Error writing to LCD: {e}")
-        print(f"Console LCD: L1: {line1}, L2: {line2}")
-
-
+    """Switches the idle screen to the IP address and shows it now."""
+    _enqueue(('idle', (IDLE_IP, "", "", 0.3), True))
+
+
+@owned()
+def display_message(line1, line2="", clear_first=True, delay_after=None,
+                    priority=PRIORITY_NORMAL, key=DEFAULT_MESSAGE_KEY, duration=None):
+    """
+    Queues a two-line message. Returns immediately.
+
+    Args:
+        line1, line2 (str): Text for each line, truncated to LCD_COLS.
+        clear_first (bool): Kept for compatibility; every frame overwrites both lines.
+        delay_after (float): Old name for duration, kept for existing callers.
+        priority (int): PRIORITY_HIGH preempts normal messages that are still on screen.
+        key (str): Coalescing key; a newer message with the same key replaces this one.
+        duration (float): Seconds the message stays up before the next one may be shown.
+    """
+    if duration is None:
+        duration = delay_after if delay_after is not None else DEFAULT_MESSAGE_DURATION
+    _bump('enqueued')
+    _enqueue(('message', _Message(priority, next(_seq), key, line1[:LCD_COLS], line2[:LCD_COLS], duration)))
+
+
+def display_alert(line1, line2="", duration=ALERT_DURATION):
+    """
+    Queues a warning or error (duplicate booklet, save failed, ...). It preempts the status message
+    on screen and stays up for its whole duration; only a newer alert replaces it sooner.
+    """
+    display_message(line1, line2, duration=duration, priority=PRIORITY_HIGH, key=ALERT_MESSAGE_KEY)
+
+
+@owned()
 def clear_display():
-    global lcd, lcd_active
-    if not lcd_active or lcd is None:
-        print("Console LCD: Cleared")
-        return
-    try:
-        lcd.clear()
-    except Exception as e:
-        print(f"Error clearing LCD: {e}")
-
-
-def _scroll_text(line_number, text, delay):
-    global lcd, lcd_active, stop_scroll_event, LCD_COLS
+    _enqueue(('clear',))
 
-    if not lcd_active or lcd is None:
-        print(f"LCD not active, cannot scroll: {text}")
-        return
 
-    padded_text = " " * LCD_COLS + text + " " * LCD_COLS
+@owned()
+def display_scrolling_message(line1_text, line2_text, scroll_delay=0.3):
+    """Makes the (scrolling) text the idle screen and shows it now. Lines longer than LCD_COLS scroll."""
+    _enqueue(('idle', (IDLE_SCROLL, line1_text, line2_text, scroll_delay), True))
 
-    while not stop_scroll_event.is_set():
-        for i in range(len(padded_text) - LCD_COLS + 1):
-            if stop_scroll_event.is_set():
-                break
-            frame = padded_text[i:i+LCD_COLS]
-            try:
-                lcd.cursor_pos = (line_number, 0)
-                lcd.write_string(frame)
-            except Exception as e:
-                print(f"Error during LCD scroll: {e}")
-                lcd_active = False
-                stop_scroll_event.set()
-                break
-            time.sleep(delay)
 
+@owned()
+def stop_scrolling_message_if_active():
+    """Drops a scrolling idle screen; the next display_ip_address() or message replaces it."""
+    if _worker is not None and _worker.idle[0] == IDLE_SCROLL:
+        _enqueue(('idle', (IDLE_TEXT, "", "", 0.3), False))
 
-def display_scrolling_message(line1_text, line2_text, scroll_delay=0.3):
-    global lcd, lcd_active, scroll_thread, stop_scroll_event, current_display_mode
-    import threading
 
-    stop_scrolling_message_if_active()
+@owned()
+def get_stats():
+    """Queue depth, coalescing and I2C write latency counters of the LCD owner thread."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['queue_depth'] = _commands.qsize() + stats.pop('pending')
+    stats['write_latency_avg'] = stats['write_latency_total'] / stats['writes'] if stats['writes'] else 0.0
+    del stats['write_latency_total']
+    stats['backend'] = type(_backend).__name__ if _backend else None
+    stats['display_mode'] = current_display_mode
+    return stats
 
-    if not lcd_active:
-        if not init_lcd():
-            print(f"Console Scroll L1: {line1_text}")
-            print(f"Console Scroll L2: {line2_text}")
-            return
-
-    lcd.clear()
-    current_display_mode = "scrolling_message"
-    stop_scroll_event = threading.Event()
-
-    if len(line1_text) > LCD_COLS:
-        scroll_thread_l1 = threading.Thread(target=_scroll_text, args=(0, line1_text, scroll_delay), daemon=True)
-        scroll_thread_l1.start()
-        scroll_thread = scroll_thread_l1
-    else:
-        display_message(line1_text, "", clear_first=False)
-
-    if len(line2_text) > LCD_COLS:
-        scroll_thread_l2 = threading.Thread(target=_scroll_text, args=(1, line2_text, scroll_delay), daemon=True)
-        scroll_thread_l2.start()
-        if scroll_thread is None:
-            scroll_thread = scroll_thread_l2
-    else:
-        if line1_text:
-            lcd.cursor_pos = (1, 0)
-            lcd.write_string(line2_text[:LCD_COLS])
-        else:
-            display_message(line2_text, "", clear_first=False)
 
+def shutdown(timeout=2.0):
+    """Stops the owner thread after it has processed what is already queued."""
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        _commands.put(('stop',))
+        _worker.join(timeout)
+    _worker = None
 
-def stop_scrolling_message_if_active():
-    global scroll_thread, stop_scroll_event, current_display_mode
 
-    if stop_scroll_event and not stop_scroll_event.is_set():
-        print("Stopping active scroll...")
-        stop_scroll_event.set()
+if __name__ == '__main__':
+    print("Testing LCD Module...")
+    init_lcd()
 
-    if scroll_thread and scroll_thread.is_alive():
-        scroll_thread.join(timeout=1.0)
-        if scroll_thread.is_alive():
-            print("Warning: Scroll thread did not terminate cleanly.")
+    display_ip_address()
+    time.sleep(2)
 
-    scroll_thread = None
+    print("Testing static message...")
+    display_message("Static Line 1", "Static Line 2", duration=3)
 
-    if current_display_mode == "scrolling_message":
-        current_display_mode = "default"
+    print("Testing coalescing: only the last of these should stay on screen...")
+    for i in range(5):
+        display_message(f"Student {i}", "ELIGIBLE", duration=1)
+    time.sleep(2)
 
+    print("Testing scrolling message...")
+    exam_link = "go.exam/p123"
+    instructions = "Scan ID, then Booklet. Be quick!"
+    display_scrolling_message(f"Link: {exam_link}", instructions, scroll_delay=0.3)
+    time.sleep(5)
 
-if __name__ == '__main__':
-    print("Testing LCD Module...")
+    print("Stopping scroll and displaying IP again...")
+    stop_scrolling_message_if_active()
+    display_ip_address()
+    time.sleep(2)
 
-    if init_lcd():
-        display_ip_address()
-        time.sleep(5)
-
-        print("Testing static message...")
-        display_message("Static Line 1", "Static Line 2", delay_after=3)
-
-        print("Testing scrolling message...")
-        exam_link = "go.exam/p123"
-        instructions = "Scan ID, then Booklet. Be quick!"
-        display_scrolling_message(f"Link: {exam_link}", instructions, scroll_delay=0.3)
-
-        time.sleep(15)
-
-        print("Stopping scroll and displaying IP again...")
-        stop_scrolling_message_if_active()
-        display_ip_address()
-        time.sleep(5)
-
-        clear_display()
-        lcd.write_string("Test Done.")
-        print("Test complete. Check LCD.")
-    else:
-        print("LCD could not be initialized for testing.")
-        display_ip_address()
-        display_message("Test L1", "Test L2 (fallback)")
-        exam_link = "go.exam/p123"
-        instructions = "Scan ID, then Booklet. Be quick!"
-        print(f"Console Scroll L1: Link: {exam_link}")
-        print(f"Console Scroll L2: {instructions}")
-        clear_display()
+    clear_display()
+    shutdown()
+    print(f"Test complete. Stats: {get_stats()}")
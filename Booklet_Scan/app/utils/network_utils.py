@@ -1,6 +1,39 @@
+import select
 import socket
 import subprocess
 import platform
+import threading
+import time
+from .hardware import owned  # Run by the hardware owner process under a multi-worker server
+
+# Address monitor: the LCD shows the station's IP address every time it goes back to its
+# idle screen, and get_ip_address() forks `hostname -I` for it. Instead the address is kept
+# in a cache (get_cached_ip_address) that a background thread refreshes:
+#
+# - on Linux when the kernel reports an address, link or route change (rtnetlink), a moment
+#   after the change so a DHCP lease that comes in several messages is probed only once;
+# - every ADDRESS_TTL seconds anyway, in case a change was missed;
+# - every POLL_INTERVAL seconds where netlink is not available (other systems, containers).
+#
+# Listeners added with add_listener() are called when the address changes (the LCD redraws
+# its idle screen). The monitor starts with the first get_cached_ip_address() call, so only
+# the process that drives the LCD runs it.
+
+ADDRESS_TTL = 300    # seconds before the cached address is probed again without any event
+POLL_INTERVAL = 15   # seconds between probes when netlink is not available
+EVENT_SETTLE = 1.0   # seconds to wait after a network event for the rest of the burst
+
+# rtnetlink multicast groups (linux/rtnetlink.h)
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+
+_lock = threading.Lock()
+_monitor = None    # the monitor thread, started by the first get_cached_ip_address()
+_listeners = []
+_state = {'address': None, 'refreshed_at': None, 'refreshed': None, 'source': None,
+          'refreshes': 0, 'changes': 0, 'events': 0, 'last_probe_ms': None}
 
 def get_ip_address():
     """
@@ -52,8 +85,121 @@ def get_ip_address():
 
     return ip_address
 
+def _open_netlink():
+    """Subscribes to the kernel's address/link/route notifications. Returns the socket, or None."""
+    if not hasattr(socket, 'AF_NETLINK'):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV4_ROUTE | RTMGRP_IPV6_IFADDR))
+        sock.setblocking(False)
+        return sock
+    except OSError as e:
+        print(f"Network change notifications not available ({e}); polling the IP address instead.")
+        return None
+
+
+def _drain(sock):
+    # The content of the messages doesn't matter: any change means "probe again"
+    while True:
+        try:
+            sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            return  # ENOBUFS: the kernel dropped notifications, which still means something changed
+
+
+def _refresh(reason):
+    """Probes the address now and notifies the listeners if it changed. Returns the address."""
+    started = time.perf_counter()
+    address = get_ip_address()
+    probe_ms = round((time.perf_counter() - started) * 1000, 1)
+    with _lock:
+        changed = _state['address'] is not None and address != _state['address']
+        _state.update(address=address, refreshed_at=time.monotonic(), refreshed=reason,
+                      last_probe_ms=probe_ms, refreshes=_state['refreshes'] + 1)
+        if changed:
+            _state['changes'] += 1
+        listeners = list(_listeners)
+    if changed:
+        print(f"IP address changed: {address}")
+        for listener in listeners:
+            try:
+                listener(address)
+            except Exception as e:
+                print(f"Error in IP address listener: {e}")
+    return address
+
+
+def _run_monitor():
+    sock = _open_netlink()
+    with _lock:
+        _state['source'] = 'netlink' if sock is not None else 'polling'
+    while True:
+        with _lock:
+            # Before the first probe: get_cached_ip_address() is probing inline right now
+            refreshed_at = _state['refreshed_at'] or time.monotonic()
+        age = time.monotonic() - refreshed_at
+        wait = max(0.0, (ADDRESS_TTL if sock is not None else POLL_INTERVAL) - age)
+        if sock is not None:
+            ready, _, _ = select.select([sock], [], [], wait)
+            if ready:
+                _drain(sock)
+                time.sleep(EVENT_SETTLE)
+                _drain(sock)
+                with _lock:
+                    _state['events'] += 1
+                _refresh('network change')
+                continue
+        else:
+            time.sleep(wait)
+        _refresh('ttl' if sock is not None else 'poll')
+
+
+def _ensure_monitor():
+    global _monitor
+    with _lock:
+        if _monitor is None or not _monitor.is_alive():
+            _monitor = threading.Thread(target=_run_monitor, name='ip-address-monitor', daemon=True)
+            _monitor.start()
+
+
+def get_cached_ip_address():
+    """
+    The station's IP address as get_ip_address() last found it. Starts the monitor on the
+    first call; probes inline only before the first probe or if the cache is older than
+    ADDRESS_TTL (the monitor normally refreshes it before that).
+    """
+    _ensure_monitor()
+    with _lock:
+        address, refreshed_at = _state['address'], _state['refreshed_at']
+    if address is None or time.monotonic() - refreshed_at > ADDRESS_TTL:
+        address = _refresh('first use' if address is None else 'expired')
+    return address
+
+
+def add_listener(callback):
+    """Calls callback(address) from the monitor thread whenever the address changes."""
+    with _lock:
+        if callback not in _listeners:
+            _listeners.append(callback)
+
+
+@owned()
+def get_address_stats():
+    """The cached address, how and when it was last probed, and the refresh/change/event counters."""
+    get_cached_ip_address()
+    with _lock:
+        stats = dict(_state)
+    stats['age_seconds'] = round(time.monotonic() - stats.pop('refreshed_at'), 1)
+    stats['ttl'] = {'netlink': ADDRESS_TTL, 'polling': POLL_INTERVAL}.get(stats['source'])
+    return stats
+
+
 if __name__ == '__main__':
     # Test the function
     print(f"System: {platform.system()}")
     ip = get_ip_address()
     print(f"Current IP Address: {ip}")
+    print(f"Cached: {get_cached_ip_address()} - {get_address_stats()}")
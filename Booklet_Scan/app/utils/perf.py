@@ -0,0 +1,280 @@
+import collections
+import functools
+import os
+import threading
+import time
+from flask import request
+from . import hardware
+from .hardware import owned  # The samples of every worker are kept by the hardware owner
+
+# Opt-in request/SQL/span instrumentation (PERF_MONITOR) behind the admin Performance page.
+#
+# For every request the endpoint, wall time and status are recorded, together with the
+# number of SQL statements it ran and their total time (SQLAlchemy before/after_cursor_execute
+# events) and the time spent in named spans - booklet PDF generation, print_pdf, LCD writes...
+# The last PERF_WINDOW samples of every endpoint and span are kept and summarised as rolling
+# p50/p95/p99 on demand. Requests slower than PERF_SLOW_REQUEST_MS go to the slow log (the app
+# logger, and the last SLOW_LOG_SIZE of them on the page).
+#
+# Spans in background threads (print jobs, the LCD owner thread) have no request; they are
+# still aggregated per span name. With PERF_MONITOR off nothing is hooked and span() costs
+# one global lookup.
+#
+# Under a multi-worker server (serve.py) the samples are kept by the hardware owner process:
+# each worker collects its samples in an outbox and ships them to the owner every
+# SHIP_INTERVAL seconds in one call, and the report and reset run in the owner. The page then
+# covers every worker plus the owner's own spans (LCD writes, print jobs), whichever worker
+# serves it.
+
+SLOW_LOG_SIZE = 50
+SHIP_INTERVAL = 1.0  # seconds between a worker's shipments of samples to the hardware owner
+
+_enabled = False
+_window = 500
+_slow_ms = 500.0
+_lock = threading.Lock()
+_local = threading.local()  # .record: the current request's measurements
+_endpoints = {}  # endpoint -> deque of (wall ms, statements, sql ms)
+_spans = {}      # span name -> deque of ms
+_slow = collections.deque(maxlen=SLOW_LOG_SIZE)
+_started_at = None
+_outbox = []      # (store, key, sample) not yet shipped to the hardware owner (connected workers)
+_shipper = None
+
+
+class _NoSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def init_app(app):
+    """Hooks the request and SQL instrumentation into app if PERF_MONITOR is on."""
+    global _enabled, _window, _slow_ms, _started_at
+    if not app.config.get('PERF_MONITOR'):
+        return
+    from sqlalchemy import event
+    from app import db
+
+    _window = int(app.config.get('PERF_WINDOW', 500))
+    _slow_ms = float(app.config.get('PERF_SLOW_REQUEST_MS', 500))
+    _started_at = time.time()
+    _enabled = True
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def _perf_start():
+        _local.record = {'started': time.perf_counter(), 'statements': 0, 'sql_seconds': 0.0,
+                         'spans': {}, 'status': None}
+
+    @app.after_request
+    def _perf_status(response):
+        record = getattr(_local, 'record', None)
+        if record is not None:
+            record['status'] = response.status_code
+        return response
+
+    @app.teardown_request
+    def _perf_finish(exc):
+        record = getattr(_local, 'record', None)
+        _local.record = None
+        if record is None:
+            return
+        wall_ms = (time.perf_counter() - record['started']) * 1000
+        endpoint = request.endpoint or request.path
+        _add('endpoints', endpoint, (wall_ms, record['statements'], record['sql_seconds'] * 1000))
+        if wall_ms >= _slow_ms:
+            entry = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'endpoint': endpoint,
+                     'method': request.method, 'path': request.path,
+                     'status': record['status'] or (500 if exc else None),
+                     'ms': round(wall_ms, 1), 'statements': record['statements'],
+                     'sql_ms': round(record['sql_seconds'] * 1000, 1),
+                     'spans': {name: round(ms, 1) for name, ms in record['spans'].items()},
+                     'pid': os.getpid()}
+            _add('slow', None, entry)
+            app.logger.warning(f"Slow request {request.method} {request.path} ({endpoint}): {entry['ms']} ms, "
+                               f"{entry['statements']} SQL statements in {entry['sql_ms']} ms, spans {entry['spans']}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record = getattr(_local, 'record', None)
+    if record is not None:
+        record['sql_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record = getattr(_local, 'record', None)
+    if record is not None and 'sql_started' in record:
+        record['statements'] += 1
+        record['sql_seconds'] += time.perf_counter() - record.pop('sql_started')
+
+
+def _add(store, key, sample):
+    # store: 'endpoints', 'spans' or 'slow' (key None)
+    if hardware.is_connected():
+        with _lock:
+            _outbox.append((store, key, sample))
+        _ensure_shipper()
+    else:
+        with _lock:
+            _store(store, key, sample)
+
+
+def _store(store, key, sample):
+    # Caller holds _lock
+    if store == 'slow':
+        _slow.appendleft(sample)
+        return
+    samples = (_endpoints if store == 'endpoints' else _spans).get(key)
+    if samples is None:
+        samples = (_endpoints if store == 'endpoints' else _spans)[key] = collections.deque(maxlen=_window)
+    samples.append(sample)
+
+
+def _ensure_shipper():
+    global _shipper
+    if _shipper is not None and _shipper.is_alive():
+        return
+    with _lock:
+        if _shipper is None or not _shipper.is_alive():
+            _shipper = threading.Thread(target=_ship_samples, name='perf-shipper', daemon=True)
+            _shipper.start()
+
+
+def _ship_samples():
+    # Worker thread: one call to the hardware owner per SHIP_INTERVAL, whatever the request rate
+    while hardware.is_connected():
+        time.sleep(SHIP_INTERVAL)
+        with _lock:
+            batch = _outbox[:]
+            del _outbox[:]
+        if batch:
+            _merge(batch)  # lost if the owner cannot be reached
+
+
+@owned()
+def _merge(batch):
+    # Runs in the hardware owner: samples shipped by a worker
+    with _lock:
+        for store, key, sample in batch:
+            _store(store, key, sample)
+
+
+class _Span:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        _add('spans', self.name, elapsed_ms)
+        record = getattr(_local, 'record', None)
+        if record is not None:
+            record['spans'][self.name] = record['spans'].get(self.name, 0.0) + elapsed_ms
+        return False
+
+
+def span(name):
+    """
+    Context manager timing a named piece of work when PERF_MONITOR is on:
+
+        with perf.span('print_pdf'):
+            ...
+    """
+    return _Span(name) if _enabled else _NO_SPAN
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def percentiles(values):
+    """p50/p95/p99/max of a list of millisecond values (nearest rank), None when empty."""
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    ordered = sorted(values)
+    last = len(ordered) - 1
+
+    def pick(fraction):
+        return round(ordered[min(last, int(round(fraction * last)))], 1)
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99), 'max': round(ordered[-1], 1)}
+
+
+def get_report():
+    """
+    Summary of the rolling windows: per endpoint (samples, wall time and SQL time percentiles,
+    mean/max statement count), per span (samples and percentiles), and the slow request log.
+    'scope' tells whether it covers all the server's processes or only the process ('pid')
+    that made it - the latter when the hardware owner cannot be reached.
+    """
+    return _owner_report() or _report()
+
+
+@owned()
+def _owner_report():
+    # Runs in the hardware owner under a multi-worker server, locally otherwise
+    return _report()
+
+
+def _report():
+    with _lock:
+        endpoints = {name: list(samples) for name, samples in _endpoints.items()}
+        spans = {name: list(samples) for name, samples in _spans.items()}
+        slow = list(_slow)
+    report_endpoints = []
+    for name, samples in endpoints.items():
+        statements = [s[1] for s in samples]
+        report_endpoints.append({
+            'endpoint': name, 'samples': len(samples),
+            'wall_ms': percentiles([s[0] for s in samples]),
+            'sql_ms': percentiles([s[2] for s in samples]),
+            'statements_mean': round(sum(statements) / len(statements), 1),
+            'statements_max': max(statements),
+        })
+    report_endpoints.sort(key=lambda e: e['wall_ms']['p95'] or 0, reverse=True)
+    report_spans = [{'span': name, 'samples': len(samples), 'ms': percentiles(samples)}
+                    for name, samples in spans.items()]
+    report_spans.sort(key=lambda s: s['ms']['p95'] or 0, reverse=True)
+    return {'enabled': _enabled, 'window': _window, 'slow_request_ms': _slow_ms,
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_started_at)) if _started_at else None,
+            'endpoints': report_endpoints, 'spans': report_spans, 'slow_requests': slow,
+            'scope': 'server' if hardware.is_owner() or not hardware.is_connected() else 'process',
+            'pid': os.getpid()}
+
+
+def reset():
+    """Clears the collected samples and the slow log (of the whole server, see get_report)."""
+    with _lock:
+        del _outbox[:]
+    _reset()
+
+
+@owned()
+def _reset():
+    global _started_at
+    with _lock:
+        _endpoints.clear()
+        _spans.clear()
+        _slow.clear()
+    if _enabled:
+        _started_at = time.time()
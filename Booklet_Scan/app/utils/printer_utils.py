@@ -1,11 +1,13 @@
 import subprocess
 import platform
+from app.utils.hardware import owned # Printing runs in the hardware owner process under a multi-worker server
 
 # Configuration
 DEFAULT_PRINTER_COMMAND = "lp"  # For CUPS (Linux/macOS)
 WINDOWS_PRINTER_COMMAND = "PRINT" # This is a shell command, might need different handling
 
-def print_pdf(file_path: str, printer_name: str = None, copies: int = 1) -> bool:
+@owned(default=False)
+def print_pdf(file_path: str, printer_name: str = None, copies: int = 1, command_name: str = None) -> bool:
     """
     Sends a PDF file to the printer.
 
@@ -14,6 +16,8 @@ def print_pdf(file_path: str, printer_name: str = None, copies: int = 1) -> bool
         printer_name (str, optional): The name of the printer to use.
                                       If None, the system's default printer is used.
         copies (int, optional): Number of copies to print. Defaults to 1.
+        command_name (str, optional): The lp-compatible command to run instead of DEFAULT_PRINTER_COMMAND,
+                                      e.g. a fake `lp` script when testing without a printer.
 
     Returns:
         bool: True if the print command was issued successfully, False otherwise.
@@ -26,7 +30,7 @@ def print_pdf(file_path: str, printer_name: str = None, copies: int = 1) -> bool
     command = []
 
     if system == "linux" or system == "darwin": # Linux or macOS
-        command.append(DEFAULT_PRINTER_COMMAND)
+        command.append(command_name or DEFAULT_PRINTER_COMMAND)
         if printer_name:
             command.extend(["-d", printer_name])
         if copies > 1:
@@ -89,6 +93,61 @@ def print_pdf(file_path: str, printer_name: str = None, copies: int = 1) -> bool
         print(f"An unexpected error occurred during printing: {e}")
         return False
 
+@owned(default=False)
+def print_pdf_data(pdf_data: bytes, printer_name: str = None, copies: int = 1, command_name: str = None,
+                   title: str = None) -> bool:
+    """
+    Sends an in-memory PDF to the printer by piping it to the spooler's stdin, so nothing
+    has to be written to (or re-read from) disk. Only lp-compatible spoolers (Linux/macOS) are supported.
+
+    Args:
+        pdf_data (bytes): The PDF document.
+        printer_name (str, optional): The name of the printer to use.
+                                      If None, the system's default printer is used.
+        copies (int, optional): Number of copies to print. Defaults to 1.
+        command_name (str, optional): The lp-compatible command to run instead of DEFAULT_PRINTER_COMMAND.
+        title (str, optional): Job title shown in the print queue (lp reads stdin as an untitled job).
+
+    Returns:
+        bool: True if the print command was issued successfully, False otherwise.
+    """
+    if not pdf_data:
+        print("Error: No PDF data provided for printing.")
+        return False
+
+    system = platform.system().lower()
+    if system != "linux" and system != "darwin":
+        print(f"Error: Printing from memory is only supported with lp (Linux/macOS), not on '{system}'.")
+        return False
+
+    command = [command_name or DEFAULT_PRINTER_COMMAND]
+    if printer_name:
+        command.extend(["-d", printer_name])
+    if copies > 1:
+        command.extend(["-n", str(copies)])
+    if title:
+        command.extend(["-t", title])
+    # No file argument: lp prints what it reads from stdin
+
+    try:
+        print(f"Issuing print command: {' '.join(command)} < ({len(pdf_data)} bytes)")
+        result = subprocess.run(command, input=pdf_data, check=True, capture_output=True)
+        print(f"Print command stdout: {result.stdout.decode(errors='replace')}")
+        if result.stderr:
+            print(f"Print command stderr: {result.stderr.decode(errors='replace')}")
+        return True
+    except FileNotFoundError:
+        print(f"Error: Print command '{command[0]}' not found. Ensure CUPS or printing software is installed and in PATH.")
+        return False
+    except subprocess.CalledProcessError as e:
+        print(f"Error during printing: {e}")
+        print(f"Command stdout: {e.stdout.decode(errors='replace') if e.stdout else ''}")
+        print(f"Command stderr: {e.stderr.decode(errors='replace') if e.stderr else ''}")
+        return False
+    except Exception as e:
+        print(f"An unexpected error occurred during printing: {e}")
+        return False
+
 if __name__ == '__main__':
     # This section is for testing the printer_utils.py script directly.
     # You'll need a PDF file to test with.
@@ -0,0 +1,106 @@
+import threading
+import time
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from app import db
+
+# Cached table row counts for the admin list pages ("Total Records: ...").
+#
+# A table is counted with COUNT(*) the first time its total is asked for; after that the
+# count is kept up to date from this process's own writes: ORM adds/deletes are picked up
+# from the session at flush time, and bulk Core statements (booklet scans, student import,
+# bulk assignment) report their row counts with track(). The changes are only applied when
+# the transaction commits, and thrown away on rollback. Other processes (a second station or
+# server worker) don't notify us, so a cached count is also re-read after ADMIN_COUNT_TTL
+# seconds.
+
+_lock = threading.Lock()
+_listening = False
+_DELTAS = 'row_count_deltas'  # session.info key for the changes not yet committed
+
+
+def init_app(app):
+    """Sets up the count cache for app and hooks the session events that keep it current."""
+    global _listening
+    app.extensions['row_counts'] = {}  # table name -> [count, monotonic time it was read]
+    with _lock:
+        if not _listening:
+            event.listen(db.session, 'after_flush', _after_flush)
+            event.listen(db.session, 'after_commit', _after_commit)
+            event.listen(db.session, 'after_rollback', _after_rollback)
+            _listening = True
+
+
+def _pending(session):
+    return session.info.setdefault(_DELTAS, {})
+
+
+def _after_flush(session, flush_context):
+    deltas = None
+    for instance in session.new:
+        deltas = deltas if deltas is not None else _pending(session)
+        table = instance.__table__.name
+        deltas[table] = deltas.get(table, 0) + 1
+    for instance in session.deleted:
+        deltas = deltas if deltas is not None else _pending(session)
+        table = instance.__table__.name
+        deltas[table] = deltas.get(table, 0) - 1
+
+
+def _after_commit(session):
+    deltas = session.info.pop(_DELTAS, None)
+    if not deltas or not has_app_context():
+        return
+    cache = current_app.extensions.get('row_counts')
+    if cache is None:
+        return
+    with _lock:
+        for table, delta in deltas.items():
+            entry = cache.get(table)
+            if entry is not None:  # tables never counted are simply counted when first needed
+                entry[0] = max(0, entry[0] + delta)
+
+
+def _after_rollback(session):
+    session.info.pop(_DELTAS, None)
+
+
+def track(model, delta):
+    """
+    Records that the current transaction inserted (delta > 0) or deleted (delta < 0) rows of
+    model's table outside the ORM, e.g. with a Core INSERT. Applied to the cache on commit.
+    """
+    if delta:
+        deltas = _pending(db.session())
+        table = model.__table__.name
+        deltas[table] = deltas.get(table, 0) + delta
+
+
+def count(model):
+    """
+    Returns the number of rows in model's table, from the cache when it is fresh enough.
+    Must be called inside an application context.
+    """
+    cache = current_app.extensions.get('row_counts')
+    table = model.__table__
+    if cache is None:
+        return db.session.execute(select(func.count()).select_from(table)).scalar()
+    ttl = current_app.config.get('ADMIN_COUNT_TTL', 300)
+    with _lock:
+        entry = cache.get(table.name)
+        if entry is not None and time.monotonic() - entry[1] < ttl:
+            return entry[0]
+    total = db.session.execute(select(func.count()).select_from(table)).scalar()
+    with _lock:
+        cache[table.name] = [total, time.monotonic()]
+    return total
+
+
+def invalidate(model=None):
+    """Drops the cached count of model's table (or of every table) so it is re-counted."""
+    cache = current_app.extensions.get('row_counts', {})
+    with _lock:
+        if model is None:
+            cache.clear()
+        else:
+            cache.pop(model.__table__.name, None)
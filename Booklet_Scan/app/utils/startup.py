@@ -0,0 +1,69 @@
+import threading
+import time
+
+# Start-up timing and the background booklet warm-up.
+#
+# create_app() records how long each of its phases took (PhaseTimer, kept in
+# app.extensions['startup_phases'] and reported by flask startup-profile).
+#
+# ReportLab is the heaviest import of the app and is only needed to render booklets, so it is
+# no longer imported when the app starts. The server starts serving first, and
+# warm_up_in_background() then imports the booklet module and renders one booklet in memory
+# on a background thread, so the first student scanned doesn't pay for it either (BOOKLET_WARMUP).
+
+_lock = threading.Lock()
+_warmup = {'state': 'not started', 'import_ms': None, 'first_booklet_ms': None, 'error': None}
+
+
+class PhaseTimer:
+    """Collects (phase, ms) pairs: mark(name) closes the phase that started at the previous mark."""
+
+    def __init__(self):
+        self.phases = []
+        self._last = time.perf_counter()
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, round((now - self._last) * 1000, 1)))
+        self._last = now
+
+
+def warm_up():
+    """
+    Imports the booklet module (and with it ReportLab) and renders one booklet in memory.
+
+    Returns:
+        dict: 'state' ('done' or 'failed'), 'import_ms', 'first_booklet_ms' and 'error'.
+    """
+    with _lock:
+        if _warmup['state'] in ('running', 'done'):
+            return dict(_warmup)
+        _warmup['state'] = 'running'
+    try:
+        started = time.perf_counter()
+        from app.utils import booklet_generator
+        imported = time.perf_counter()
+        booklet_generator.render_single_booklet('WARMUP', student_name='Warm-up', exam_name='Warm-up')
+        rendered = time.perf_counter()
+        result = {'state': 'done', 'import_ms': round((imported - started) * 1000, 1),
+                  'first_booklet_ms': round((rendered - imported) * 1000, 1), 'error': None}
+    except Exception as e:
+        print(f"Booklet warm-up failed: {e}")
+        result = {'state': 'failed', 'import_ms': None, 'first_booklet_ms': None, 'error': str(e)}
+    with _lock:
+        _warmup.update(result)
+        return dict(_warmup)
+
+
+def warm_up_in_background(app):
+    """Starts warm_up() on a daemon thread if BOOKLET_WARMUP is on. Returns the thread, or None."""
+    if not app.config.get('BOOKLET_WARMUP', True):
+        return None
+    thread = threading.Thread(target=warm_up, name='booklet-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def get_warmup_stats():
+    with _lock:
+        return dict(_warmup)
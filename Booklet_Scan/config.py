@@ -9,5 +9,72 @@ class Config:
         'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Multi-station deployment: several stations/server workers writing the same SQLite file.
+    # The pragmas are applied to every connection by app/utils/db_utils.py.
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL' # Readers don't block the writer
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 10000) # ms a writer waits for the lock before "database is locked"
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL' # NORMAL is durable across app crashes in WAL mode
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 10), # Connections kept open per process
+        'max_overflow': int(os.environ.get('DB_POOL_MAX_OVERFLOW') or 10), # Extra connections allowed under bursts
+        'pool_timeout': 30, # Seconds to wait for a free connection
+    }
+    # Admin list totals are cached and kept current from this process's writes; re-counted after this many
+    # seconds to pick up rows written by other processes/stations
+    ADMIN_COUNT_TTL = float(os.environ.get('ADMIN_COUNT_TTL') or 300)
+    # Exam/venue/course choice lists are cached per process; their version stamps are re-read at most every
+    # this many seconds, so a change made through another process shows up within this interval (0: always)
+    CHOICES_CHECK_INTERVAL = float(os.environ.get('CHOICES_CHECK_INTERVAL') or 2)
+    # Every eligibility index lookup re-reads the index's version stamp, so admin changes made through other
+    # processes are seen at once. serve.py turns it on when it runs several workers
+    ELIGIBILITY_VERSION_CHECK = os.environ.get('ELIGIBILITY_VERSION_CHECK', '').lower() in ('1', 'true', 'yes')
+    # Seconds between keep-alive comments on an idle live exam dashboard stream (SSE)
+    LIVE_DASHBOARD_KEEPALIVE = float(os.environ.get('LIVE_DASHBOARD_KEEPALIVE') or 15)
+    # Live dashboard streams open at once per process (0: no limit). Each open dashboard holds a request thread
+    # (one of SERVER_THREADS under waitress) for as long as it is open; beyond the limit it gets a 503 and retries
+    LIVE_DASHBOARD_MAX_STREAMS = int(os.environ.get('LIVE_DASHBOARD_MAX_STREAMS', 2))
+    # Performance instrumentation (app/utils/perf.py, admin Performance page): per-request timing, SQL
+    # statement counts/time and named spans, summarised as rolling p50/p95/p99. Off by default.
+    PERF_MONITOR = os.environ.get('PERF_MONITOR', '').lower() in ('1', 'true', 'yes')
+    PERF_WINDOW = int(os.environ.get('PERF_WINDOW') or 500) # Samples kept per endpoint/span
+    PERF_SLOW_REQUEST_MS = float(os.environ.get('PERF_SLOW_REQUEST_MS') or 500) # Requests slower than this are logged
+
     # Configuration for Booklet Printing
     DEFAULT_PRINTER_NAME = os.environ.get('DEFAULT_PRINTER_NAME') or None # Or specify a default printer queue name, e.g., "MyPrinter"
+    PRINTER_COMMAND = os.environ.get('PRINTER_COMMAND') or None # lp-compatible command, None = lp (set to a fake lp script for testing)
+    PRINT_BATCH_SIZE = int(os.environ.get('PRINT_BATCH_SIZE') or 25) # Booklets merged into one print job (flask print-booklets)
+    PRINT_BATCH_FLUSH_INTERVAL = float(os.environ.get('PRINT_BATCH_FLUSH_INTERVAL') or 5) # Seconds before a partial batch is printed anyway
+
+    # Zero-disk booklets: render scanned booklets in memory and pipe them to lp's stdin instead of
+    # writing output_barcodes/*.pdf first. With BOOKLET_ARCHIVE also on, a copy of every PDF is
+    # written in the background to output_barcodes/archive/<date>/.
+    BOOKLET_ZERO_DISK = os.environ.get('BOOKLET_ZERO_DISK', '').lower() in ('1', 'true', 'yes')
+    BOOKLET_ARCHIVE = os.environ.get('BOOKLET_ARCHIVE', '').lower() in ('1', 'true', 'yes')
+    # Import ReportLab and render one booklet in the background once the server is up (app/utils/startup.py),
+    # instead of on the first scan
+    BOOKLET_WARMUP = os.environ.get('BOOKLET_WARMUP', '1').lower() in ('1', 'true', 'yes')
+
+    # Write-behind scan journal (app/main/scan_journal.py): scans are acknowledged once appended to
+    # the journal file and committed to the database in batches. Single server process only.
+    SCAN_JOURNAL = os.environ.get('SCAN_JOURNAL', '').lower() in ('1', 'true', 'yes')
+    SCAN_JOURNAL_PATH = os.environ.get('SCAN_JOURNAL_PATH') or \
+        os.path.join(os.path.abspath(os.path.dirname(os.path.dirname(__file__))), 'scan_journal.jsonl')
+    SCAN_JOURNAL_BATCH_SIZE = int(os.environ.get('SCAN_JOURNAL_BATCH_SIZE') or 50) # Pending scans that trigger an early flush
+    SCAN_JOURNAL_FLUSH_INTERVAL = float(os.environ.get('SCAN_JOURNAL_FLUSH_INTERVAL') or 1) # Seconds between flushes
+
+    # Background booklet jobs (generate -> print -> record), see app/main/print_jobs.py
+    PRINT_JOB_WORKERS = int(os.environ.get('PRINT_JOB_WORKERS') or 2) # Size of the worker pool
+    PRINT_JOB_QUEUE_LIMIT = int(os.environ.get('PRINT_JOB_QUEUE_LIMIT') or 50) # Max unfinished jobs before scans are refused
+    PRINT_JOB_HISTORY = 200 # Finished jobs kept in memory for status queries
+
+    # Batch pre-generation of booklets (flask pregenerate-booklets / admin action)
+    PREGEN_WORKERS = int(os.environ.get('PREGEN_WORKERS') or 0) or None # Process pool size, None = CPU count
+
+    # Production server (python serve.py, app/server.py). waitress is used when installed, otherwise
+    # Werkzeug's threaded server. With more than one worker process (Unix only) a separate process
+    # owns the LCD and the printer and runs the print jobs. SCAN_JOURNAL needs a single worker.
+    SERVER_HOST = os.environ.get('SERVER_HOST') or '0.0.0.0'
+    SERVER_PORT = int(os.environ.get('SERVER_PORT') or 5000)
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS') or 1) # Processes accepting requests
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS') or 8) # Request threads per process (waitress)
+    SERVER_SHUTDOWN_TIMEOUT = float(os.environ.get('SERVER_SHUTDOWN_TIMEOUT') or 60) # Seconds to finish requests and print jobs on stop
@@ -0,0 +1 @@
+# Makes the app and config modules importable from the tests (pytest puts this directory on sys.path)
@@ -1,7 +1,7 @@
 from app import create_app, db
 from app import create_app, db
 # Import models here to ensure they are known to SQLAlchemy before creating tables
-from app.models import AdminUser, Student, Exam, Venue, StudentExamAssignment, ScanRecord
+from app.models import AdminUser, Student, Exam, Venue, StudentExamAssignment, ScanRecord, PregeneratedBooklet
 
 app = create_app()
 
@@ -16,13 +16,17 @@ def make_shell_context():
         'db': db,
         'AdminUser': AdminUser, 'Student': Student, 'Exam': Exam,
         'Venue': Venue, 'StudentExamAssignment': StudentExamAssignment,
-        'ScanRecord': ScanRecord
+        'ScanRecord': ScanRecord, 'PregeneratedBooklet': PregeneratedBooklet
     }
 
 if __name__ == '__main__':
     with app.app_context():
         # Create database tables if they don't exist
         db.create_all() # This will be moved to a proper migration setup later if needed
+        # Indexes added to the models since the database was created
+        from app.utils import db_utils
+        for index_name in db_utils.create_missing_indexes():
+            print(f"Created index {index_name}")
         # pass # Commented out pass as db.create_all() is now active
     # Make the app accessible on the network for Raspberry Pi deployment
     # Also attempt to initialize LCD at startup
@@ -36,6 +40,9 @@ if __name__ == '__main__':
         #    print("LCD could not be initialized from run.py. IP will not be displayed on LCD.")
         # Simpler: display_ip_address will attempt init if LCD is not active.
         lcd_display.display_ip_address()
+    # Load ReportLab in the background rather than on the first scan
+    from app.utils import startup
+    startup.warm_up_in_background(app)
 
 
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,18 @@
+import argparse
+from app.server import serve
+
+# Production entry point - run.py is the development server:
+#
+#   python serve.py [--host 0.0.0.0] [--port 5000] [--workers N] [--threads N]
+#
+# Defaults come from the SERVER_* settings in config.py. See app/server.py.
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the Booklet Scan server in production mode.')
+    parser.add_argument('--host', help='Address to listen on (SERVER_HOST).')
+    parser.add_argument('--port', type=int, help='Port to listen on (SERVER_PORT).')
+    parser.add_argument('--workers', type=int, help='Worker processes (SERVER_WORKERS); more than one starts a '
+                                                    'separate process owning the LCD and printer.')
+    parser.add_argument('--threads', type=int, help='Request threads per worker with waitress (SERVER_THREADS).')
+    args = parser.parse_args()
+    serve(host=args.host, port=args.port, workers=args.workers, threads=args.threads)
@@ -0,0 +1,92 @@
+import time
+import pytest
+from app.utils import lcd_display
+
+# The LCD owner thread's queue (see app/utils/lcd_display.py), driven through the console backend.
+# Durations are kept short; the timings asserted leave room for a slow test machine.
+
+
+class TimedBackend(lcd_display.ConsoleBackend):
+    """Console backend that also remembers when each frame was written."""
+
+    def __init__(self):
+        super().__init__(echo=False)
+        self.times = []
+
+    def write(self, line1, line2):
+        self.times.append(time.monotonic())
+        super().write(line1, line2)
+
+    def messages(self):
+        # Frames other than the idle screen, with their write times
+        return [(frame, at) for frame, at in zip(self.frames, self.times) if frame[0] != "IP Address:"]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    lcd_display.shutdown()
+    monkeypatch.setattr(lcd_display, 'IDLE_TIMEOUT', 0.2)
+    backend = TimedBackend()
+    lcd_display.set_backend(backend)
+    wait_for(lambda: backend.frames)  # the idle screen the owner thread starts with
+    yield backend
+    lcd_display.shutdown()
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out waiting for the LCD'
+        time.sleep(0.01)
+
+
+def test_burst_of_status_messages_is_coalesced(backend):
+    coalesced = lcd_display.get_stats()['coalesced']
+    lcd_display.display_message("Hold", key='hold', duration=0.3)
+    wait_for(lambda: backend.messages())
+    for i in range(5):
+        lcd_display.display_message(f"Student {i}", "ELIGIBLE", duration=0.05)
+    wait_for(lambda: len(backend.messages()) == 2)
+    time.sleep(0.1)
+    assert [frame for frame, _ in backend.messages()] == [("Hold", ""), ("Student 4", "ELIGIBLE")]
+    assert lcd_display.get_stats()['coalesced'] - coalesced == 4
+
+
+def test_message_stays_up_for_its_duration(backend):
+    lcd_display.display_message("First", key='first', duration=0.3)
+    lcd_display.display_message("Second", key='second', duration=0.05)
+    wait_for(lambda: len(backend.messages()) == 2)
+    (first, shown), (second, replaced) = backend.messages()
+    assert (first, second) == (("First", ""), ("Second", ""))
+    assert replaced - shown >= 0.3
+
+
+def test_pending_messages_are_shown_by_priority(backend):
+    lcd_display.display_message("Hold", key='hold', duration=0.2, priority=lcd_display.PRIORITY_HIGH)
+    wait_for(lambda: backend.messages())
+    lcd_display.display_message("Low", key='low', duration=0.05, priority=lcd_display.PRIORITY_LOW)
+    lcd_display.display_message("Normal", key='normal', duration=0.05)
+    wait_for(lambda: len(backend.messages()) == 3)
+    assert [frame[0] for frame, _ in backend.messages()] == ["Hold", "Normal", "Low"]
+
+
+def test_alert_preempts_status_and_keeps_its_duration(backend):
+    lcd_display.display_message("Printing...", duration=1)
+    wait_for(lambda: backend.messages())
+    lcd_display.display_alert("BK:123", "WARN:DUPLICATE", duration=0.3)
+    # The next scan's status message must not cut the warning short
+    lcd_display.display_message("BK:456 Saved", "Done", duration=0.05)
+    wait_for(lambda: len(backend.messages()) == 3)
+    (printing, _), (alert, alert_shown), (saved, saved_shown) = backend.messages()
+    assert printing[0] == "Printing..."
+    assert alert == ("BK:123", "WARN:DUPLICATE")
+    assert saved[0] == "BK:456 Saved"
+    assert saved_shown - alert_shown >= 0.3
+
+
+def test_idle_screen_returns_after_timeout(backend):
+    lcd_display.display_message("Saved", duration=0.1)
+    wait_for(lambda: backend.messages())
+    shown = backend.messages()[0][1]
+    wait_for(lambda: backend.frames[-1][0] == "IP Address:")
+    assert backend.times[-1] - shown >= 0.1 + lcd_display.IDLE_TIMEOUT
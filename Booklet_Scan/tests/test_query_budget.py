@@ -0,0 +1,19 @@
+import pytest
+from app.query_budget import QUERY_BUDGETS, run_query_budget
+
+# SQL statement budget of every page (see app/query_budget.py, flask check-query-budget).
+# The pages are requested once, in QUERY_BUDGETS order, as the budgets count the choice list
+# versions and table counts only on the first page to read them.
+
+
+@pytest.fixture(scope='module')
+def results():
+    return {result['endpoint']: result for result in run_query_budget()}
+
+
+@pytest.mark.parametrize('endpoint, budget', [(endpoint, budget) for endpoint, _, budget in QUERY_BUDGETS],
+                         ids=[endpoint for endpoint, _, _ in QUERY_BUDGETS])
+def test_query_budget(results, endpoint, budget):
+    result = results[endpoint]
+    assert result['status'] == 200, result['url']
+    assert result['queries'] <= budget, '\n'.join(result.get('statements', []))
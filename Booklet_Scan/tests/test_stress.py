@@ -0,0 +1,14 @@
+from app.stress import run_stress_test
+
+# Multi-station stress test (see app/stress.py, flask stress-scans), kept small enough for the test run
+
+
+def test_every_code_recorded_once(tmp_path):
+    result = run_stress_test(processes=2, threads=3, codes=40, database=str(tmp_path / 'stress.db'))
+    assert result['passed'], result['problems']
+    assert result['attempts'] == 2 * 3 * 40
+    assert result['outcomes'] == {'recorded': 40, 'duplicate': 2 * 3 * 40 - 40}
+    assert result['rows'] == 40
+    assert result['duplicate_rows'] == 0
+    assert result['locked_errors'] == 0
+    assert result['journal_mode'] == 'wal'